@@ -0,0 +1,68 @@
+import sys
+import time
+import argparse
+import requests
+import threading
+import concurrent.futures
+
+# Measures the throughput and latency of an Orchestrator API endpoint under an increasing number of concurrent
+# clients, e.g.:
+#   python benchmarks/api_concurrency.py --url http://127.0.0.1:10100 --path /api/v1/orchestrator/deployments
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+
+def run(url, clients, requests_per_client):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def client():
+        session = requests.Session()
+        for i in range(requests_per_client):
+            start = time.perf_counter()
+            try:
+                response = session.get(url, timeout=30)
+                failed = response.status_code >= 400
+            except Exception:
+                failed = True
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if failed:
+                    errors[0] += 1
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=clients) as executor:
+        for future in [executor.submit(client) for c in range(clients)]:
+            future.result()
+    duration = time.perf_counter() - start
+
+    return {"clients": clients,
+            "requests": len(latencies),
+            "errors": errors[0],
+            "throughput": len(latencies) / duration if duration else 0.0,
+            "p50": percentile(latencies, 50) * 1000,
+            "p99": percentile(latencies, 99) * 1000}
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Orchestrator API concurrency benchmark")
+    parser.add_argument("--url", default="http://127.0.0.1:10100")
+    parser.add_argument("--path", default="/api/v1/orchestrator/deployments")
+    parser.add_argument("--clients", default="1,4,16,64", help="Comma separated numbers of concurrent clients")
+    parser.add_argument("--requests", type=int, default=200, help="Requests issued by each client")
+    args = parser.parse_args()
+
+    print("%8s %10s %8s %12s %10s %10s" % ("clients", "requests", "errors", "req/s", "p50 (ms)", "p99 (ms)"))
+    for clients in [int(c) for c in args.clients.split(",")]:
+        result = run("%s%s" % (args.url, args.path), clients, args.requests)
+        print("%8d %10d %8d %12.1f %10.2f %10.2f" % (result["clients"], result["requests"], result["errors"],
+                                                     result["throughput"], result["p50"], result["p99"]))
+        sys.stdout.flush()
@@ -0,0 +1,53 @@
+import sys
+import time
+import uuid
+import random
+import argparse
+
+sys.path.insert(0, ".")
+
+from serrano_orchestrator.utils import entityCodec
+
+# Decode throughput of the entity codec formats over a synthetic keyspace of Deployment entities, e.g.:
+#   python benchmarks/codec_decode.py --entities 100000
+
+DESCRIPTION = "\n---\n".join(["apiVersion: apps/v1\nkind: Deployment\nmetadata:\n  name: service-%s\n  labels:\n"
+                              "    group_id: %s\nspec:\n  replicas: 1\n" % (i, i) for i in range(4)])
+
+
+def deployment():
+    deployment_uuid = str(uuid.uuid4())
+    return {"name": deployment_uuid,
+            "deployment_uuid": deployment_uuid,
+            "kind": "Deployment",
+            "user_token": "",
+            "deployment_description": DESCRIPTION,
+            "deployment_objectives": [{"name": "latency", "value": random.randint(1, 100)}],
+            "assignments": [str(uuid.uuid4()) for i in range(2)],
+            "assignments_status": [6, 6],
+            "status": 6,
+            "updated_by": "Orchestration.API",
+            "created_at": int(time.time()),
+            "updated_at": int(time.time())}
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Entity codec decode benchmark")
+    parser.add_argument("--entities", type=int, default=100000)
+    args = parser.parse_args()
+
+    entities = [deployment() for i in range(args.entities)]
+
+    print("%10s %12s %14s %12s" % ("format", "size (MB)", "entities/s", "MB/s"))
+    for fmt in entityCodec.available_formats():
+        values = [entityCodec.encode(entity, fmt) for entity in entities]
+        values = [value.encode("utf-8") if isinstance(value, str) else value for value in values]
+        size = sum([len(value) for value in values]) / 1048576.0
+
+        start = time.perf_counter()
+        for value in values:
+            entityCodec.decode(value)
+        duration = time.perf_counter() - start
+
+        print("%10s %12.1f %14.0f %12.1f" % (fmt, size, len(values) / duration, size / duration))
@@ -0,0 +1,53 @@
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, "serrano_orchestrator/orchestration_api")
+
+import rootCause
+
+# Root cause scoring of a batch of anomalies with the RootCauseEngine against the per-anomaly loop it replaces, e.g.:
+#   python benchmarks/root_cause.py --anomalies 100 --features 10000
+
+
+def legacy_worker_nodes(shap_values, threshold):
+    affected_worker_nodes = []
+    for k, v in shap_values.items():
+        worker_node = k.split("_")[-1]
+        if v >= threshold and worker_node not in affected_worker_nodes:
+            affected_worker_nodes.append(worker_node)
+    return affected_worker_nodes
+
+
+def shap_values(features, nodes):
+    metrics = features // nodes + 1
+    return {"metric%s_node%s" % (m, n): random.gauss(0.0, 1.0) for m in range(metrics) for n in range(nodes)}
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Root cause scoring benchmark")
+    parser.add_argument("--anomalies", type=int, default=100)
+    parser.add_argument("--features", type=int, default=10000)
+    parser.add_argument("--nodes", type=int, default=200)
+    parser.add_argument("--threshold", type=float, default=2.5)
+    args = parser.parse_args()
+
+    batch = [shap_values(args.features, args.nodes) for i in range(args.anomalies)]
+    engine = rootCause.RootCauseEngine(args.threshold, {"aggregation": "max"})
+
+    start = time.perf_counter()
+    legacy = [legacy_worker_nodes(values, args.threshold) for values in batch]
+    legacy_duration = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = engine.worker_nodes(batch)
+    duration = time.perf_counter() - start
+
+    same_nodes = legacy == results
+
+    print("%s anomalies x %s features" % (args.anomalies, len(batch[0])))
+    print("loop:   %8.1f ms" % (legacy_duration * 1000))
+    print("engine: %8.1f ms" % (duration * 1000))
+    print("same worker nodes: %s" % same_nodes)
@@ -27,6 +27,10 @@ class DriverInterface(metaclass=abc.ABCMeta):
             logger.error(str(err))
             return None
 
+    def monitor(self):
+        # Called on every monitoring cycle of the driver
+        pass
+
     @abc.abstractmethod
     def get_cluster_info(self):
         pass
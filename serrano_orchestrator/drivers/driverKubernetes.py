@@ -2,6 +2,7 @@ import json
 import time
 import logging
 import requests
+import threading
 
 from kubernetes import client
 
@@ -27,6 +28,9 @@ class DriverKubernetes(driverInterface.DriverInterface):
         self.__orchestrator_service = self.config["orchestrator"]["orchestrator_service"]
         self.__api_client()
         self.__k8s_deployments = self.__load_k8s_deployments()
+        # assignment_uuid -> (monitoring data, deadline) of the Assignments whose Pods are not all scheduled yet
+        self.__lock = threading.Lock()
+        self.__unplaced = {}
 
 
     def __load_k8s_deployments(self):
@@ -126,12 +130,48 @@ class DriverKubernetes(driverInterface.DriverInterface):
                                                                         body=bundle_description)
                 data["k8s_deployment_uuid"] = r.metadata.uid
 
+            # Label selector of the Deployment Pods, used to report their placement
+            match_labels = r.spec.selector.match_labels or {}
+            data["k8s_deployment_selector"] = ",".join(["%s=%s" % (k, v) for k, v in sorted(match_labels.items())])
+
             return data
 
         except Exception as e:
             logger.error(str(e))
             return None
 
+    def __k8s_worker_nodes(self, k8s_deployments):
+        # Fills in the worker nodes of the Pods of the Deployments, returns whether all the Pods are scheduled
+        scheduled = True
+        for d in k8s_deployments:
+            if not d.get("k8s_deployment_selector", ""):
+                continue
+            try:
+                pods = self.__api_core_client.list_namespaced_pod(namespace=d["k8s_deployment_namespace"],
+                                                                  label_selector=d["k8s_deployment_selector"])
+                nodes = [pod.spec.node_name for pod in pods.items if pod.spec.node_name]
+                scheduled = scheduled and len(nodes) == len(pods.items) and len(nodes) > 0
+                d["k8s_worker_nodes"] = sorted(set(nodes))
+            except Exception as e:
+                scheduled = False
+                logger.error("Unable to get the Pods of Deployment '%s'" % d["k8s_deployment_name"])
+                logger.error(str(e))
+        return scheduled
+
+    def monitor(self):
+        # Completes the worker nodes of the Assignments whose Pods were not all scheduled when they were deployed, and
+        # reports them when they change, until they are all scheduled or placement_timeout seconds have elapsed
+        with self.__lock:
+            unplaced = list(self.__unplaced.items())
+        for assignment_uuid, (monitoring_data, deadline) in unplaced:
+            k8s_params = monitoring_data["k8s_params"]
+            previous = [d.get("k8s_worker_nodes", []) for d in k8s_params]
+            if self.__k8s_worker_nodes(k8s_params) or time.time() >= deadline:
+                with self.__lock:
+                    self.__unplaced.pop(assignment_uuid, None)
+            if [d.get("k8s_worker_nodes", []) for d in k8s_params] != previous:
+                self.__put_assignment_monitoring_data(monitoring_data)
+
     def __post_log_data(self, data):
         logger.debug("__post_log_data")
         logger.debug(json.dumps(data))
@@ -243,6 +283,12 @@ class DriverKubernetes(driverInterface.DriverInterface):
                                "assignment_uuid": request["uuid"],
                                "k8s_params": self.__k8s_deployments[request["uuid"]]}
 
+            # The worker nodes of the Pods that are not scheduled yet are filled in by the next monitoring cycles
+            if not self.__k8s_worker_nodes(self.__k8s_deployments[request["uuid"]]):
+                with self.__lock:
+                    self.__unplaced[request["uuid"]] = (monitoring_data, time.time() +
+                                                        self.__driver_k8s_conf.get("placement_timeout", 300))
+
             self.__put_assignment_monitoring_data(monitoring_data)
 
             logger.info("Deployment for assignment '%s' successfully executed" % request["uuid"])
@@ -293,6 +339,8 @@ class DriverKubernetes(driverInterface.DriverInterface):
                                                                         namespace=d["k8s_deployment_namespace"],
                                                                         body=del_options)
                 del self.__k8s_deployments[assignment_uuid]
+            with self.__lock:
+                self.__unplaced.pop(assignment_uuid, None)
 
             logger.info("Termination request for Assignment '%s' successfully executed" % assignment_uuid)
 
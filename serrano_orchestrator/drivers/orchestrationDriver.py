@@ -8,6 +8,8 @@ import requests
 from PyQt5.QtCore import QObject
 from PyQt5.QtCore import pyqtSignal
 
+from serrano_orchestrator.utils import entityCodec
+
 logger = logging.getLogger("SERRANO.Orchestrator.OrchestrationDriver")
 
 
@@ -49,7 +51,7 @@ class OrchestrationDriver(QObject):
         logger.info("Assignment event(s) ...")
         for event in etcd_events.events:
             if isinstance(event, etcd3.events.PutEvent):
-                event_value = json.loads(event.value.decode("utf-8"))
+                event_value = entityCodec.decode(event.value)
                 if event_value["updated_by"] == "Orchestration.Manager":
                     logger.info("Assignment event for key '%s'" % event.key.decode("utf-8"))
                     self.orchestrationManagerDeploymentRequest.emit(event_value)
@@ -27,6 +27,7 @@ class OrchestrationDriverInstance(QObject):
 
         self.cluster_uuid = None
         self.statusTimer = None
+        self.monitoringTimer = None
         self.platformInterface = None
         self.orchestrationDriver = None
 
@@ -68,6 +69,10 @@ class OrchestrationDriverInstance(QObject):
         self.statusTimer.timeout.connect(self.orchestrationDriver.heartbeat)
         self.statusTimer.start(int(self.config["heartbeat"]) * 1000)
 
+        self.monitoringTimer = QTimer(self)
+        self.monitoringTimer.timeout.connect(self.platformInterface.monitor)
+        self.monitoringTimer.start(int(self.config.get("monitoring_interval", 5) * 1000))
+
         self.logger.info("SERRANO Orchestration Driver is ready ...")
 
 
@@ -0,0 +1,187 @@
+import math
+import time
+import logging
+import threading
+
+from serrano_orchestrator.utils import entityCodec
+
+logger = logging.getLogger("SERRANO.Orchestrator.AnomalyCoalescer")
+
+ANOMALIES_PREFIX = "/serrano/orchestrator/anomalies/"
+PENDING_PREFIX = ANOMALIES_PREFIX + "pending/"
+COOLDOWN_PREFIX = ANOMALIES_PREFIX + "cooldown/"
+
+MAX_UPDATE_ATTEMPTS = 5
+
+
+class AnomalyCoalescer:
+    # Merges the anomalies that affect the same Assignment within a time window, so that a burst of EDE reports
+    # triggers a single redeployment with the union of the affected placements and worker nodes. A Deployment that
+    # was redeployed is not redeployed again before the cooldown has elapsed, anomalies about it are dropped meanwhile.
+    #
+    # Every API worker process handles a share of the EDE events, so the state lives in etcd where all of them see it.
+    # The anomalies of an Assignment are merged into its pending key, the process that created the key flushes it when
+    # the window elapses. A redeployment first creates the cooldown key of its Deployment, only the process that
+    # creates it redeploys. Both keys are attached to a lease, so they expire after the window or the cooldown even if
+    # the process that created them stops.
+
+    def __init__(self, etcd_client, trigger, anomalies_conf):
+
+        self.__etcdClient = etcd_client
+        # trigger(affected_deployments, affected_worker_nodes) returns True when the Deployment was redeployed
+        self.__trigger = trigger
+        self.__window = anomalies_conf.get("coalescing_window", 30)
+        self.__cooldown = anomalies_conf.get("redeployment_cooldown", 300)
+        # The pending key outlives the window of the process that flushes it, the cooldown key lasts the cooldown
+        self.__pending_ttl = int(math.ceil(self.__window)) * 2 + 1
+        self.__cooldown_ttl = max(1, int(math.ceil(self.__cooldown)))
+
+        self.__lock = threading.Lock()
+        # assignment_uuid -> flush timer, for the pending keys created by this process
+        self.__pending = {}
+
+        self.__anomalies = 0
+        self.__coalesced = 0
+        self.__suppressed = 0
+        self.__redeployments = 0
+
+    def __cooling_down(self, deployment_uuid):
+        value, metadata = self.__etcdClient.get(COOLDOWN_PREFIX + deployment_uuid)
+        return value is not None
+
+    @staticmethod
+    def __merge(pending, affected_deployments, affected_worker_nodes):
+        for placement in affected_deployments:
+            if placement not in pending["placements"]:
+                pending["placements"].append(placement)
+        for worker_node in affected_worker_nodes:
+            if worker_node not in pending["worker_nodes"]:
+                pending["worker_nodes"].append(worker_node)
+        return pending
+
+    def __create_pending(self, assignment_uuid, pending):
+        key = PENDING_PREFIX + assignment_uuid
+        lease = self.__etcdClient.lease(self.__pending_ttl)
+        succeeded, responses = self.__etcdClient.transaction(
+            compare=[self.__etcdClient.transactions.version(key) == 0],
+            success=[self.__etcdClient.transactions.put(key, entityCodec.encode(pending), lease=lease)],
+            failure=[])
+        if not succeeded:
+            lease.revoke()
+            return False
+        timer = threading.Timer(self.__window, self.__flush, [assignment_uuid])
+        timer.daemon = True
+        with self.__lock:
+            self.__pending[assignment_uuid] = timer
+        timer.start()
+        return True
+
+    def submit(self, affected_deployments, affected_worker_nodes):
+        # The affected placements of a single Assignment
+        assignment_uuid = affected_deployments[0]["assignment_uuid"]
+        deployment_uuid = affected_deployments[0]["deployment_uuid"]
+        with self.__lock:
+            self.__anomalies += 1
+        if self.__cooling_down(deployment_uuid):
+            with self.__lock:
+                self.__suppressed += 1
+            logger.info("Deployment '%s' was redeployed recently, anomaly suppressed" % deployment_uuid)
+            return
+
+        key = PENDING_PREFIX + assignment_uuid
+        for attempt in range(MAX_UPDATE_ATTEMPTS):
+            value, metadata = self.__etcdClient.get(key)
+            if value is None:
+                pending = self.__merge({"deployment_uuid": deployment_uuid, "placements": [], "worker_nodes": []},
+                                       affected_deployments, affected_worker_nodes)
+                if self.__create_pending(assignment_uuid, pending):
+                    return
+                continue
+            pending = self.__merge(entityCodec.decode(value), affected_deployments, affected_worker_nodes)
+            succeeded, responses = self.__etcdClient.transaction(
+                compare=[self.__etcdClient.transactions.mod(key) == metadata.mod_revision],
+                success=[self.__etcdClient.transactions.put(key, entityCodec.encode(pending),
+                                                             lease=metadata.lease_id)],
+                failure=[])
+            if succeeded:
+                with self.__lock:
+                    self.__coalesced += 1
+                return
+        logger.error("Unable to record anomaly of Assignment '%s' after %s attempts" % (assignment_uuid,
+                                                                                       MAX_UPDATE_ATTEMPTS))
+
+    def __take(self, key):
+        # Reads and deletes the pending key, unless it was merged into in between
+        for attempt in range(MAX_UPDATE_ATTEMPTS):
+            value, metadata = self.__etcdClient.get(key)
+            if value is None:
+                return None
+            succeeded, responses = self.__etcdClient.transaction(
+                compare=[self.__etcdClient.transactions.mod(key) == metadata.mod_revision],
+                success=[self.__etcdClient.transactions.delete(key)],
+                failure=[])
+            if succeeded:
+                return entityCodec.decode(value)
+        return None
+
+    def __flush(self, assignment_uuid):
+        with self.__lock:
+            if self.__pending.pop(assignment_uuid, None) is None:
+                return
+
+        try:
+            pending = self.__take(PENDING_PREFIX + assignment_uuid)
+            if pending is None:
+                return
+            deployment_uuid = pending["deployment_uuid"]
+            key = COOLDOWN_PREFIX + deployment_uuid
+            cooldown = self.__etcdClient.lease(self.__cooldown_ttl)
+            succeeded, responses = self.__etcdClient.transaction(
+                compare=[self.__etcdClient.transactions.version(key) == 0],
+                success=[self.__etcdClient.transactions.put(key, str(int(time.time())), lease=cooldown)],
+                failure=[])
+            if not succeeded:
+                cooldown.revoke()
+                with self.__lock:
+                    self.__suppressed += 1
+                return
+        except Exception as e:
+            logger.error("Unable to flush the anomalies of Assignment '%s'" % assignment_uuid)
+            logger.error(str(e))
+            return
+
+        logger.info("Redeployment of Assignment '%s' for worker node(s) %s" % (assignment_uuid,
+                                                                               pending["worker_nodes"]))
+        redeployed = False
+        try:
+            redeployed = self.__trigger(pending["placements"], pending["worker_nodes"])
+        except Exception as e:
+            logger.error("Unable to redeploy Assignment '%s'" % assignment_uuid)
+            logger.error(str(e))
+
+        if redeployed:
+            with self.__lock:
+                self.__redeployments += 1
+            return
+        # Only a redeployment starts the cooldown
+        try:
+            cooldown.revoke()
+        except Exception as e:
+            logger.error("Unable to release the cooldown of Deployment '%s'" % deployment_uuid)
+            logger.error(str(e))
+
+    def close(self):
+        # The pending keys of this process expire with their lease
+        with self.__lock:
+            for timer in self.__pending.values():
+                timer.cancel()
+            self.__pending.clear()
+
+    def stats(self):
+        # The counters of this process
+        with self.__lock:
+            return {"pending": len(self.__pending),
+                    "anomalies": self.__anomalies,
+                    "coalesced": self.__coalesced,
+                    "suppressed": self.__suppressed,
+                    "redeployments": self.__redeployments}
@@ -0,0 +1,188 @@
+import os
+import time
+
+from prometheus_client import Histogram, CollectorRegistry, REGISTRY, CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client import multiprocess
+from prometheus_client.core import GaugeMetricFamily
+
+# Prometheus metrics of the Orchestrator API. With several worker processes PROMETHEUS_MULTIPROC_DIR must point to an
+# empty directory shared by the workers, so that a scrape of any worker reports the histograms of all of them.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+REQUEST_LATENCY = Histogram("serrano_orchestrator_api_request_duration_seconds",
+                            "Latency of the Orchestrator API requests per route",
+                            ["method", "route", "status"], buckets=LATENCY_BUCKETS)
+
+ETCD_LATENCY = Histogram("serrano_orchestrator_etcd_operation_duration_seconds",
+                         "Latency of the etcd operations of the Orchestrator API",
+                         ["operation"], buckets=LATENCY_BUCKETS)
+
+ETCD_VALUE_SIZE = Histogram("serrano_orchestrator_etcd_value_size_bytes",
+                            "Size of the values read from and written to etcd",
+                            ["operation"], buckets=SIZE_BUCKETS)
+
+OUTBOUND_LATENCY = Histogram("serrano_orchestrator_outbound_request_duration_seconds",
+                             "Latency of the requests to external services (CTH, EDE, secure storage)",
+                             ["service", "method", "status"], buckets=LATENCY_BUCKETS)
+
+_stats_sources = []
+
+
+def multiprocess_mode():
+    return "PROMETHEUS_MULTIPROC_DIR" in os.environ or "prometheus_multiproc_dir" in os.environ
+
+
+def _numeric(value):
+    return not isinstance(value, bool) and isinstance(value, (int, float))
+
+
+class StatsCollector:
+    # Exposes the numeric values of the service statistics (e.g. cache, metric logs) as gauges. A nested
+    # {label value: {key: value}} statistic (e.g. the notification partitions) gives one gauge per key, labeled with
+    # the name of the statistic.
+
+    def collect(self):
+        labels = {"pid": str(os.getpid())} if multiprocess_mode() else {}
+        for name, stats in _stats_sources:
+            for key, value in stats().items():
+                if isinstance(value, dict):
+                    gauges = {}
+                    for label_value, label_stats in value.items():
+                        for label_key, label_stat in label_stats.items():
+                            if not _numeric(label_stat):
+                                continue
+                            if label_key not in gauges:
+                                gauges[label_key] = GaugeMetricFamily("serrano_orchestrator_%s_%s_%s" % (
+                                    name, key, label_key), "%s %s %s" % (name, key, label_key),
+                                    labels=list(labels.keys()) + [key])
+                            gauges[label_key].add_metric(list(labels.values()) + [label_value], label_stat)
+                    yield from gauges.values()
+                    continue
+                if not _numeric(value):
+                    continue
+                gauge = GaugeMetricFamily("serrano_orchestrator_%s_%s" % (name, key), "%s %s" % (name, key),
+                                          labels=list(labels.keys()))
+                gauge.add_metric(list(labels.values()), value)
+                yield gauge
+
+
+def add_stats(name, stats):
+    _stats_sources.append((name, stats))
+
+
+def render():
+    # Returns the exposition of the metrics and its content type
+    if multiprocess_mode():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    output = generate_latest(registry)
+    if _stats_sources:
+        stats_registry = CollectorRegistry()
+        stats_registry.register(StatsCollector())
+        output += generate_latest(stats_registry)
+    return output, CONTENT_TYPE_LATEST
+
+
+class RequestMetrics:
+    # ASGI middleware that observes the latency of every request under its route template, so that requests for
+    # different entities of the same route share a histogram
+
+    def __init__(self, app):
+        self.app = app
+        self.__routes = None
+
+    def __route(self, scope):
+        if self.__routes is None:
+            self.__routes = {route.endpoint: route.path for route in scope["app"].routes
+                             if hasattr(route, "endpoint")}
+        return self.__routes.get(scope.get("endpoint", None), "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        response_status = [500]
+
+        async def send_message(message):
+            if message["type"] == "http.response.start":
+                response_status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_message)
+        finally:
+            REQUEST_LATENCY.labels(scope["method"], self.__route(scope),
+                                   str(response_status[0])).observe(time.perf_counter() - start)
+
+
+class KVStubMetrics:
+
+    def __init__(self, kvstub):
+        self.__kvstub = kvstub
+
+    def Range(self, *args, **kwargs):
+        start = time.perf_counter()
+        response = self.__kvstub.Range(*args, **kwargs)
+        ETCD_LATENCY.labels("range").observe(time.perf_counter() - start)
+        for kv in response.kvs:
+            ETCD_VALUE_SIZE.labels("range").observe(len(kv.value))
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self.__kvstub, name)
+
+
+class EtcdClientMetrics:
+    # Wraps an etcd3 client and observes the latency of its key-value operations and the size of their values. The
+    # range requests that are built by etcdRange go through the wrapped kvstub.
+
+    def __init__(self, etcd_client):
+        self.__etcd_client = etcd_client
+        self.kvstub = KVStubMetrics(etcd_client.kvstub)
+
+    def get(self, key, **kwargs):
+        start = time.perf_counter()
+        result = self.__etcd_client.get(key, **kwargs)
+        ETCD_LATENCY.labels("get").observe(time.perf_counter() - start)
+        if result[0] is not None:
+            ETCD_VALUE_SIZE.labels("get").observe(len(result[0]))
+        return result
+
+    def get_prefix(self, key_prefix, **kwargs):
+        start = time.perf_counter()
+        results = list(self.__etcd_client.get_prefix(key_prefix, **kwargs))
+        ETCD_LATENCY.labels("get_prefix").observe(time.perf_counter() - start)
+        for value, metadata in results:
+            ETCD_VALUE_SIZE.labels("get_prefix").observe(len(value or b""))
+        return results
+
+    def put(self, key, value, **kwargs):
+        ETCD_VALUE_SIZE.labels("put").observe(len(value))
+        start = time.perf_counter()
+        result = self.__etcd_client.put(key, value, **kwargs)
+        ETCD_LATENCY.labels("put").observe(time.perf_counter() - start)
+        return result
+
+    def delete(self, key, **kwargs):
+        start = time.perf_counter()
+        result = self.__etcd_client.delete(key, **kwargs)
+        ETCD_LATENCY.labels("delete").observe(time.perf_counter() - start)
+        return result
+
+    def transaction(self, compare, success=None, failure=None):
+        for op in success or []:
+            if hasattr(op, "value"):
+                ETCD_VALUE_SIZE.labels("transaction").observe(len(op.value))
+        start = time.perf_counter()
+        result = self.__etcd_client.transaction(compare, success=success, failure=failure)
+        ETCD_LATENCY.labels("transaction").observe(time.perf_counter() - start)
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self.__etcd_client, name)
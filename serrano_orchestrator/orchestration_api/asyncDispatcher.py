@@ -0,0 +1,47 @@
+import asyncio
+import logging
+import functools
+import itertools
+import concurrent.futures
+
+logger = logging.getLogger("SERRANO.Orchestrator.AsyncDispatcher")
+
+STREAM_BATCH_SIZE = 500
+
+
+class AsyncDispatcher:
+    # Exposes the Dispatcher methods as coroutines. The blocking etcd and HTTP calls run on a bounded pool of
+    # worker threads, so the event loop keeps serving concurrent requests while they are in progress.
+
+    def __init__(self, dispatcher, dispatcher_conf):
+
+        self.__dispatcher = dispatcher
+        self.__max_workers = dispatcher_conf.get("max_workers", 32)
+        self.__executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.__max_workers,
+                                                                thread_name_prefix="dispatcher")
+
+        logger.info("AsyncDispatcher is ready with %s worker(s) ..." % self.__max_workers)
+
+    async def run(self, func, *args, **kwargs):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.__executor, functools.partial(func, *args, **kwargs))
+
+    async def stream(self, name, *args, **kwargs):
+        # Iterates a Dispatcher generator, its rows are produced in batches on the worker pool
+        rows = getattr(self.__dispatcher, name)(*args, **kwargs)
+        while True:
+            batch = await self.run(lambda: list(itertools.islice(rows, STREAM_BATCH_SIZE)))
+            if not batch:
+                return
+            yield batch
+
+    def __getattr__(self, name):
+        method = getattr(self.__dispatcher, name)
+
+        async def call(*args, **kwargs):
+            return await self.run(method, *args, **kwargs)
+
+        return call
+
+    def shutdown(self):
+        self.__executor.shutdown(wait=False)
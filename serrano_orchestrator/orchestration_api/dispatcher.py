@@ -1,40 +1,66 @@
 import json
 import time
 import etcd3
+import collections
 import logging
-import requests
 import traceback
-from PyQt5.QtCore import QObject
 
 from serrano_orchestrator.utils import status
 from serrano_orchestrator.utils import requestType
+from serrano_orchestrator.utils import entityLogs
+from serrano_orchestrator.utils import etcdRange
+from serrano_orchestrator.utils import etcdBatch
+from serrano_orchestrator.utils import entityCodec
+from serrano_orchestrator.utils import entityChunks
+
+import entityCache
+import grafanaViews
+import logRevisions
+import placementIndex
+import anomalyCoalescer
+import rootCause
+import serviceClient
+import metricForwarder
+import apiMetrics
 
 logger = logging.getLogger("SERRANO.Orchestrator.Dispatcher")
 
+MAX_UPDATE_ATTEMPTS = 5
+# Most operations the document of an entity takes in a transaction, i.e. its put and the removal of its chunks
+ENTITY_OPS = 3
+MAX_PAGE_SIZE = 1000
+STREAM_PAGE_SIZE = 500
 
-class Dispatcher(QObject):
 
-    def __init__(self, etcd_host, etcd_port, cth_service, ede_conf):
+class Dispatcher:
 
-        super(QObject, self).__init__()
+    def __init__(self, etcd_host, etcd_port, cth_service, ede_conf, cache_conf, http_conf, grafana_conf, metrics_conf,
+                 anomalies_conf, max_txn_ops=128):
 
-        self.__etcdClient = etcd3.client(host=etcd_host, port=etcd_port, grpc_options={
+        self.__etcdClient = apiMetrics.EtcdClientMetrics(etcd3.client(host=etcd_host, port=etcd_port, grpc_options={
                         'grpc.max_send_message_length': 41943040,
                         'grpc.max_receive_message_length': 41943040,
-                    }.items())
-        self.__cth_service = cth_service
-        self.__ede_service = ede_conf.get("service", "")
+                    }.items()))
+        # Must not exceed the --max-txn-ops of the etcd cluster
+        self.__max_txn_ops = max_txn_ops
+        self.__cth_client = serviceClient.ServiceClient("cth", cth_service, http_conf)
+        self.__metric_forwarder = metricForwarder.MetricForwarder(self.__cth_client, metrics_conf)
+        self.__ede_client = serviceClient.ServiceClient("ede", ede_conf.get("service", ""), http_conf)
         self.__ede_username = ede_conf.get("username", "")
         self.__ede_password = ede_conf.get("password", "")
-        self.__shape_value_threshold = ede_conf.get("shape_value_threshold", 0)
-
-    def __extract_root_cause_worker_nodes(self, shape_values):
-        affected_worker_nodes = []
-        for k, v in shape_values.items():
-            worker_node = k.split("_")[-1]
-            if v >= self.__shape_value_threshold and worker_node not in affected_worker_nodes:
-                affected_worker_nodes.append(worker_node)
-        return affected_worker_nodes
+        self.__root_cause = rootCause.RootCauseEngine(ede_conf.get("shape_value_threshold", 0),
+                                                      ede_conf.get("root_cause", {}))
+        self.__cache = entityCache.EntityCache(self.__etcdClient, "/serrano/orchestrator/", cache_conf,
+                                               [entityLogs.LOGS_PREFIX, entityChunks.CHUNKS_PREFIX,
+                                                anomalyCoalescer.ANOMALIES_PREFIX])
+        self.__views = grafanaViews.GrafanaViews(self.__etcdClient, grafana_conf)
+        self.__cache.add_listener(self.__views)
+        self.__log_revisions = logRevisions.LogRevisions(self.__etcdClient)
+        self.__cache.add_listener(self.__log_revisions)
+        self.__placements = placementIndex.PlacementIndex(self.__etcdClient)
+        self.__cache.add_listener(self.__placements)
+        self.__anomalies = anomalyCoalescer.AnomalyCoalescer(self.__etcdClient, self.__trigger_assignment_redeployment,
+                                                            anomalies_conf)
 
     def __trigger_assignment_redeployment(self, affected_deployments, affected_worker_nodes):
 
@@ -43,7 +69,7 @@ class Dispatcher(QObject):
 
         current_assignment = self.__get_assignment_by_uuid(affected_deployments[0]["assignment_uuid"])
         deployment_uuid = current_assignment["deployment_uuid"]
-        current_deployment = self.get_deployments(deployment_uuid=deployment_uuid)[0]
+        current_deployment = self.__get_entity("/serrano/orchestrator/deployments/deployment/%s" % deployment_uuid)
 
         for dep in affected_deployments:
             affected_bundles.append(dep["bundle_uuid"])
@@ -52,83 +78,279 @@ class Dispatcher(QObject):
 
             if len(affected_bundles) == len(current_assignment["bundles"]):
 
-                self.delete_deployment(deployment_uuid)
+                self.delete_deployment(deployment_uuid, keep_logs=True)
+                self.notify_deployment_deletion(deployment_uuid)
 
                 current_deployment["deployment_objectives"] = [{"affected_cluster_uuid": current_assignment["cluster_uuid"],
                                                                 "affected_worker_nodes": affected_worker_nodes,
                                                                 "affected_deployments": affected_deployments}]
                 current_deployment["assignments"] = []
                 current_deployment["assignments_status"] = [1]
-                current_deployment["logs"].append({"timestamp": int(time.time()), "event": "Trigger Redeployment"})
                 current_deployment["updated_by"] = "Orchestration.API"
                 current_deployment["updated_at"] = int(time.time())
 
-                self.__etcdClient.put("/serrano/orchestrator/deployments/deployment/%s" % deployment_uuid,
-                                      json.dumps(current_deployment))
+                self.__put_entity("Deployment", deployment_uuid, current_deployment,
+                                  [{"timestamp": int(time.time()), "event": "Trigger Redeployment"}])
+                return True
+
+            return False
 
         except Exception as e:
             logger.error(str(e))
             return False
 
     def __get_assignment_cluster_uuid(self, assignment_uuid):
-        cluster_uuid = None
         if len(assignment_uuid) == 0:
             return ""
-        for result in self.__etcdClient.get_prefix("/serrano/orchestrator/assignments"):
-            print(result[1].key.decode("utf-8"))
-            print("assignment_uuid = '%s'" % assignment_uuid)
-            if result[1].key.decode("utf-8").find(assignment_uuid) != -1:
-                return result[1].key.decode("utf-8").split("/")[4]
-        return cluster_uuid
+        result = self.__cache.get_raw("/serrano/orchestrator/index/assignments/%s" % assignment_uuid)
+        if result is not None:
+            return result
+        # Assignments created before the index was introduced, locate them once and backfill their index key
+        for result in self.__etcdClient.get_prefix("/serrano/orchestrator/assignments", keys_only=True):
+            key = result[1].key.decode("utf-8")
+            if key.split("/")[-1] == assignment_uuid:
+                cluster_uuid = key.split("/")[4]
+                self.__etcdClient.put("/serrano/orchestrator/index/assignments/%s" % assignment_uuid, cluster_uuid)
+                return cluster_uuid
+        return None
+
+    def __get_assignment_key(self, assignment_uuid):
+        cluster_uuid = self.__get_assignment_cluster_uuid(assignment_uuid)
+        if not cluster_uuid:
+            return None
+        return "/serrano/orchestrator/assignments/%s/assignment/%s" % (cluster_uuid, assignment_uuid)
 
     def __get_assignment_by_uuid(self, assignment_uuid):
-        assignment = None
-        for result in self.__etcdClient.get_prefix("/serrano/orchestrator/assignments"):
-            if result[1].key.decode("utf-8").find(assignment_uuid) != -1:
-                return json.loads(result[0].decode("utf-8"))
-        return assignment
+        key = self.__get_assignment_key(assignment_uuid)
+        if key is None:
+            return None
+        return self.__cache.get(key)
+
+    def __get_entity(self, key):
+        # Read-modify-write paths bypass the cache, whose values are shared between readers
+        entity, metadata = entityChunks.get(self.__etcdClient, key)
+        return entity
+
+    def __entity_key(self, kind, entity_uuid):
+        if kind == "Deployment":
+            return "/serrano/orchestrator/deployments/deployment/%s" % entity_uuid
+        elif kind == "Assignment":
+            return self.__get_assignment_key(entity_uuid)
+        elif kind == "Bundle":
+            return "/serrano/orchestrator/bundles/bundle/%s" % entity_uuid
+        elif kind in ["FaaS", "Kernel"]:
+            return "/serrano/orchestrator/kernels/kernel/%s" % entity_uuid
+        elif kind == "StoragePolicy":
+            return "/serrano/orchestrator/storage_policies/policy/%s" % entity_uuid
+        return None
+
+    def __entity_ops(self, kind, entity_uuid, key, entity, events):
+        # The entity document holds only its current state, log events are appended as separate keys. Documents
+        # written before the log segments were introduced have their embedded logs moved out on their next write.
+        entityLogs.migrate(self.__etcdClient, kind, entity_uuid, entity, self.__max_txn_ops)
+        return entityChunks.put_ops(self.__etcdClient, key, entity) + \
+            entityLogs.put_ops(self.__etcdClient, kind, entity_uuid, events)
+
+    def __commit(self, compare, ops):
+        # Returns False when the compare fails, the chunks written for the ops are removed then
+        try:
+            succeeded, responses = self.__etcdClient.transaction(compare=compare, success=ops, failure=[])
+        except Exception:
+            entityChunks.discard(self.__etcdClient, ops)
+            raise
+        if not succeeded:
+            entityChunks.discard(self.__etcdClient, ops)
+        else:
+            self.__cache.written([op.key for op in ops])
+        return succeeded
+
+    def __put_entity(self, kind, entity_uuid, entity, events):
+        # Writes the whole entity whatever its current value, guarded by the revision of that value so that the
+        # chunks of a concurrent write are never removed under it
+        key = self.__entity_key(kind, entity_uuid)
+        for attempt in range(MAX_UPDATE_ATTEMPTS):
+            result, metadata = self.__etcdClient.get(key)
+            if self.__commit(entityChunks.compare(self.__etcdClient, key, metadata),
+                             self.__entity_ops(kind, entity_uuid, key, entity, events)):
+                return True
+            logger.debug("Concurrent modification of '%s', retry write (%s/%s)" % (key, attempt + 1,
+                                                                                 MAX_UPDATE_ATTEMPTS))
+        logger.error("Unable to write '%s' after %s attempts" % (key, MAX_UPDATE_ATTEMPTS))
+        return False
 
-    def get_clusters(self, active):
-        data = []
+    def __put_entities(self, kind, uuid_field, entities, prepare):
+        # The entities are written in as many transactions as the etcd operations limit requires, each transaction
+        # creates all its entities or none of them. Returns the uuids of the entities written, in order: when a
+        # transaction fails, the entities of the following ones are not written either. The ops of an entity, and so
+        # its chunks, are only built once the transaction they go to is known, so a failed transaction is the only one
+        # whose chunks have to be discarded.
+        def commit(compare, ops, uuids):
+            try:
+                if self.__commit(compare, ops):
+                    return True
+                logger.error("Unable to create %s %s, one of them already exists" % (kind, uuids))
+            except Exception as e:
+                logger.error("Unable to create %s %s" % (kind, uuids))
+                logger.error(str(e))
+            return False
+
+        written = []
+        batch_uuids = []
+        compare = []
+        ops = []
+        for params in entities:
+            events = prepare(params)
+            key = self.__entity_key(kind, params[uuid_field])
+            if ops and len(ops) + ENTITY_OPS + len(events) > self.__max_txn_ops:
+                if not commit(compare, ops, batch_uuids):
+                    return written
+                written += batch_uuids
+                batch_uuids, compare, ops = [], [], []
+            # The entities have new uuids, their keys are expected not to exist
+            compare += entityChunks.compare(self.__etcdClient, key, None)
+            ops += self.__entity_ops(kind, params[uuid_field], key, params, events)
+            batch_uuids.append(params[uuid_field])
+        if ops and commit(compare, ops, batch_uuids):
+            written += batch_uuids
+        return written
+
+    def __get_logs(self, kind, entity_uuid, entity):
+        logs, next_cursor = entityLogs.read(self.__etcdClient, kind, entity_uuid)
+        return entity.get("logs", []) + logs if entity else logs
+
+    def add_cache_listener(self, listener):
+        self.__cache.add_listener(listener)
+
+    def get_entity_status(self, kind, entity_uuid):
+        # Current status and revision of an entity, None when it does not exist
+        key = self.__entity_key(kind, entity_uuid)
+        entity = self.__cache.get(key) if key else None
+        if entity is None:
+            return None
+        return entity["status"], self.__cache.get_revision(key)
+
+    def get_etag(self, resource, entity_uuid):
+        # Entity tags are built from the etcd revisions of the keys a response is read from, so that unchanged
+        # entities are recognized without decoding or serializing them. Missing entities have no entity tag.
+        if resource in ["Deployment", "DeploymentLogs"]:
+            if self.__cache.get_revision("/serrano/orchestrator/deployments/deployment/%s" % entity_uuid) == 0:
+                return None
+        elif self.__cache.get_revision("/serrano/orchestrator/kernels/kernel/%s" % entity_uuid) == 0:
+            return None
+        if resource == "Deployment":
+            revisions = [self.__cache.get_revision("/serrano/orchestrator/deployments/deployment/%s" % entity_uuid)]
+        elif resource == "DeploymentLogs":
+            revisions = [self.__cache.get_revision("/serrano/orchestrator/deployments/deployment/%s" % entity_uuid),
+                         self.__log_revisions.get("Deployment", entity_uuid)]
+        else:
+            key = "/serrano/orchestrator/kernels/kernel/%s" % entity_uuid
+            revisions = [self.__cache.get_revision(key), self.__log_revisions.get(resource, entity_uuid)]
+            kernel = self.__cache.get(key)
+            assignment_key = self.__get_assignment_key(kernel["assignment_uuid"]) if kernel else None
+            if assignment_key:
+                revisions += [self.__cache.get_revision(assignment_key),
+                              self.__log_revisions.get("Assignment", kernel["assignment_uuid"])]
+                assignment = self.__cache.get(assignment_key)
+                for bundle_uuid in assignment["bundles"] if assignment else []:
+                    revisions += [self.__cache.get_revision("/serrano/orchestrator/bundles/bundle/%s" % bundle_uuid),
+                                  self.__log_revisions.get("Bundle", bundle_uuid)]
+        return '"%s"' % "-".join([str(revision) for revision in revisions])
+
+    def get_entity_logs(self, segment, entity_uuid, **kwargs):
+        kind = entityLogs.SEGMENT_KINDS.get(segment, None)
+        if kind is None:
+            return None
+
+        start = kwargs.get("start", None)
+        end = kwargs.get("end", None)
+        cursor = kwargs.get("cursor", None)
+
+        logs, next_cursor = entityLogs.read(self.__etcdClient, kind, entity_uuid, start=start, end=end,
+                                            limit=kwargs.get("limit", None), cursor=cursor)
+
+        # Events still embedded in documents written before the log segments are returned with the first page
+        if not cursor:
+            key = self.__entity_key(kind, entity_uuid)
+            entity = self.__cache.get(key) if key else None
+            if entity:
+                logs = [log for log in entity.get("logs", [])
+                        if (start is None or log["timestamp"] >= start) and (end is None or log["timestamp"] <= end)] + logs
+
+        return {"uuid": entity_uuid, "kind": kind, "logs": logs, "next_cursor": next_cursor}
+
+    def __get_page(self, prefix, limit, cursor, accept=None):
+        # Pages over the entities of a prefix in key order, the cursor is the uuid of the last entity returned
+        items = []
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        start_after = prefix + cursor if cursor else None
+        more = True
+        while more and len(items) < limit:
+            page, more = self.__cache.get_page(prefix, limit - len(items), start_after)
+            for key, value in page:
+                start_after = key
+                if accept is None or accept(key, value):
+                    items.append(value)
+        next_cursor = start_after[len(prefix):] if more else None
+        return items, next_cursor
+
+    def __list(self, prefix, **kwargs):
+        limit = kwargs.get("limit", None)
+        accept = kwargs.get("accept", None)
+        if limit is None:
+            return [value for key, value in self.__cache.get_prefix(prefix) if accept is None or accept(key, value)], \
+                None
+        return self.__get_page(prefix, limit, kwargs.get("cursor", None), accept)
+
+    @staticmethod
+    def __project(entity, fields):
+        if not fields:
+            return entity
+        return {field: entity[field] for field in fields if field in entity}
+
+    def get_clusters(self, active, **kwargs):
         last_seen_offset = 0
         t_m = {"m": 60, "h": 3600, "d": 86400}
 
-        results = self.__etcdClient.get_prefix("/serrano/orchestrator/clusters")
-
         if active:
             last_seen_offset = (int(active[:-1])*(t_m[active[-1]]))
 
-        for result in results:
-            cluster = json.loads(result[0].decode("utf-8"))
-            cluster["last_seen"] = 0
-            cluster_id = result[1].key.decode("utf-8").split("cluster/")[1]
-            health = self.__etcdClient.get("/serrano/orchestrator/health/clusters/%s" % cluster_id)
-            if health[0] is not None:
-                cluster["last_seen"] = health[0].decode("utf-8")
-            cl = {"cluster_uuid": cluster["cluster_uuid"], "type": cluster["type"], "last_seen": cluster["last_seen"]}
-            if not active:
-                data.append(cl)
-            else:
-                if (int(cluster["last_seen"]) + last_seen_offset) >= int(time.time()):
-                    data.append(cl)
-        return data
+        # Heartbeats are read with a single prefix scan and joined with the clusters in memory
+        health = {key.split("/")[-1]: int(last_seen)
+                  for key, last_seen in self.__cache.get_prefix("/serrano/orchestrator/health/clusters/")}
+        min_last_seen = int(time.time()) - last_seen_offset
+
+        def accept(key, cluster):
+            return not active or health.get(cluster["cluster_uuid"], 0) >= min_last_seen
+
+        results, next_cursor = self.__list("/serrano/orchestrator/clusters/cluster/", accept=accept, **kwargs)
+        data = [self.__project({"cluster_uuid": cluster["cluster_uuid"],
+                                "type": cluster["type"],
+                                "last_seen": health.get(cluster["cluster_uuid"], 0)}, kwargs.get("fields", None))
+                for cluster in results]
+
+        if kwargs.get("limit", None) is None:
+            return data
+        return data, next_cursor
 
     def get_cluster(self, cluster_uuid):
-        data = {}
-        result, metadata = self.__etcdClient.get("/serrano/orchestrator/clusters/cluster/%s" % cluster_uuid)
-        if result is not None:
-            data = json.loads(result.decode("utf-8"))
+        data = self.__cache.get("/serrano/orchestrator/clusters/cluster/%s" % cluster_uuid)
+        if data is None:
+            data = {}
         return data
 
     def cluster_heartbeat(self, cluster_uuid):
         self.__etcdClient.put("/serrano/orchestrator/health/clusters/%s" % cluster_uuid, str(int(time.time())))
 
     def set_cluster(self, params):
-        self.__etcdClient.put("/serrano/orchestrator/clusters/cluster/%s" % params["cluster_uuid"], json.dumps(params))
+        self.__etcdClient.put("/serrano/orchestrator/clusters/cluster/%s" % params["cluster_uuid"],
+                              entityCodec.encode(params))
+        self.__cache.written(["/serrano/orchestrator/clusters/cluster/%s" % params["cluster_uuid"]])
 
     def delete_cluster(self, cluster_uuid):
         self.__etcdClient.delete("/serrano/orchestrator/health/clusters/%s" % cluster_uuid)
         self.__etcdClient.delete("/serrano/orchestrator/clusters/cluster/%s" % cluster_uuid)
+        self.__cache.written(["/serrano/orchestrator/health/clusters/%s" % cluster_uuid,
+                              "/serrano/orchestrator/clusters/cluster/%s" % cluster_uuid])
         return {}
 
     def get_deployments(self, **kwargs):
@@ -136,26 +358,33 @@ class Dispatcher(QObject):
         deployment_uuid = kwargs.get("deployment_uuid", None)
 
         if deployment_uuid:
-            result, metadata = self.__etcdClient.get("/serrano/orchestrator/deployments/deployment/%s" % deployment_uuid)
+            result = self.__cache.get("/serrano/orchestrator/deployments/deployment/%s" % deployment_uuid)
             if result:
-                data.append(json.loads(result.decode("utf-8")))
+                data.append(result)
         else:
-            results = self.__etcdClient.get_prefix("/serrano/orchestrator/deployments")
-
-            for result in results:
-                data.append(json.loads(result[0].decode("utf-8")))
+            results, next_cursor = self.__list("/serrano/orchestrator/deployments/deployment/", **kwargs)
+            data = [self.__project(result, kwargs.get("fields", None)) for result in results]
+            if kwargs.get("limit", None) is not None:
+                return data, next_cursor
 
         return data
 
+    def iter_deployments(self, **kwargs):
+        fields = kwargs.get("fields", None)
+        prefix = "/serrano/orchestrator/deployments/deployment/"
+        for kv in etcdRange.iter_range(self.__etcdClient, prefix, etcdRange.prefix_end(prefix),
+                                       page_size=STREAM_PAGE_SIZE):
+            value = entityChunks.resolve(self.__etcdClient, kv.key.decode("utf-8"), kv.value, kv.mod_revision)
+            yield self.__project(entityCodec.decode(value), fields)
+
     def get_deployment_logs(self, deployment_uuid):
         data = {}
-        result, metadata = self.__etcdClient.get("/serrano/orchestrator/deployments/deployment/%s" % deployment_uuid)
-        if result is not None:
-            entity = json.loads(result.decode("utf-8"))
+        entity = self.__cache.get("/serrano/orchestrator/deployments/deployment/%s" % deployment_uuid)
+        if entity is not None:
             data["deployment_uuid"] = deployment_uuid
             data["name"] = entity["name"]
             data["status"] = entity["status"]
-            data["logs"] = entity["logs"]
+            data["logs"] = self.__get_logs("Deployment", deployment_uuid, entity)
             data["created_at"] = entity["created_at"]
             data["updated_at"] = entity["updated_at"]
         return data
@@ -166,9 +395,8 @@ class Dispatcher(QObject):
                                  "FAILED", "REDEPLOYED", "TERMINATED"]
         bundle_status_str = ["UNKNOWN", "CREATED", "SUCCESSFUL", "FAILED", "TERMINATED"]
 
-        result, metadata = self.__etcdClient.get("/serrano/orchestrator/deployments/deployment/%s" % deployment_uuid)
-        if result is not None:
-            entity = json.loads(result.decode("utf-8"))
+        entity = self.__cache.get("/serrano/orchestrator/deployments/deployment/%s" % deployment_uuid)
+        if entity is not None:
             data["deployment_uuid"] = deployment_uuid
             data["name"] = entity["name"]
             data["status"] = entity["status"]
@@ -178,8 +406,7 @@ class Dispatcher(QObject):
                 assignment = self.__get_assignment_by_uuid(assignment_uuid)
                 for bundle_uuid in assignment["bundles"]:
                     service = {"cluster_uuid": assignment["cluster_uuid"] }
-                    bundle, metadata = self.__etcdClient.get("/serrano/orchestrator/bundles/bundle/%s" % bundle_uuid)
-                    bundle = json.loads(bundle.decode("utf-8"))
+                    bundle = self.__cache.get("/serrano/orchestrator/bundles/bundle/%s" % bundle_uuid)
                     for b in bundle["description"]:
                         if b["kind"] == "Deployment":
                             service["name"] = b["metadata"]["name"]
@@ -193,12 +420,11 @@ class Dispatcher(QObject):
 
     def get_kernel_logs(self, request_uuid):
         data = {}
-        result, metadata = self.__etcdClient.get("/serrano/orchestrator/kernels/kernel/%s" % request_uuid)
-        if result is not None:
-            kernel = json.loads(result.decode("utf-8"))
+        kernel = self.__cache.get("/serrano/orchestrator/kernels/kernel/%s" % request_uuid)
+        if kernel is not None:
             data["request_uuid"] = kernel["request_uuid"]
             data["status"] = kernel["status"]
-            data["request_logs"] = kernel["logs"]
+            data["request_logs"] = self.__get_logs("Kernel", request_uuid, kernel)
             data["assignment_logs"] = []
             data["bundle_logs"] = []
             data["created_at"] = kernel["created_at"]
@@ -206,24 +432,26 @@ class Dispatcher(QObject):
 
         assignment = self.__get_assignment_by_uuid(kernel["assignment_uuid"])
         if assignment:
-            data["assignment_logs"] = assignment["logs"]
-            data["bundle_logs"] = self.get_bundle(assignment["bundles"][0])["logs"]
+            data["assignment_logs"] = self.__get_logs("Assignment", assignment["uuid"], assignment)
+            data["bundle_logs"] = self.__get_logs("Bundle", assignment["bundles"][0], self.get_bundle(assignment["bundles"][0]))
 
         return data
 
     def get_all_kernels(self):
         return {}
 
-    def get_all_faas(self):
+    def get_all_faas(self, **kwargs):
         data = []
+        next_cursor = None
         try:
-            results = self.__etcdClient.get_prefix("/serrano/orchestrator/kernels/kernel")
-            for result in results:
-                item = json.loads(result[0].decode("utf-8"))
-                if item["kind"] == requestType.SERRANO_FaaS:
-                    data.append(item["request_uuid"])
+            results, next_cursor = self.__list("/serrano/orchestrator/kernels/kernel/",
+                                               accept=lambda key, item: item["kind"] == requestType.SERRANO_FaaS,
+                                               **kwargs)
+            data = [item["request_uuid"] for item in results]
         except Exception as e:
             print(str(e))
+        if kwargs.get("limit", None) is not None:
+            return data, next_cursor
         return data
 
     def get_kernel_logs(self, uuid):
@@ -231,15 +459,14 @@ class Dispatcher(QObject):
 
     def get_faas_logs(self, request_uuid):
         data = {}
-        result, metadata = self.__etcdClient.get("/serrano/orchestrator/kernels/kernel/%s" % request_uuid)
-        if result is not None:
-            d = json.loads(result.decode("utf-8"))
+        d = self.__cache.get("/serrano/orchestrator/kernels/kernel/%s" % request_uuid)
+        if d is not None:
             assignment = self.__get_assignment_by_uuid(d["assignment_uuid"])
             bundle = self.get_bundle(assignment["bundles"][0])
             data["request_uuid"] = d["request_uuid"]
             data["kernel_name"] = d["kernel_name"]
-            data["request_logs"] = d["logs"]
-            data["bundle_logs"] = bundle["logs"]
+            data["request_logs"] = self.__get_logs("FaaS", request_uuid, d)
+            data["bundle_logs"] = self.__get_logs("Bundle", assignment["bundles"][0], bundle)
             data["cluster_uuid"] = assignment["cluster_uuid"]
             data["status"] = d["status"]
             data["created_at"] = d["created_at"]
@@ -247,79 +474,124 @@ class Dispatcher(QObject):
         return data
 
     def handle_notification_evt(self, event):
-
-        serrano_deployments = {}
+        self.handle_notification_evts([event])
+
+    @staticmethod
+    def __shap_values(event):
+        # The SHAP values of every anomaly of an event, raises on a malformed event
+        shap_values_batch = []
+        for anomaly in event["anomalies"]:
+            shap_values = anomaly["analysis"]["shap_values"]
+            if not isinstance(shap_values, dict):
+                raise ValueError("'shap_values' is not an object")
+            shap_values_batch.append({feature: float(value) for feature, value in shap_values.items()})
+        return shap_values_batch
+
+    def handle_notification_evts(self, events):
+
+        logger.info("Handle %s Service Assurance notification event(s) ..." % len(events))
+
+        # Malformed events are skipped one by one, so that they do not drop the other events of the batch
+        shap_values_batch = []
+        for event in events:
+            try:
+                shap_values_batch += self.__shap_values(event)
+            except Exception as e:
+                logger.error("Skip malformed Service Assurance notification event: %s" % repr(e))
 
         try:
 
-            logger.info("Handle Service Assurance notification event ...")
+            # The root cause of all the anomalies of the events is scored in a single pass
+            root_causes = self.__root_cause.worker_nodes(shap_values_batch)
 
-            for result in self.__etcdClient.get_prefix("/serrano/orchestrator/monitoring"):
-                deployment_uuid = result[1].key.decode("utf-8").split("/")[-1]
-                d = json.loads(result[0].decode())
-               
-            for anomaly in event["anomalies"]:
-                affected_deployments = []
-                affected_worker_nodes = self.__extract_root_cause_worker_nodes(anomaly["analysis"]["shap_values"])
+            for affected_worker_nodes in root_causes:
                 logger.info("Affected worker nodes: %s" % affected_worker_nodes)
                 logger.info("Get details for the affected deployment(s) ... ")
+                serrano_deployments = self.__placements.get(affected_worker_nodes)
+                # The placements of every affected Assignment, each placement once even if it spans several nodes
+                affected_assignments = collections.OrderedDict()
                 for wn in affected_worker_nodes:
                     logger.debug("Affected deployments in worker node '%s' => '%s'" % (wn, serrano_deployments[wn]))
                     for s_d in serrano_deployments[wn]:
-                        affected_deployments.append(s_d)
-                self.__trigger_assignment_redeployment(affected_deployments, affected_worker_nodes)
+                        affected_deployments = affected_assignments.setdefault(s_d["assignment_uuid"], [])
+                        if s_d not in affected_deployments:
+                            affected_deployments.append(s_d)
+                for affected_deployments in affected_assignments.values():
+                    self.__anomalies.submit(affected_deployments, affected_worker_nodes)
 
         except Exception as e:
             logger.error("Error while handling Service Assurance notification event ... ")
             logger.error(str(e))
-            print(str(e))
-
-    def create_deployment(self, params):
 
+    @staticmethod
+    def __new_deployment(params):
         params["deployment_description"] = params["deployment_description"].replace("\\r", "")
         params["assignments"] = []
         params["assignments_status"] = []
-        params["logs"] = [{"timestamp": int(time.time()), "event": "Deployment description received."}]
         params["status"] = status.Deployment.SUBMITTED
         params["updated_by"] = "Orchestration.API"
         params["created_at"] = int(time.time())
         params["updated_at"] = int(time.time())
+        return [{"timestamp": int(time.time()), "event": "Deployment description received."}]
 
-        self.__etcdClient.put("/serrano/orchestrator/deployments/deployment/%s" % params["deployment_uuid"],
-                              json.dumps(params))
+    def create_deployment(self, params):
+        self.__put_entity("Deployment", params["deployment_uuid"], params, self.__new_deployment(params))
+
+    def create_deployments(self, deployments):
+        return self.__put_entities("Deployment", "deployment_uuid", deployments, self.__new_deployment)
 
     def update_deployment(self, params):
-	self.__etcdClient.put("/serrano/orchestrator/deployments/deployment/%s" % params["deployment_uuid"], json.dumps(params))
+        self.__put_entity("Deployment", params["deployment_uuid"], params, [])
 
     def set_kernel_execution(self, params):
 
         params["assignment_uuid"] = ""
-        params["logs"] = [{"timestamp": int(time.time()), "event": "Kernel description received."}]
         params["status"] = status.Kernels.SUBMITTED
         params["updated_by"] = "Orchestration.API"
         params["created_at"] = int(time.time())
         params["updated_at"] = int(time.time())
 
-        self.__etcdClient.put("/serrano/orchestrator/kernels/kernel/%s" % params["request_uuid"], json.dumps(params))
+        self.__put_entity(params["kind"], params["request_uuid"], params,
+                          [{"timestamp": int(time.time()), "event": "Kernel description received."}])
 
-    def delete_deployment(self, deployment_uuid):
+    def delete_deployment(self, deployment_uuid, **kwargs):
 
         try:
             deps = self.get_deployments(deployment_uuid=deployment_uuid)
             if len(deps) != 1:
                 return False
 
+            # Collect the keys of every entity of the Deployment tree. They are deleted in batches that fit the etcd
+            # transaction limit, each entity with its chunks and logs, the Deployment last so that a delete that
+            # fails halfway can be retried.
+            groups = []
             for a_uuid in deps[0]["assignments"]:
                 assignment = self.__get_assignment_by_uuid(a_uuid)
-                for b_uuid in assignment["bundles"]:
-                    self.__etcdClient.delete("/serrano/orchestrator/bundles/bundle/%s" % b_uuid)
-
-                self.__etcdClient.delete("/serrano/orchestrator/assignments/%s/assignment/%s" % (assignment["cluster_uuid"],
-                                                                                                 a_uuid))
-
-            self.__etcdClient.delete("/serrano/orchestrator/deployments/deployment/%s" % deployment_uuid)
-            self.__etcdClient.delete("/serrano/orchestrator/monitoring/%s" % deployment_uuid)
-            requests.delete("%s/api/v1/telemetry/central/deployments/%s" % (self.__cth_service, deployment_uuid))
+                if assignment is not None:
+                    for b_uuid in assignment["bundles"]:
+                        groups.append([self.__etcdClient.transactions.delete("/serrano/orchestrator/bundles/bundle/%s"
+                                                                             % b_uuid)] +
+                                      entityChunks.delete_ops(self.__etcdClient,
+                                                              "/serrano/orchestrator/bundles/bundle/%s" % b_uuid) +
+                                      entityLogs.delete_ops(self.__etcdClient, "Bundle", b_uuid))
+                    groups.append([self.__etcdClient.transactions.delete(
+                        "/serrano/orchestrator/assignments/%s/assignment/%s" % (assignment["cluster_uuid"], a_uuid))])
+                groups.append([self.__etcdClient.transactions.delete("/serrano/orchestrator/index/assignments/%s" %
+                                                                     a_uuid)] +
+                              entityLogs.delete_ops(self.__etcdClient, "Assignment", a_uuid))
+
+            ops = [self.__etcdClient.transactions.delete("/serrano/orchestrator/deployments/deployment/%s" %
+                                                         deployment_uuid)]
+            ops += entityChunks.delete_ops(self.__etcdClient,
+                                           "/serrano/orchestrator/deployments/deployment/%s" % deployment_uuid)
+            ops.append(self.__etcdClient.transactions.delete("/serrano/orchestrator/monitoring/%s" % deployment_uuid))
+            # A Deployment that is about to be redeployed keeps its history
+            if not kwargs.get("keep_logs", False):
+                ops += entityLogs.delete_ops(self.__etcdClient, "Deployment", deployment_uuid)
+            groups.append(ops)
+
+            etcdBatch.commit(self.__etcdClient, groups, self.__max_txn_ops)
+            self.__cache.written([op.key for group in groups for op in group])
 
             return True
 
@@ -328,11 +600,19 @@ class Dispatcher(QObject):
             logger.error(str(e))
             return False
 
+    def notify_deployment_deletion(self, deployment_uuid):
+        try:
+            self.__cth_client.delete("/api/v1/telemetry/central/deployments/%s" % deployment_uuid)
+        except Exception as e:
+            logger.error("Unable to inform CTH for the deletion of deployment '%s'" % deployment_uuid)
+            logger.error(str(e))
+
     def grafana_storage_policies(self, kwargs):
+        if self.__views.ready():
+            return self.__views.storage_policies(kwargs)
         data = []
         filtering_name = kwargs.get("filter", None)
-        for result in self.__etcdClient.get_prefix("/serrano/orchestrator/storage_policies/policy"):
-            d = json.loads(result[0].decode())
+        for key, d in self.__cache.get_prefix("/serrano/orchestrator/storage_policies/policy"):
             if filtering_name and d["name"].find(filtering_name) == -1:
                 continue
             data.append({"name": d["name"],
@@ -342,25 +622,84 @@ class Dispatcher(QObject):
                          "created_at": d["created_at"]})
         return data
 
-    def grafana_storage_policies_logs(self, kwargs):
-        data = []
-        filtering_name = kwargs.get("filter", None)
-        for result in self.__etcdClient.get_prefix("/serrano/orchestrator/storage_policies/policy"):
-            d = json.loads(result[0].decode())
+    def __grafana_logs(self, kind, prefix, filtering_name):
+        # Joins the log events of an entity kind, read in a single range request, with the cached entities
+        entities = {}
+        for key, d in self.__cache.get_prefix(prefix):
             if filtering_name and d["name"].find(filtering_name) == -1:
                 continue
-            for log in d["logs"]:
-                data.append({"name": d["name"],
-                             "policy_uuid": d["policy_uuid"],
-                             "timestamp": log["timestamp"],
-                             "event": log["event"]})
+            entities[key.split("/")[-1]] = d
+        logs = [(entity_uuid, log) for entity_uuid, d in entities.items() for log in d.get("logs", [])]
+        logs += [(entity_uuid, log) for entity_uuid, log in entityLogs.read_kind(self.__etcdClient, kind)
+                 if entity_uuid in entities]
+        return entities, logs
+
+    def __iter_grafana_logs(self, kind, prefix, params, filtering_name):
+        # Yields the (entity, log) tuples of an entity kind page by page, first the events still embedded in the
+        # entity documents and then the log keys
+        start = grafanaViews.timestamp_param(params, "from")
+        end = grafanaViews.timestamp_param(params, "to")
+        entities = {}
+
+        def accept(d, log):
+            return d is not None and grafanaViews.matches(d.get("name", None), filtering_name) and \
+                (start is None or log["timestamp"] >= start) and (end is None or log["timestamp"] <= end)
+
+        for kv in etcdRange.iter_range(self.__etcdClient, prefix, etcdRange.prefix_end(prefix),
+                                       page_size=STREAM_PAGE_SIZE):
+            d = entityCodec.decode(entityChunks.resolve(self.__etcdClient, kv.key.decode("utf-8"), kv.value,
+                                                        kv.mod_revision))
+            for log in d.get("logs", []):
+                if accept(d, log):
+                    yield d, log
+
+        logs_prefix = entityLogs.kind_prefix(kind)
+        for kv in etcdRange.iter_range(self.__etcdClient, logs_prefix, etcdRange.prefix_end(logs_prefix),
+                                       page_size=STREAM_PAGE_SIZE):
+            segment, entity_uuid = entityLogs.parse_key(kv.key.decode("utf-8"))
+            if entity_uuid not in entities:
+                entities[entity_uuid] = self.__cache.get("%s%s" % (prefix, entity_uuid))
+            log = entityCodec.decode(kv.value)
+            if accept(entities[entity_uuid], log):
+                yield entities[entity_uuid], log
+
+    def iter_grafana_storage_policies_logs(self, kwargs):
+        for d, log in self.__iter_grafana_logs("StoragePolicy", "/serrano/orchestrator/storage_policies/policy/",
+                                               kwargs, kwargs.get("filter", None)):
+            yield {"name": d["name"], "policy_uuid": d["policy_uuid"], "timestamp": log["timestamp"],
+                   "event": log["event"]}
+
+    def iter_grafana_deployments_logs(self, kwargs):
+        for d, log in self.__iter_grafana_logs("Deployment", "/serrano/orchestrator/deployments/deployment/",
+                                               kwargs, kwargs.get("filter", None)):
+            yield {"name": d["name"], "deployment_uuid": d["deployment_uuid"], "timestamp": log["timestamp"],
+                   "event": log["event"]}
+
+    def iter_grafana_faas_kernels_logs(self, kwargs):
+        for d, log in self.__iter_grafana_logs("FaaS", "/serrano/orchestrator/kernels/kernel/", kwargs, None):
+            yield {"request_uuid": d["request_uuid"], "kernel_name": d["kernel_name"], "timestamp": log["timestamp"],
+                   "event": log["event"]}
+
+    def grafana_storage_policies_logs(self, kwargs):
+        if self.__views.ready():
+            return self.__views.storage_policies_logs(kwargs)
+        data = []
+        entities, logs = self.__grafana_logs("StoragePolicy", "/serrano/orchestrator/storage_policies/policy/",
+                                             kwargs.get("filter", None))
+        for entity_uuid, log in logs:
+            d = entities[entity_uuid]
+            data.append({"name": d["name"],
+                         "policy_uuid": d["policy_uuid"],
+                         "timestamp": log["timestamp"],
+                         "event": log["event"]})
         return data
 
     def grafana_deployments(self, kwargs):
+        if self.__views.ready():
+            return self.__views.deployments(kwargs)
         data = []
         filtering_name = kwargs.get("filter", None)
-        for result in self.__etcdClient.get_prefix("/serrano/orchestrator/deployments/deployment"):
-            d = json.loads(result[0].decode())
+        for key, d in self.__cache.get_prefix("/serrano/orchestrator/deployments/deployment"):
             if filtering_name and d["name"].find(filtering_name) == -1:
                 continue
             clusters = []
@@ -376,23 +715,24 @@ class Dispatcher(QObject):
         return data
 
     def grafana_deployments_logs(self, kwargs):
+        if self.__views.ready():
+            return self.__views.deployments_logs(kwargs)
         data = []
-        filtering_name = kwargs.get("filter", None)
-        for result in self.__etcdClient.get_prefix("/serrano/orchestrator/deployments/deployment"):
-            d = json.loads(result[0].decode())
-            if filtering_name and d["name"].find(filtering_name) == -1:
-                continue
-            for log in d["logs"]:
-                data.append({"name": d["name"],
-                             "deployment_uuid": d["deployment_uuid"],
-                             "timestamp": log["timestamp"],
-                             "event": log["event"]})
+        entities, logs = self.__grafana_logs("Deployment", "/serrano/orchestrator/deployments/deployment/",
+                                             kwargs.get("filter", None))
+        for entity_uuid, log in logs:
+            d = entities[entity_uuid]
+            data.append({"name": d["name"],
+                         "deployment_uuid": d["deployment_uuid"],
+                         "timestamp": log["timestamp"],
+                         "event": log["event"]})
         return data
 
     def grafana_faas_kernels(self, kwargs):
+        if self.__views.ready():
+            return self.__views.faas_kernels(kwargs)
         data = []
-        for result in self.__etcdClient.get_prefix("/serrano/orchestrator/kernels/kernel"):
-            d = json.loads(result[0].decode())
+        for key, d in self.__cache.get_prefix("/serrano/orchestrator/kernels/kernel"):
             data.append({"request_uuid": d["request_uuid"],
                          "kernel_name": d["kernel_name"],
                          "status": d["status"],
@@ -405,20 +745,23 @@ class Dispatcher(QObject):
         return data
 
     def grafana_faas_kernels_logs(self, kwargs):
+        if self.__views.ready():
+            return self.__views.faas_kernels_logs(kwargs)
         data = []
-        for result in self.__etcdClient.get_prefix("/serrano/orchestrator/kernels/kernel"):
-            d = json.loads(result[0].decode())
-            for log in d["logs"]:
-                data.append({"request_uuid": d["request_uuid"],
-                             "kernel_name": d["kernel_name"],
-                             "timestamp": log["timestamp"],
-                             "event": log["event"]})
+        entities, logs = self.__grafana_logs("FaaS", "/serrano/orchestrator/kernels/kernel/", None)
+        for entity_uuid, log in logs:
+            d = entities[entity_uuid]
+            data.append({"request_uuid": d["request_uuid"],
+                         "kernel_name": d["kernel_name"],
+                         "timestamp": log["timestamp"],
+                         "event": log["event"]})
         return data
 
-    def grafana_deployments_services(self):
+    def grafana_deployments_services(self, kwargs):
+        if self.__views.ready():
+            return self.__views.deployments_services(kwargs)
         data = []
-        for result in self.__etcdClient.get_prefix("/serrano/orchestrator/deployments/deployment"):
-            d = json.loads(result[0].decode())
+        for key, d in self.__cache.get_prefix("/serrano/orchestrator/deployments/deployment"):
             for d_svc in self.get_deployment_services(d["deployment_uuid"])["services"]:
                 entry = {"deployment_name": d["name"],
                          "deployment_uuid": d["deployment_uuid"],
@@ -436,84 +779,84 @@ class Dispatcher(QObject):
         policy_uuid = kwargs.get("policy_uuid", None)
 
         if policy_uuid is not None:
-            result, metadata = self.__etcdClient.get("/serrano/orchestrator/storage_policies/policy/%s" % policy_uuid)
+            result = self.__cache.get("/serrano/orchestrator/storage_policies/policy/%s" % policy_uuid)
             if result is not None:
-                data.append(json.loads(result.decode("utf-8")))
+                data.append(result)
         else:
-            results = self.__etcdClient.get_prefix("/serrano/orchestrator/storage_policies/policy")
-            for result in results:
-                data.append(json.loads(result[0].decode("utf-8")))
+            results, next_cursor = self.__list("/serrano/orchestrator/storage_policies/policy/", **kwargs)
+            data = [self.__project(result, kwargs.get("fields", None)) for result in results]
+            if kwargs.get("limit", None) is not None:
+                return data, next_cursor
 
         return data
 
     def delete_storage_policy(self, policy_uuid):
-        return self.__etcdClient.delete("/serrano/orchestrator/storage_policies/policy/%s" % policy_uuid)
-
-    def create_storage_policy(self, params):
+        ops = [self.__etcdClient.transactions.delete("/serrano/orchestrator/storage_policies/policy/%s" % policy_uuid)]
+        ops += entityLogs.delete_ops(self.__etcdClient, "StoragePolicy", policy_uuid)
+        succeeded, responses = self.__etcdClient.transaction(compare=[], success=ops, failure=[])
+        self.__cache.written([op.key for op in ops])
+        return responses[0].response_delete_range.deleted > 0
+
+    @staticmethod
+    def __new_storage_policy(params):
         params["decision"] = {}
         params["cc_policy_id"] = 0
         params["status"] = status.StoragePolicy.SUBMITTED
-        params["logs"] = [{"timestamp": int(time.time()), "event": "Storage Policy description received."}]
         params["updated_by"] = "Orchestration.API"
         params["created_at"] = int(time.time())
         params["updated_at"] = int(time.time())
+        return [{"timestamp": int(time.time()), "event": "Storage Policy description received."}]
+
+    def create_storage_policy(self, params):
+        self.__put_entity("StoragePolicy", params["policy_uuid"], params, self.__new_storage_policy(params))
 
-        self.__etcdClient.put("/serrano/orchestrator/storage_policies/policy/%s" % params["policy_uuid"],
-                              json.dumps(params))
+    def create_storage_policies(self, policies):
+        return self.__put_entities("StoragePolicy", "policy_uuid", policies, self.__new_storage_policy)
 
     def update_storage_policy(self, params):
-        result, metadata = self.__etcdClient.get("/serrano/orchestrator/storage_policies/policy/%s" %
-                                                 params["policy_uuid"])
-        if result is not None:
-            entity = json.loads(result.decode("utf-8"))
+        entity = self.__get_entity("/serrano/orchestrator/storage_policies/policy/%s" % params["policy_uuid"])
+        if entity is not None:
 
             params["decision"] = {}
             params["cc_policy_id"] = entity["cc_policy_id"]
             params["status"] = status.StoragePolicy.SUBMITTED
-            params["logs"] = entity["logs"]
-            params["logs"].append({"timestamp": int(time.time()),
-                                   "event": "Updated Storage Policy description received."})
+            params["logs"] = entity.get("logs", [])
             params["updated_by"] = "Orchestration.API"
             params["created_at"] = entity["created_at"]
             params["updated_at"] = int(time.time())
 
-            self.__etcdClient.put("/serrano/orchestrator/storage_policies/policy/%s" % params["policy_uuid"],
-                                  json.dumps(params))
+            self.__put_entity("StoragePolicy", params["policy_uuid"], params,
+                              [{"timestamp": int(time.time()), "event": "Updated Storage Policy description received."}])
             return True
 
         return False
 
     def get_assignment(self, cluster_uuid, assignment_uuid):
-        data = {}
-        result, metadata = self.__etcdClient.get("/serrano/orchestrator/assignments/%s/assignment/%s" % (cluster_uuid,
-                                                                                                         assignment_uuid))
-        if result is not None:
-            data = json.loads(result.decode("utf-8"))
+        data = self.__cache.get("/serrano/orchestrator/assignments/%s/assignment/%s" % (cluster_uuid, assignment_uuid))
+        if data is None:
+            data = {}
         return data
 
     def get_bundle(self, bundle_uuid):
-        data = {}
-        result, metadata = self.__etcdClient.get("/serrano/orchestrator/bundles/bundle/%s" % bundle_uuid)
-        if result is not None:
-            data = json.loads(result.decode("utf-8"))
+        data = self.__cache.get("/serrano/orchestrator/bundles/bundle/%s" % bundle_uuid)
+        if data is None:
+            data = {}
         return data
 
     def get_kernel(self, request_uuid):
-        data = {}
-        result, metadata = self.__etcdClient.get("/serrano/orchestrator/kernels/kernel/%s" % request_uuid)
-        if result is not None:
-            data = json.loads(result.decode("utf-8"))
+        data = self.__cache.get("/serrano/orchestrator/kernels/kernel/%s" % request_uuid)
+        if data is None:
+            data = {}
         return data
 
     def __enable_deployment_monitoring(self, deployment_uuid):
         try:
-            result, metadata = self.__etcdClient.get("/serrano/orchestrator/monitoring/%s" % deployment_uuid)
-            if not result:
+            entity = self.__get_entity("/serrano/orchestrator/monitoring/%s" % deployment_uuid)
+            if not entity:
                 return
-            entity = json.loads(result.decode("utf-8"))
             entity["deployment_uuid"] = deployment_uuid
             entity["timestamp"] = int(time.time())
-            res = requests.post("%s/api/v1/telemetry/central/deployments" % self.__cth_service, json=entity)
+            res = self.__cth_client.post("/api/v1/telemetry/central/deployments", json=entity)
         except Exception as e:
             print(str(e))
             logger.error(str(e))
@@ -521,37 +864,62 @@ class Dispatcher(QObject):
     def __update_ede_with_deployment(self, deployment_uuid):
         try:
             logger.info("Inform EDE for the new deployment '%s' " % deployment_uuid)
-            requests.put("%s/v1/config" % self.__ede_service, json=data)
+            self.__ede_client.put("/v1/config", json=data)
         except Exception as e:
             print(str(e))
             logger.error(str(e))
 
-    def __update_kernel_request_status(self, entity, assignment_status):
-
-        try:
-
+    def __update_entity(self, kind, entity_uuid, update):
+        # Optimistic concurrency control, the entity is written only if its key was not modified since it was read.
+        # The update callable applies the changes in place, collects the new log events and returns False when
+        # nothing has to be written.
+        key = self.__entity_key(kind, entity_uuid)
+        if key is None:
+            logger.error("Unable to locate %s '%s'" % (kind, entity_uuid))
+            return None
+        for attempt in range(MAX_UPDATE_ATTEMPTS):
+            entity, metadata = entityChunks.get(self.__etcdClient, key)
+            if entity is None:
+                logger.error("Unable to update '%s', key does not exist" % key)
+                return None
+            events = []
+            if update(entity, events) is False:
+                return entity
+            if self.__commit([self.__etcdClient.transactions.mod(key) == metadata.mod_revision],
+                             self.__entity_ops(kind, entity_uuid, key, entity, events)):
+                return entity
+            logger.debug("Concurrent modification of '%s', retry update (%s/%s)" % (key, attempt + 1,
+                                                                                  MAX_UPDATE_ATTEMPTS))
+        logger.error("Unable to update '%s' after %s attempts" % (key, MAX_UPDATE_ATTEMPTS))
+        return None
+
+    def __update_kernel_request_status(self, request_uuid, assignment_status):
+
+        def update(entity, events):
             if assignment_status == status.Assignment.FAILED:
                 entity["status"] = status.Kernels.FAILED
-                entity["logs"].append({"timestamp": int(time.time()), "event": "Related Assignment failed"})
+                events.append({"timestamp": int(time.time()), "event": "Related Assignment failed"})
             elif assignment_status == status.Assignment.DEPLOYED:
                 entity["status"] = status.Kernels.FINISHED
-                entity["logs"].append({"timestamp": int(time.time()), "event": "Kernel executed successfully"})
+                events.append({"timestamp": int(time.time()), "event": "Kernel executed successfully"})
             else:
-                return
+                return False
 
             entity["updated_by"] = "Orchestration.Driver"
             entity["updated_at"] = int(time.time())
-            self.__etcdClient.put("/serrano/orchestrator/kernels/kernel/%s" % entity["request_uuid"],
-                                  json.dumps(entity))
 
+        try:
+            self.__update_entity("Kernel", request_uuid, update)
         except Exception as e:
             print(str(e))
             logger.error(str(e))
 
     def __update_deployment_status(self, deployment_uuid, assignment_uuid, assignment_status):
 
-        try:
-            entity = self.get_deployments(deployment_uuid=deployment_uuid)[0]
+        completed = []
+
+        def update(entity, events):
+            del completed[:]
 
             # Update the Assignment status in the Deployment Object
             a_i = entity["assignments"].index(assignment_uuid)
@@ -559,130 +927,132 @@ class Dispatcher(QObject):
 
             if assignment_status == status.Assignment.FAILED:
                 entity["status"] = status.Deployment.FAILED
-                entity["logs"].append({"timestamp": int(time.time()), "event": "Assignment '%s' failed" % assignment_uuid})
-                entity["updated_by"] = "Orchestration.Driver"
-                entity["updated_at"] = int(time.time())
-                self.__etcdClient.put("/serrano/orchestrator/deployments/deployment/%s" % deployment_uuid,
-                                      json.dumps(entity))
-
-            if entity["status"] != status.Deployment.FAILED and assignment_status == status.Assignment.DEPLOYED:
-
+                events.append({"timestamp": int(time.time()), "event": "Assignment '%s' failed" % assignment_uuid})
+            elif entity["status"] != status.Deployment.FAILED and assignment_status == status.Assignment.DEPLOYED:
                 # If not all Assignments are executed successfully, then just store the object with the updated
                 # assignment_status field
                 if entity["assignments_status"].count(status.Assignment.DEPLOYED) != len(entity["assignments_status"]):
                     logger.debug("Update deployment status after assignment progress update ..")
-                    entity["updated_by"] = "Orchestration.Driver"
-                    entity["updated_at"] = int(time.time())
-                    self.__etcdClient.put("/serrano/orchestrator/deployments/deployment/%s" % deployment_uuid,
-                                          json.dumps(entity))
                 # All Assignments are executed successfully, then update the Deployment overall status
-                # and trigger its monitoring
                 else:
                     entity["status"] = status.Deployment.DEPLOYED
-                    entity["logs"].append({"timestamp": int(time.time()), "event": "Deployment executed successfully"})
-                    entity["updated_by"] = "Orchestration.Driver"
-                    entity["updated_at"] = int(time.time())
-                    
-                    self.__etcdClient.put("/serrano/orchestrator/deployments/deployment/%s" % deployment_uuid,
-                                          json.dumps(entity))
-                    logger.debug("All deployment's assignments were successful")
-                    logger.debug("Now enable monitoring and service assurance for Deployment %s" % deployment_uuid)
-                    
-                    self.__enable_deployment_monitoring(deployment_uuid)
-                    self.__update_ede_with_deployment(deployment_uuid)
+                    events.append({"timestamp": int(time.time()), "event": "Deployment executed successfully"})
+                    completed.append(True)
+            else:
+                return False
+
+            entity["updated_by"] = "Orchestration.Driver"
+            entity["updated_at"] = int(time.time())
+
+        try:
+            entity = self.__update_entity("Deployment", deployment_uuid, update)
+
+            # Trigger the monitoring once the stored Deployment reflects that all its Assignments are deployed
+            if entity is not None and completed:
+                logger.debug("All deployment's assignments were successful")
+                logger.debug("Now enable monitoring and service assurance for Deployment %s" % deployment_uuid)
+
+                self.__enable_deployment_monitoring(deployment_uuid)
+                self.__update_ede_with_deployment(deployment_uuid)
         except Exception as e:
             print(str(e))
             logger.error(str(e))
 
-    def add_entities_logs(self, log_data):
+    def __notify_faas_kernel_deployment(self, entity, data):
+        assignment = self.get_assignment(data["cluster_uuid"], entity["assignment_uuid"])
 
-        try:
-            for data in log_data["logs"]:
-                if data["kind"] == "Deployment":
-                    entity = self.get_deployments(deployment_uuid=data["uuid"])[0]
-                    entity["status"] = data["status"]
-                    entity["logs"].append({"timestamp": data["timestamp"], "event": data["event"]})
-                    entity["updated_by"] = "Orchestration.Driver"
-                    entity["updated_at"] = int(time.time())
-                    self.__etcdClient.put("/serrano/orchestrator/deployments/deployment/%s" % data["uuid"],
-                                          json.dumps(entity))
-                elif data["kind"] == "Assignment":
-                    entity = self.__get_assignment_by_uuid(data["uuid"])
-                    entity["status"] = data["status"]
-                    entity["logs"].append({"timestamp": data["timestamp"], "event": data["event"]})
-                    entity["updated_by"] = "Orchestration.Driver"
-                    entity["updated_at"] = int(time.time())
-                    self.__etcdClient.put("/serrano/orchestrator/assignments/%s/assignment/%s" % (entity["cluster_uuid"],
-                                                                                                  data["uuid"]),
-                                          json.dumps(entity))
-
-                    if data["status"] in [status.Assignment.FAILED, status.Assignment.DEPLOYED]:
-                        kernel = self.get_kernel(entity["deployment_uuid"])
-                        if kernel:
-                            self.__update_kernel_request_status(kernel, data["status"])
-                        else:
-                            self.__update_deployment_status(entity["deployment_uuid"], data["uuid"], data["status"])
-
-                elif data["kind"] == "Bundle":
-                    entity = self.get_bundle(data["uuid"])
-                    entity["status"] = data["status"]
-                    entity["logs"].append({"timestamp": data["timestamp"], "event": data["event"]})
-                    entity["updated_by"] = "Orchestration.Driver"
-                    entity["updated_at"] = int(time.time())
-                    self.__etcdClient.put("/serrano/orchestrator/bundles/bundle/%s" % data["uuid"], json.dumps(entity))
+        if assignment:
+            description = {"deployment_mode": "FaaS", "cluster_uuid": data["cluster_uuid"]}
+            bundle = self.get_bundle(assignment["bundles"][0])
 
-                elif data["kind"] == "FaaS":
+            if data["status"] == status.Kernels.IN_DEPLOYMENT:
+                description["counter_diff"] = 1
+            elif data["status"] in [status.Kernels.FINISHED, status.Kernels.FAILED]:
+                description["counter_diff"] = -1
+            else:
+                description["counter_diff"] = 0
 
-                    entity = self.get_kernel(data["uuid"])
-                    assignment = self.get_assignment(data["cluster_uuid"], entity["assignment_uuid"])
+            description["kernel_mode"] = bundle["description"]["data_description"]["mode"]
 
-                    if assignment:
-                        description = {"deployment_mode": "FaaS", "cluster_uuid": data["cluster_uuid"]}
-                        bundle = self.get_bundle(assignment["bundles"][0])
+            self.__cth_client.put("/api/v1/telemetry/central/serrano_kernel_deployments", json=description)
 
-                        if data["status"] == status.Kernels.IN_DEPLOYMENT:
-                            description["counter_diff"] = 1
-                        elif data["status"] in [status.Kernels.FINISHED, status.Kernels.FAILED]:
-                            description["counter_diff"] = -1
-                        else:
-                            description["counter_diff"] = 0
+    def add_entities_logs(self, log_data):
 
-                        description["kernel_mode"] = bundle["description"]["data_description"]["mode"]
+        # Group the log records of the batch per entity, so that each entity is read and written once
+        records_per_entity = collections.OrderedDict()
+        for data in log_data["logs"]:
+            records_per_entity.setdefault((data["kind"], data["uuid"]), []).append(data)
 
-                        requests.put("%s/api/v1/telemetry/central/serrano_kernel_deployments" % self.__cth_service,
-                                     json=description)
+        for (kind, entity_uuid), records in records_per_entity.items():
 
+            def update(entity, events):
+                for data in records:
                     entity["status"] = data["status"]
-                    entity["logs"].append({"timestamp": data["timestamp"], "event": data["event"]})
-                    entity["updated_by"] = "Orchestration.Driver"
-                    entity["updated_at"] = int(time.time())
-                    self.__etcdClient.put("/serrano/orchestrator/kernels/kernel/%s" % data["uuid"], json.dumps(entity))
+                    events.append({"timestamp": data["timestamp"], "event": data["event"]})
+                entity["updated_by"] = "Orchestration.Driver"
+                entity["updated_at"] = int(time.time())
 
-        except Exception as e:
-            print(str(e))
-            logger.error(str(e))
+            try:
+                entity = self.__update_entity(kind, entity_uuid, update)
+                if entity is None:
+                    continue
+
+                if kind == "Assignment":
+                    for data in records:
+                        if data["status"] in [status.Assignment.FAILED, status.Assignment.DEPLOYED]:
+                            if self.get_kernel(entity["deployment_uuid"]):
+                                self.__update_kernel_request_status(entity["deployment_uuid"], data["status"])
+                            else:
+                                self.__update_deployment_status(entity["deployment_uuid"], entity_uuid, data["status"])
+
+                elif kind == "FaaS":
+                    for data in records:
+                        self.__notify_faas_kernel_deployment(entity, data)
+
+            except Exception as e:
+                print(str(e))
+                logger.error(str(e))
+
+    @staticmethod
+    def __merge_k8s_params(stored, data):
+        # The K8s params of the reported Assignment replace its previous ones, those of the other Assignments are kept.
+        # Worker nodes that a report does not carry (yet) are kept from the previous report of the same K8s Deployment.
+        worker_nodes = {p.get("k8s_deployment_uuid", None): p["k8s_worker_nodes"] for p in stored
+                        if p.get("assignment_uuid", None) == data["assignment_uuid"] and p.get("k8s_worker_nodes", [])}
+        k8s_params = [p for p in stored if p.get("assignment_uuid", None) != data["assignment_uuid"]]
+        for p in data["k8s_params"]:
+            p = dict(p)
+            if not p.get("k8s_worker_nodes", []) and p.get("k8s_deployment_uuid", None) in worker_nodes:
+                p["k8s_worker_nodes"] = worker_nodes[p["k8s_deployment_uuid"]]
+            k8s_params.append(p)
+        return k8s_params
 
     def put_assignment_monitoring_data(self, data):
+        # The driver reports an Assignment when it is deployed and again as its Pods are scheduled, concurrently with
+        # the reports of the other Assignments of the Deployment, so the document is merged and written under CAS
+        key = "/serrano/orchestrator/monitoring/%s" % data["deployment_uuid"]
         try:
-            result, metadata = self.__etcdClient.get("/serrano/orchestrator/monitoring/%s" % data["deployment_uuid"])
-            if not result:
-                return
-            entity = json.loads(result.decode("utf-8"))
-            if data["cluster_uuid"] not in entity["clusters"]:
-                return
-            entity[data["cluster_uuid"]] = data["k8s_params"]
-            self.__etcdClient.put("/serrano/orchestrator/monitoring/%s" % data["deployment_uuid"], json.dumps(entity))
-            return {}
+            for attempt in range(MAX_UPDATE_ATTEMPTS):
+                entity, metadata = entityChunks.get(self.__etcdClient, key)
+                if not entity:
+                    return
+                if data["cluster_uuid"] not in entity["clusters"]:
+                    return
+                entity[data["cluster_uuid"]] = self.__merge_k8s_params(entity.get(data["cluster_uuid"], []), data)
+                if self.__commit([self.__etcdClient.transactions.mod(key) == metadata.mod_revision],
+                                 [self.__etcdClient.transactions.put(key, entityCodec.encode(entity))]):
+                    return {}
+                logger.debug("Concurrent modification of '%s', retry update (%s/%s)" % (key, attempt + 1,
+                                                                                      MAX_UPDATE_ATTEMPTS))
+            logger.error("Unable to update '%s' after %s attempts" % (key, MAX_UPDATE_ATTEMPTS))
         except Exception as e:
-            print(str(e))
             logger.error(str(e))
 
     def get_deployments_monitoring_data(self, cluster_uuid):
         data = {}
         try:
-            for result in self.__etcdClient.get_prefix("/serrano/orchestrator/monitoring"):
-                d = json.loads(result[0].decode("utf-8"))
-                deployment_uuid = result[1].key.decode("utf-8").split("/")[-1]
+            for key, d in self.__cache.get_prefix("/serrano/orchestrator/monitoring"):
+                deployment_uuid = key.split("/")[-1]
                 if cluster_uuid in d["clusters"]:
                     data[deployment_uuid] = d[cluster_uuid]
             return data
@@ -692,6 +1062,27 @@ class Dispatcher(QObject):
             return data
 
     def get_telemetry_entities(self):
-        result = self.__etcdClient.get("/serrano/orchestrator/telemetry_entities")
-        return json.loads(result[0].decode("utf-8"))
+        return self.__cache.get("/serrano/orchestrator/telemetry_entities")
+
+    def post_kernel_metrics(self, metric_logs):
+        # Returns False when the forwarding queue is full, raises ValueError when the logs can never fit in it
+        return self.__metric_forwarder.submit(metric_logs["logs"])
+
+    def close(self):
+        self.__anomalies.close()
+        self.__metric_forwarder.close()
+        self.__cth_client.close()
+        self.__ede_client.close()
+
+    def get_cache_stats(self):
+        return self.__cache.stats()
+
+    def get_metric_logs_stats(self):
+        return self.__metric_forwarder.stats()
+
+    def get_anomalies_stats(self):
+        return self.__anomalies.stats()
+
+    def get_views_stats(self):
+        return self.__views.stats()
 
@@ -0,0 +1,355 @@
+import etcd3
+import bisect
+import logging
+import threading
+import collections
+
+from serrano_orchestrator.utils import etcdRange
+from serrano_orchestrator.utils import entityCodec
+from serrano_orchestrator.utils import entityChunks
+
+logger = logging.getLogger("SERRANO.Orchestrator.EntityCache")
+
+
+class EntityCache:
+
+    def __init__(self, etcd_client, prefix, cache_conf, excluded_prefixes=()):
+
+        self.__etcdClient = etcd_client
+        self.__prefix = prefix
+        # Sub-prefixes that grow with history (e.g. log events) are neither loaded nor tracked
+        self.__excluded_prefixes = sorted(excluded_prefixes)
+        self.__max_entries = cache_conf.get("max_entries", 100000)
+        self.__resync_interval = cache_conf.get("resync_interval", 5)
+
+        self.__lock = threading.RLock()
+        # key -> [mod_revision, raw value, decoded value], kept in least recently used order. Beyond max_entries the
+        # least recently used values are evicted, their keys stay in the key index.
+        self.__entries = collections.OrderedDict()
+        # Every key of the prefix in key order, evicted ones included, the keys of a sub-prefix are a slice of it
+        self.__keys = []
+        # key -> etcd revision after it was written by this process, it is read from etcd until the watch reaches it
+        self.__written = {}
+        self.__revision = 0
+        self.__watch_id = None
+        self.__watching = False
+        self.__complete = False
+        self.__listeners = []
+
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+        self.__resyncs = 0
+
+        self.__resync()
+
+    def __schedule(self, target):
+        # Watch (re)creation must not run on the etcd3 watcher thread that delivers the callbacks
+        timer = threading.Timer(self.__resync_interval, target)
+        timer.daemon = True
+        timer.start()
+
+    def __is_excluded(self, key):
+        for prefix in self.__excluded_prefixes:
+            if key.startswith(prefix):
+                return True
+        return False
+
+    def __index_add(self, key):
+        i = bisect.bisect_left(self.__keys, key)
+        if i == len(self.__keys) or self.__keys[i] != key:
+            self.__keys.insert(i, key)
+
+    def __indexed(self, key):
+        i = bisect.bisect_left(self.__keys, key)
+        return i < len(self.__keys) and self.__keys[i] == key
+
+    def __index_remove(self, key):
+        i = bisect.bisect_left(self.__keys, key)
+        if i < len(self.__keys) and self.__keys[i] == key:
+            del self.__keys[i]
+
+    def __index_range(self, range_start, prefix, limit=None):
+        # Keys of prefix from range_start on, in key order
+        start = bisect.bisect_left(self.__keys, range_start)
+        end = bisect.bisect_left(self.__keys, prefix[:-1] + chr(ord(prefix[-1]) + 1))
+        if limit is not None:
+            end = min(end, start + limit)
+        return self.__keys[start:end]
+
+    def __set(self, key, entry):
+        if key not in self.__entries:
+            self.__index_add(key)
+        self.__entries[key] = entry
+        self.__entries.move_to_end(key)
+
+    def __remove(self, key):
+        self.__entries.pop(key, None)
+        self.__index_remove(key)
+
+    def __caught_up(self):
+        # Written keys are served from the cache again once the watch has applied their write
+        for key in [k for k, revision in self.__written.items() if revision <= self.__revision]:
+            del self.__written[key]
+
+    def __ranges(self):
+        ranges = []
+        range_start = self.__prefix
+        for prefix in self.__excluded_prefixes:
+            ranges.append((range_start, prefix))
+            range_start = etcdRange.prefix_end(prefix)
+        ranges.append((range_start, etcdRange.prefix_end(self.__prefix)))
+        return ranges
+
+    def __resync(self):
+        try:
+            # All the ranges are read at the revision of the first one, so they form a consistent snapshot
+            revision = None
+            kvs = []
+            for range_start, range_end in self.__ranges():
+                response = etcdRange.get_range(self.__etcdClient, range_start, range_end, revision=revision)
+                revision = response.header.revision if revision is None else revision
+                kvs.extend(response.kvs)
+            values = [self.__resolve(kv.key.decode("utf-8"), kv.value, kv.mod_revision) for kv in kvs]
+            with self.__lock:
+                self.__entries.clear()
+                for kv, value in zip(kvs, values):
+                    self.__entries[kv.key.decode("utf-8")] = [kv.mod_revision, value, None]
+                self.__keys = sorted(self.__entries.keys())
+                self.__evict()
+                self.__complete = True
+                self.__revision = revision
+                self.__caught_up()
+                self.__resyncs += 1
+                for listener in self.__listeners:
+                    self.__load_listener(listener)
+            logger.info("Cache loaded %s key(s) at revision %s" % (len(kvs), revision))
+            self.__watch()
+        except Exception as e:
+            logger.error("Unable to load cache for prefix '%s'" % self.__prefix)
+            logger.error(str(e))
+            self.__schedule(self.__resync)
+
+    def __watch(self):
+        try:
+            with self.__lock:
+                start_revision = self.__revision + 1
+            self.__watch_id = self.__etcdClient.add_watch_prefix_callback(self.__prefix, self.__watch_callback,
+                                                                          start_revision=start_revision)
+            with self.__lock:
+                self.__watching = True
+        except etcd3.exceptions.RevisionCompactedError:
+            logger.warning("Cache revision %s is compacted, reload prefix '%s'" % (start_revision, self.__prefix))
+            self.__resync()
+        except Exception as e:
+            logger.error("Unable to watch prefix '%s'" % self.__prefix)
+            logger.error(str(e))
+            self.__schedule(self.__watch)
+
+    def __watch_callback(self, response):
+
+        if isinstance(response, Exception):
+            # The watch is gone, serve reads from etcd until it is restored from the last applied revision
+            logger.warning("Cache watch disconnected at revision %s: %s" % (self.__revision, str(response)))
+            with self.__lock:
+                self.__watching = False
+            if isinstance(response, etcd3.exceptions.RevisionCompactedError):
+                self.__schedule(self.__resync)
+            else:
+                self.__schedule(self.__watch)
+            return
+
+        with self.__lock:
+            changes = []
+            for event in response.events:
+                key = event.key.decode("utf-8")
+                is_put = isinstance(event, etcd3.events.PutEvent)
+                value = self.__resolve(key, event.value, event.mod_revision) if is_put else None
+                changes.append((key, event.mod_revision, value))
+                if self.__is_excluded(key):
+                    continue
+                if is_put:
+                    entry = self.__entries.get(key, None)
+                    if entry is not None and entry[0] >= event.mod_revision:
+                        continue
+                    self.__set(key, [event.mod_revision, value, None])
+                else:
+                    self.__remove(key)
+            self.__evict()
+            self.__revision = max(self.__revision, response.header.revision)
+            self.__caught_up()
+            for listener in self.__listeners:
+                try:
+                    listener.apply(changes)
+                except Exception as e:
+                    logger.error("Unable to apply changes to cache listener")
+                    logger.error(str(e))
+
+    def __load_listener(self, listener):
+        try:
+            listener.load(self.__revision)
+        except Exception as e:
+            logger.error("Unable to load cache listener at revision %s" % self.__revision)
+            logger.error(str(e))
+
+    def add_listener(self, listener):
+        # Listeners mirror the whole prefix, excluded sub-prefixes included. load(revision) is called with the revision
+        # the cache is synchronized at, and apply(changes) with the (key, mod_revision, value) of every change after
+        # it, value being None for deletions. Both are called under the cache lock, so they never overlap.
+        with self.__lock:
+            self.__listeners.append(listener)
+            if self.__revision > 0:
+                self.__load_listener(listener)
+
+    def __evict(self):
+        while len(self.__entries) > self.__max_entries:
+            self.__entries.popitem(last=False)
+            self.__evictions += 1
+
+    def __resolve(self, key, value, revision):
+        # Values stored in chunks are reassembled once, so that the entries and the listeners see the whole value
+        if self.__is_excluded(key):
+            return value
+        return entityChunks.resolve(self.__etcdClient, key, value, revision)
+
+    @staticmethod
+    def __decode(entry):
+        if entry[2] is None:
+            entry[2] = entityCodec.decode(entry[1])
+        return entry[2]
+
+    def __lookup(self, key):
+        # Returns the cached entry, None for a key known not to exist, or False when etcd must be consulted
+        with self.__lock:
+            if not self.__watching or key in self.__written:
+                return False
+            entry = self.__entries.get(key, None)
+            if entry is not None:
+                self.__entries.move_to_end(key)
+                self.__hits += 1
+                return entry
+            if self.__complete and not self.__indexed(key):
+                self.__hits += 1
+                return None
+            return False
+
+    def __read_through(self, key):
+        with self.__lock:
+            self.__misses += 1
+        result, metadata = self.__etcdClient.get(key)
+        if result is None:
+            return None
+        entry = [metadata.mod_revision, self.__resolve(key, result, metadata.mod_revision), None]
+        with self.__lock:
+            # Only keep values that are not older than what the watch has already applied
+            if self.__watching and metadata.response_header.revision >= self.__revision:
+                self.__set(key, entry)
+                self.__evict()
+        return entry
+
+    def written(self, keys):
+        # Keys this process has just written or deleted, they are read from etcd until the watch has applied the
+        # current revision, which covers the writes, so that the reads that follow a write on this process see it
+        keys = [key.decode("utf-8") if isinstance(key, bytes) else key for key in keys]
+        keys = [key for key in keys if not self.__is_excluded(key)]
+        if not keys:
+            return
+        try:
+            revision = etcdRange.get_range(self.__etcdClient, self.__prefix, "", keys_only=True).header.revision
+        except Exception as e:
+            logger.error("Unable to read the revision of written keys")
+            logger.error(str(e))
+            return
+        with self.__lock:
+            if revision <= self.__revision:
+                return
+            for key in keys:
+                self.__written[key] = revision
+
+    def __prefix_written(self, prefix):
+        for key in self.__written:
+            if key.startswith(prefix):
+                return True
+        return False
+
+    def get(self, key):
+        # Values are shared between readers and must not be modified
+        entry = self.__lookup(key)
+        if entry is False:
+            entry = self.__read_through(key)
+        if entry is None:
+            return None
+        with self.__lock:
+            return self.__decode(entry)
+
+    def get_raw(self, key):
+        entry = self.__lookup(key)
+        if entry is False:
+            entry = self.__read_through(key)
+        if entry is None:
+            return None
+        return entry[1].decode("utf-8")
+
+    def get_revision(self, key):
+        # The mod_revision of a key, 0 when it does not exist, without decoding its value
+        entry = self.__lookup(key)
+        if entry is False:
+            entry = self.__read_through(key)
+        if entry is None:
+            return 0
+        return entry[0]
+
+    def __listing(self, keys):
+        # The (key, value) tuples of indexed keys, the values that were evicted are read from etcd again
+        with self.__lock:
+            self.__hits += 1
+            entries = [self.__entries.get(k, None) for k in keys]
+        for i, key in enumerate(keys):
+            if entries[i] is None:
+                entries[i] = self.__read_through(key)
+        with self.__lock:
+            return [(key, self.__decode(entry)) for key, entry in zip(keys, entries) if entry is not None]
+
+    def get_prefix(self, prefix):
+        with self.__lock:
+            keys = self.__index_range(prefix, prefix) \
+                if self.__watching and self.__complete and not self.__prefix_written(prefix) else None
+            if keys is None:
+                self.__misses += 1
+        if keys is not None:
+            return self.__listing(keys)
+        return [(result[1].key.decode("utf-8"),
+                 entityCodec.decode(self.__resolve(result[1].key.decode("utf-8"), result[0], result[1].mod_revision)))
+                for result in self.__etcdClient.get_prefix(prefix)]
+
+    def get_page(self, prefix, limit, start_after=None):
+        # Up to limit (key, value) tuples of prefix in key order, starting after the start_after key, and whether
+        # more keys remain
+        range_start = start_after + "\0" if start_after else prefix
+        with self.__lock:
+            keys = self.__index_range(range_start, prefix, limit + 1) \
+                if self.__watching and self.__complete and not self.__prefix_written(prefix) else None
+            if keys is None:
+                self.__misses += 1
+        if keys is not None:
+            return self.__listing(keys[:limit]), len(keys) > limit
+        response = etcdRange.get_range(self.__etcdClient, range_start, etcdRange.prefix_end(prefix), limit=limit)
+        return [(kv.key.decode("utf-8"),
+                 entityCodec.decode(self.__resolve(kv.key.decode("utf-8"), kv.value, kv.mod_revision)))
+                for kv in response.kvs], response.more
+
+    def stats(self):
+        with self.__lock:
+            total = self.__hits + self.__misses
+            return {"keys": len(self.__keys),
+                    "entries": len(self.__entries),
+                    "written": len(self.__written),
+                    "max_entries": self.__max_entries,
+                    "revision": self.__revision,
+                    "watching": self.__watching,
+                    "complete": self.__complete,
+                    "hits": self.__hits,
+                    "misses": self.__misses,
+                    "hit_rate": float(self.__hits) / total if total else 0.0,
+                    "evictions": self.__evictions,
+                    "resyncs": self.__resyncs}
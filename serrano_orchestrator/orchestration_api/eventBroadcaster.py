@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import threading
+
+from serrano_orchestrator.utils import entityLogs
+from serrano_orchestrator.utils import entityCodec
+
+logger = logging.getLogger("SERRANO.Orchestrator.EventBroadcaster")
+
+# Entity documents whose status transitions are published, per log segment
+ENTITY_PREFIXES = {"deployment": "/serrano/orchestrator/deployments/deployment/",
+                   "kernel": "/serrano/orchestrator/kernels/kernel/"}
+
+
+class Subscriber:
+
+    def __init__(self, entities, loop, max_queued_events):
+        self.entities = entities
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=max_queued_events)
+        self.overflow = False
+
+    def deliver(self, event):
+        # Runs on the event loop of the subscriber, a client that does not keep up is disconnected
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflow = True
+
+
+class EventBroadcaster:
+    # Publishes the status transitions and new log events of the subscribed entities. It is registered as an
+    # EntityCache listener, so all the subscribers share the single etcd watch of the cache.
+
+    def __init__(self, events_conf):
+
+        self.__max_queued_events = events_conf.get("max_queued_events", 1000)
+
+        self.__lock = threading.Lock()
+        # (segment, entity_uuid) -> subscribers
+        self.__subscribers = {}
+        # Last published status of the subscribed entities
+        self.__status = {}
+
+    def load(self, revision):
+        pass
+
+    def apply(self, changes):
+        with self.__lock:
+            if not self.__subscribers:
+                return
+            for key, mod_revision, value in changes:
+                entity, event = self.__event(key, mod_revision, value)
+                if event is None:
+                    continue
+                for subscriber in self.__subscribers.get(entity, []):
+                    subscriber.loop.call_soon_threadsafe(subscriber.deliver, event)
+
+    def __event(self, key, mod_revision, value):
+
+        if key.startswith(entityLogs.LOGS_PREFIX):
+            entity = entityLogs.parse_key(key)
+            if value is None or entity not in self.__subscribers:
+                return entity, None
+            log = entityCodec.decode(value)
+            return entity, {"type": "log", "kind": entity[0], "uuid": entity[1], "revision": mod_revision,
+                            "timestamp": log["timestamp"], "event": log["event"]}
+
+        for segment, prefix in ENTITY_PREFIXES.items():
+            if key.startswith(prefix):
+                entity = (segment, key[len(prefix):])
+                if entity not in self.__subscribers:
+                    return entity, None
+                if value is None:
+                    self.__status.pop(entity, None)
+                    return entity, {"type": "deleted", "kind": segment, "uuid": entity[1], "revision": mod_revision}
+                entity_status = entityCodec.decode(value)["status"]
+                if self.__status.get(entity, None) == entity_status:
+                    return entity, None
+                self.__status[entity] = entity_status
+                return entity, {"type": "status", "kind": segment, "uuid": entity[1], "revision": mod_revision,
+                                "status": entity_status}
+
+        return None, None
+
+    def subscribe(self, entities, loop):
+        subscriber = Subscriber(entities, loop, self.__max_queued_events)
+        with self.__lock:
+            for entity in entities:
+                self.__subscribers.setdefault(entity, []).append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.__lock:
+            for entity in subscriber.entities:
+                subscribers = self.__subscribers.get(entity, [])
+                if subscriber in subscribers:
+                    subscribers.remove(subscriber)
+                if not subscribers:
+                    self.__subscribers.pop(entity, None)
+                    self.__status.pop(entity, None)
+
+    def set_status(self, entity, entity_status):
+        # Status of an entity when it is subscribed, transitions are published relative to it
+        with self.__lock:
+            if entity in self.__subscribers:
+                self.__status.setdefault(entity, entity_status)
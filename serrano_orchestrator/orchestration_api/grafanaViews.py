@@ -0,0 +1,394 @@
+import math
+import bisect
+import logging
+import threading
+
+from serrano_orchestrator.utils import etcdRange
+from serrano_orchestrator.utils import entityCodec
+from serrano_orchestrator.utils import entityChunks
+from serrano_orchestrator.utils import entityLogs
+
+logger = logging.getLogger("SERRANO.Orchestrator.GrafanaViews")
+
+DEPLOYMENTS_PREFIX = "/serrano/orchestrator/deployments/deployment/"
+KERNELS_PREFIX = "/serrano/orchestrator/kernels/kernel/"
+STORAGE_POLICIES_PREFIX = "/serrano/orchestrator/storage_policies/policy/"
+ASSIGNMENTS_PREFIX = "/serrano/orchestrator/assignments/"
+BUNDLES_PREFIX = "/serrano/orchestrator/bundles/bundle/"
+
+# Log segments of the entities that have a Grafana logs table
+LOG_SEGMENTS = {DEPLOYMENTS_PREFIX: "deployment", KERNELS_PREFIX: "kernel", STORAGE_POLICIES_PREFIX: "storage_policy"}
+
+READ_PAGE_SIZE = 1000
+
+
+def matches(name, filtering_name):
+    return not filtering_name or (name or "").find(filtering_name) != -1
+
+
+def timestamp_param(params, name):
+    # Grafana sends the dashboard time range in milliseconds, entity and log timestamps are in seconds. Raises
+    # ValueError for a value that is not a finite number.
+    value = params.get(name, None)
+    if not value:
+        return None
+    value = float(value)
+    if not math.isfinite(value):
+        raise ValueError("'%s' is not a finite timestamp" % name)
+    value = int(value)
+    return value // 1000 if value > 10**11 else value
+
+
+def limit_param(params):
+    limit = params.get("limit", None)
+    if not limit:
+        return None
+    limit = int(limit)
+    if limit < 0:
+        raise ValueError("'limit' is negative")
+    return limit
+
+
+def check_log_params(params):
+    # Raises ValueError for a time range or limit of the log endpoints that cannot be parsed
+    timestamp_param(params, "from")
+    timestamp_param(params, "to")
+    limit_param(params)
+
+
+class GrafanaViews:
+    # Flat tables behind the Grafana endpoints, registered as an EntityCache listener and kept current from its watch
+    # events. Dashboard queries only touch the rows they return instead of scanning and decoding etcd prefixes.
+    #
+    # The log tables keep the latest max_log_rows rows of every segment. A query whose time range reaches the rows
+    # dropped from a table is answered from a range read of the log keys of the segment instead.
+
+    def __init__(self, etcd_client, views_conf):
+
+        self.__etcdClient = etcd_client
+        self.__views_conf = views_conf
+        self.__max_log_rows = views_conf.get("max_log_rows", 100000)
+
+        self.__lock = threading.RLock()
+        self.__ready = False
+        # Revision of the load in progress, and the changes applied since it started, to replay on the new tables
+        self.__loading = None
+        self.__buffered = []
+        self.__etcd_log_reads = 0
+        self.__reset()
+
+    def __reset(self):
+        self.__deployments = {}
+        self.__kernels = {}
+        self.__storage_policies = {}
+        # assignment_uuid -> {"cluster_uuid", "bundles"}, bundle_uuid -> {"name", "status"}
+        self.__assignments = {}
+        self.__bundles = {}
+        # Per log segment, (timestamp, key, entity_uuid, event) rows ordered by time
+        self.__logs = {segment: [] for segment in LOG_SEGMENTS.values()}
+        # Rows of the events still embedded in entity documents, per (segment, entity_uuid)
+        self.__embedded_logs = {}
+        # Per log segment, the timestamp of the latest row dropped from the table, None while no row was dropped
+        self.__horizons = {segment: None for segment in LOG_SEGMENTS.values()}
+        self.__dropped_log_rows = 0
+
+    def __populate(self, revision):
+        prefixes = [DEPLOYMENTS_PREFIX, KERNELS_PREFIX, STORAGE_POLICIES_PREFIX, ASSIGNMENTS_PREFIX, BUNDLES_PREFIX]
+        prefixes += ["%s%s/" % (entityLogs.LOGS_PREFIX, segment) for segment in LOG_SEGMENTS.values()]
+        for prefix in prefixes:
+            for kv in etcdRange.iter_range(self.__etcdClient, prefix, etcdRange.prefix_end(prefix),
+                                           revision=revision, page_size=READ_PAGE_SIZE):
+                key = kv.key.decode("utf-8")
+                self.__apply(key, entityChunks.resolve(self.__etcdClient, key, kv.value, kv.mod_revision))
+
+    def load(self, revision):
+        # Called under the cache lock, so the tables are built on a thread of their own, from a snapshot at revision.
+        # The current tables keep serving and receiving the changes meanwhile, which are replayed on the new ones.
+        with self.__lock:
+            self.__loading = revision
+            self.__buffered = []
+        thread = threading.Thread(target=self.__load, args=[revision], name="GrafanaViewsLoad", daemon=True)
+        thread.start()
+
+    def __load(self, revision):
+        tables = GrafanaViews(self.__etcdClient, self.__views_conf)
+        try:
+            tables.__populate(revision)
+        except Exception as e:
+            logger.error("Unable to load Grafana views at revision %s" % revision)
+            logger.error(str(e))
+            with self.__lock:
+                if self.__loading == revision:
+                    # The current tables may have missed changes, the Grafana endpoints read etcd until the next load
+                    self.__loading = None
+                    self.__buffered = []
+                    self.__ready = False
+            return
+
+        with self.__lock:
+            if self.__loading != revision:
+                # A newer load has started
+                return
+            self.__deployments = tables.__deployments
+            self.__kernels = tables.__kernels
+            self.__storage_policies = tables.__storage_policies
+            self.__assignments = tables.__assignments
+            self.__bundles = tables.__bundles
+            self.__logs = tables.__logs
+            self.__embedded_logs = tables.__embedded_logs
+            self.__horizons = tables.__horizons
+            self.__dropped_log_rows = tables.__dropped_log_rows
+            for changes in self.__buffered:
+                for key, mod_revision, value in changes:
+                    self.__apply(key, value)
+            self.__loading = None
+            self.__buffered = []
+            self.__ready = True
+        logger.info("Grafana views loaded at revision %s" % revision)
+
+    def apply(self, changes):
+        with self.__lock:
+            if self.__loading is not None:
+                self.__buffered.append(changes)
+            for key, mod_revision, value in changes:
+                self.__apply(key, value)
+
+    def ready(self):
+        return self.__ready
+
+    def stats(self):
+        with self.__lock:
+            return {"ready": self.__ready,
+                    "loading": self.__loading is not None,
+                    "log_rows": sum(len(rows) for rows in self.__logs.values()),
+                    "max_log_rows": self.__max_log_rows,
+                    "dropped_log_rows": self.__dropped_log_rows,
+                    "etcd_log_reads": self.__etcd_log_reads}
+
+    def __insert_log(self, segment, row):
+        rows = self.__logs[segment]
+        bisect.insort(rows, row)
+        if len(rows) > self.__max_log_rows:
+            horizon = self.__horizons[segment]
+            self.__horizons[segment] = rows[0][0] if horizon is None else max(horizon, rows[0][0])
+            self.__dropped_log_rows += 1
+            del rows[0]
+
+    def __remove_log(self, segment, timestamp, key):
+        rows = self.__logs[segment]
+        index = bisect.bisect_left(rows, (timestamp, key))
+        if index < len(rows) and rows[index][:2] == (timestamp, key):
+            del rows[index]
+
+    def __set_embedded_logs(self, segment, key, entity_uuid, entity):
+        for row in self.__embedded_logs.pop((segment, entity_uuid), []):
+            self.__remove_log(segment, row[0], row[1])
+        if entity is None or not entity.get("logs", []):
+            return
+        rows = [(log["timestamp"], "%s#%06d" % (key, index), entity_uuid, log["event"])
+                for index, log in enumerate(entity["logs"])]
+        for row in rows:
+            self.__insert_log(segment, row)
+        self.__embedded_logs[(segment, entity_uuid)] = rows
+
+    def __apply(self, key, value):
+
+        if key.startswith(entityLogs.LOGS_PREFIX):
+            segment, entity_uuid = entityLogs.parse_key(key)
+            if segment not in self.__logs:
+                return
+            timestamp = int(key.split("/")[-2])
+            # A log key that is written again (e.g. a legacy event moved out again) replaces its row
+            self.__remove_log(segment, timestamp, key)
+            if value is not None:
+                self.__insert_log(segment, (timestamp, key, entity_uuid, entityCodec.decode(value)["event"]))
+            return
+
+        if key.startswith(ASSIGNMENTS_PREFIX):
+            # /serrano/orchestrator/assignments/<cluster_uuid>/assignment/<assignment_uuid>
+            elements = key[len(ASSIGNMENTS_PREFIX):].split("/")
+            if len(elements) != 3:
+                return
+            if value is None:
+                self.__assignments.pop(elements[2], None)
+            else:
+                assignment = entityCodec.decode(value)
+                self.__assignments[elements[2]] = {"cluster_uuid": elements[0], "bundles": assignment["bundles"]}
+            return
+
+        if key.startswith(BUNDLES_PREFIX):
+            bundle_uuid = key[len(BUNDLES_PREFIX):]
+            if value is None:
+                self.__bundles.pop(bundle_uuid, None)
+            else:
+                bundle = entityCodec.decode(value)
+                name = None
+                for b in bundle["description"]:
+                    if b["kind"] == "Deployment":
+                        name = b["metadata"]["name"]
+                self.__bundles[bundle_uuid] = {"name": name, "status": bundle["status"]}
+            return
+
+        for prefix, table in [(DEPLOYMENTS_PREFIX, self.__deployments),
+                              (KERNELS_PREFIX, self.__kernels),
+                              (STORAGE_POLICIES_PREFIX, self.__storage_policies)]:
+            if key.startswith(prefix):
+                entity_uuid = key[len(prefix):]
+                entity = entityCodec.decode(value) if value is not None else None
+                if entity is None:
+                    table.pop(entity_uuid, None)
+                else:
+                    table[entity_uuid] = self.__row(prefix, entity)
+                self.__set_embedded_logs(LOG_SEGMENTS[prefix], key, entity_uuid, entity)
+                return
+
+    @staticmethod
+    def __row(prefix, d):
+        if prefix == DEPLOYMENTS_PREFIX:
+            return {"name": d["name"],
+                    "deployment_uuid": d["deployment_uuid"],
+                    "status": d["status"],
+                    "assignments": d["assignments"],
+                    "created_at": d["created_at"],
+                    "updated_at": d["updated_at"]}
+        if prefix == KERNELS_PREFIX:
+            return {"request_uuid": d["request_uuid"],
+                    "kernel_name": d["kernel_name"],
+                    "status": d["status"],
+                    "data_description_uuid": d["data_description"]["uuid"],
+                    "data_description_total_size_MB": d["data_description"]["total_size_MB"],
+                    "assignment_uuid": d["assignment_uuid"],
+                    "created_at": d["created_at"],
+                    "updated_at": d["updated_at"]}
+        return {"name": d["name"],
+                "policy_uuid": d["policy_uuid"],
+                "status": d["status"],
+                "decision": d["decision"],
+                "created_at": d["created_at"]}
+
+    def __cluster_uuid(self, assignment_uuid):
+        if not assignment_uuid:
+            return ""
+        assignment = self.__assignments.get(assignment_uuid, None)
+        return assignment["cluster_uuid"] if assignment else None
+
+    @staticmethod
+    def __select(rows, table, start, end, limit, filtering_name):
+        # The time range selects a slice of the time ordered rows, the latest 'limit' rows of it are returned
+        low = bisect.bisect_left(rows, (start,)) if start is not None else 0
+        high = bisect.bisect_left(rows, (end + 1,)) if end is not None else len(rows)
+
+        data = []
+        for index in range(high - 1, low - 1, -1):
+            timestamp, key, entity_uuid, event = rows[index]
+            entity = table.get(entity_uuid, None)
+            if entity is None or not matches(entity.get("name", None), filtering_name):
+                continue
+            data.append((entity, timestamp, event))
+            if limit and len(data) >= limit:
+                break
+        data.reverse()
+        return data
+
+    def __read_log_rows(self, segment, start, end):
+        # The rows of the log keys of a segment within the time range, read from etcd
+        rows = []
+        prefix = "%s%s/" % (entityLogs.LOGS_PREFIX, segment)
+        for kv in etcdRange.iter_range(self.__etcdClient, prefix, etcdRange.prefix_end(prefix),
+                                       page_size=READ_PAGE_SIZE):
+            key = kv.key.decode("utf-8")
+            timestamp = int(key.split("/")[-2])
+            if (start is not None and timestamp < start) or (end is not None and timestamp > end):
+                continue
+            rows.append((timestamp, key, entityLogs.parse_key(key)[1], entityCodec.decode(kv.value)["event"]))
+        return rows
+
+    def __table(self, segment):
+        return {"deployment": self.__deployments,
+                "kernel": self.__kernels,
+                "storage_policy": self.__storage_policies}[segment]
+
+    def __log_rows(self, segment, params, filtering_name):
+        # Must not be called under the views lock, the rows that were dropped are read from etcd without it
+        start = timestamp_param(params, "from")
+        end = timestamp_param(params, "to")
+        limit = limit_param(params)
+
+        with self.__lock:
+            data = self.__select(self.__logs[segment], self.__table(segment), start, end, limit, filtering_name)
+            horizon = self.__horizons[segment]
+            # Complete unless the time range reaches rows that were dropped, and the limit leaves room for them
+            if horizon is None or (start is not None and start > horizon) or \
+                    (limit and len(data) >= limit and data[0][1] > horizon):
+                return data
+            self.__etcd_log_reads += 1
+            embedded = [row for (s, entity_uuid), rows in self.__embedded_logs.items() if s == segment
+                        for row in rows]
+
+        rows = sorted(self.__read_log_rows(segment, start, end) + embedded)
+        with self.__lock:
+            return self.__select(rows, self.__table(segment), start, end, limit, filtering_name)
+
+    def storage_policies(self, params):
+        filtering_name = params.get("filter", None)
+        with self.__lock:
+            return [dict(row) for policy_uuid, row in sorted(self.__storage_policies.items())
+                    if matches(row["name"], filtering_name)]
+
+    def storage_policies_logs(self, params):
+        return [{"name": d["name"], "policy_uuid": d["policy_uuid"], "timestamp": timestamp, "event": event}
+                for d, timestamp, event in self.__log_rows("storage_policy", params, params.get("filter", None))]
+
+    def deployments(self, params):
+        filtering_name = params.get("filter", None)
+        with self.__lock:
+            data = []
+            for deployment_uuid, row in sorted(self.__deployments.items()):
+                if not matches(row["name"], filtering_name):
+                    continue
+                d = dict(row)
+                d["clusters"] = [self.__cluster_uuid(assignment_uuid) for assignment_uuid in row["assignments"]]
+                data.append(d)
+            return data
+
+    def deployments_logs(self, params):
+        return [{"name": d["name"], "deployment_uuid": d["deployment_uuid"], "timestamp": timestamp, "event": event}
+                for d, timestamp, event in self.__log_rows("deployment", params, params.get("filter", None))]
+
+    def faas_kernels(self, params):
+        with self.__lock:
+            data = []
+            for request_uuid, row in sorted(self.__kernels.items()):
+                d = dict(row)
+                d["cluster_uuid"] = self.__cluster_uuid(row["assignment_uuid"])
+                data.append(d)
+            return data
+
+    def faas_kernels_logs(self, params):
+        return [{"request_uuid": d["request_uuid"], "kernel_name": d["kernel_name"], "timestamp": timestamp,
+                 "event": event}
+                for d, timestamp, event in self.__log_rows("kernel", params, None)]
+
+    def deployments_services(self, params):
+        filtering_name = params.get("filter", None)
+        with self.__lock:
+            data = []
+            for deployment_uuid, d in sorted(self.__deployments.items()):
+                if not matches(d["name"], filtering_name):
+                    continue
+                for assignment_uuid in d["assignments"]:
+                    assignment = self.__assignments.get(assignment_uuid, None)
+                    if assignment is None:
+                        continue
+                    for bundle_uuid in assignment["bundles"]:
+                        bundle = self.__bundles.get(bundle_uuid, None)
+                        if bundle is None:
+                            continue
+                        data.append({"deployment_name": d["name"],
+                                     "deployment_uuid": d["deployment_uuid"],
+                                     "created_at": d["created_at"],
+                                     "updated_at": d["updated_at"],
+                                     "service_name": bundle["name"],
+                                     "service_cluster_uuid": assignment["cluster_uuid"],
+                                     "service_status": bundle["status"]})
+            return data
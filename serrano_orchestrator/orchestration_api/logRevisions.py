@@ -0,0 +1,62 @@
+import threading
+import collections
+
+from serrano_orchestrator.utils import etcdRange
+from serrano_orchestrator.utils import entityLogs
+
+MAX_ENTITIES = 100000
+
+
+class LogRevisions:
+    # Revision of the latest log event of an entity, so that the state of an entity's logs is known without reading
+    # them. It is read from the log keys of the entity the first time it is asked for, and kept current from then on
+    # as an EntityCache listener.
+
+    def __init__(self, etcd_client):
+
+        self.__etcdClient = etcd_client
+        self.__lock = threading.Lock()
+        # (segment, entity_uuid) -> revision, kept in least recently used order
+        self.__revisions = collections.OrderedDict()
+        # Latest revision of the changes applied so far
+        self.__revision = 0
+
+    def load(self, revision):
+        with self.__lock:
+            self.__revisions.clear()
+            self.__revision = revision
+
+    def apply(self, changes):
+        with self.__lock:
+            for key, mod_revision, value in changes:
+                self.__revision = max(self.__revision, mod_revision)
+                if not key.startswith(entityLogs.LOGS_PREFIX):
+                    continue
+                entity = entityLogs.parse_key(key)
+                if entity not in self.__revisions:
+                    continue
+                if value is None:
+                    # The revision of the remaining events is read again when it is next asked for
+                    del self.__revisions[entity]
+                else:
+                    self.__revisions[entity] = max(self.__revisions[entity], mod_revision)
+
+    def get(self, kind, entity_uuid):
+        entity = (entityLogs.KIND_SEGMENTS.get(kind, kind), str(entity_uuid))
+        with self.__lock:
+            revision = self.__revisions.get(entity, None)
+            if revision is not None:
+                self.__revisions.move_to_end(entity)
+                return revision
+
+        prefix = entityLogs.entity_prefix(kind, entity_uuid)
+        response = etcdRange.get_range(self.__etcdClient, prefix, etcdRange.prefix_end(prefix), keys_only=True)
+        revision = max([kv.mod_revision for kv in response.kvs] + [0])
+
+        with self.__lock:
+            # Changes applied before the read completed could be missing from it, only a read that covers them is kept
+            if response.header.revision >= self.__revision:
+                self.__revisions[entity] = revision
+                while len(self.__revisions) > MAX_ENTITIES:
+                    self.__revisions.popitem(last=False)
+        return revision
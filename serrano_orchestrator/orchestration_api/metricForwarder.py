@@ -0,0 +1,123 @@
+import time
+import logging
+import threading
+import collections
+
+logger = logging.getLogger("SERRANO.Orchestrator.MetricForwarder")
+
+KERNEL_METRICS_PATH = "/api/v1/telemetry/central/kernel_metrics"
+
+
+class MetricForwarder:
+    # Forwards the kernel metric logs of the drivers to the Central Telemetry Handler in the background. Logs are
+    # acknowledged as soon as they are queued and sent in batches, when batch_size logs are queued or flush_interval
+    # seconds after the oldest one. A full queue rejects new logs, so that drivers back off instead of the API
+    # buffering without bound.
+
+    def __init__(self, cth_client, metrics_conf):
+
+        self.__cth_client = cth_client
+        self.__max_queued_logs = metrics_conf.get("max_queued_logs", 10000)
+        self.__batch_size = metrics_conf.get("batch_size", 500)
+        self.__flush_interval = metrics_conf.get("flush_interval", 1.0)
+        self.__max_retries = metrics_conf.get("max_retries", 3)
+        self.__retry_backoff = metrics_conf.get("retry_backoff", 0.5)
+
+        self.__condition = threading.Condition()
+        # (queued_at, log) tuples in arrival order
+        self.__queue = collections.deque()
+        self.__running = True
+
+        self.__accepted = 0
+        self.__rejected = 0
+        self.__sent = 0
+        self.__batches = 0
+        self.__retries = 0
+        self.__dropped = 0
+
+        self.__worker = threading.Thread(target=self.__run, name="MetricForwarder", daemon=True)
+        self.__worker.start()
+
+    def submit(self, logs):
+        # Queues all the logs or none of them, returns False when they do not fit in the queue. More logs than the
+        # queue can ever hold raise ValueError, since retrying them would never succeed.
+        with self.__condition:
+            if len(logs) > self.__max_queued_logs:
+                self.__rejected += len(logs)
+                raise ValueError("%s kernel metric log(s) exceed max_queued_logs %s" %
+                                 (len(logs), self.__max_queued_logs))
+            if not self.__running or len(self.__queue) + len(logs) > self.__max_queued_logs:
+                self.__rejected += len(logs)
+                return False
+            now = time.monotonic()
+            self.__queue.extend((now, log) for log in logs)
+            self.__accepted += len(logs)
+            # Wakes the worker to flush a full batch or to time the flush of the first queued logs
+            self.__condition.notify()
+        return True
+
+    def __next_batch(self):
+        # Blocks until a batch is due, returns an empty batch once closed and drained
+        with self.__condition:
+            while True:
+                if self.__queue:
+                    wait = self.__queue[0][0] + self.__flush_interval - time.monotonic()
+                    if len(self.__queue) >= self.__batch_size or wait <= 0 or not self.__running:
+                        count = min(self.__batch_size, len(self.__queue))
+                        return [self.__queue.popleft()[1] for i in range(count)]
+                elif not self.__running:
+                    return []
+                else:
+                    wait = None
+                self.__condition.wait(wait)
+
+    def __send(self, batch):
+        for attempt in range(self.__max_retries + 1):
+            if attempt > 0:
+                with self.__condition:
+                    self.__retries += 1
+                time.sleep(self.__retry_backoff * (2 ** (attempt - 1)))
+            try:
+                response = self.__cth_client.post(KERNEL_METRICS_PATH, json={"logs": batch})
+                if response.status_code < 500:
+                    if response.status_code >= 400:
+                        logger.error("Kernel metrics batch rejected by CTH with status %s" % response.status_code)
+                        return False
+                    return True
+                logger.warning("Kernel metrics batch failed with status %s" % response.status_code)
+            except Exception as e:
+                logger.warning("Unable to send kernel metrics batch: %s" % str(e))
+        return False
+
+    def __run(self):
+        while True:
+            batch = self.__next_batch()
+            if not batch:
+                return
+            sent = self.__send(batch)
+            with self.__condition:
+                self.__batches += 1
+                if sent:
+                    self.__sent += len(batch)
+                else:
+                    self.__dropped += len(batch)
+            if not sent:
+                logger.error("Dropped %s kernel metric log(s)" % len(batch))
+
+    def close(self, timeout=10):
+        # Stops accepting logs and flushes the queued ones
+        with self.__condition:
+            self.__running = False
+            self.__condition.notify()
+        self.__worker.join(timeout)
+
+    def stats(self):
+        with self.__condition:
+            return {"queued": len(self.__queue),
+                    "max_queued_logs": self.__max_queued_logs,
+                    "accepted": self.__accepted,
+                    "rejected": self.__rejected,
+                    "sent": self.__sent,
+                    "batches": self.__batches,
+                    "retries": self.__retries,
+                    "dropped": self.__dropped}
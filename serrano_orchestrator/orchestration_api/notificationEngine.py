@@ -1,58 +1,200 @@
-import time
 import json
+import time
+import zlib
+import queue
 import logging
-import datetime
-import requests
+import threading
+import collections
 
-from PyQt5.QtCore import QThread
-from confluent_kafka import Consumer
+from confluent_kafka import Consumer, KafkaException, TopicPartition
 
 logger = logging.getLogger("SERRANO.Orchestrator.NotificationEngine")
 
 
-class NotificationEngine(QThread):
+class NotificationWorker(threading.Thread):
+    # Hands the queued notification events of its partition to the Dispatcher, one part of a batch at a time, so the
+    # events of a key are handled in order. The handled parts are collected for the engine to commit their batches.
 
-    def __init__(self, notification_conf, service_endpoint):
+    def __init__(self, partition, dispatcher, max_queued_batches):
 
-        QThread.__init__(self)
+        threading.Thread.__init__(self, name="NotificationWorker-%s" % partition, daemon=True)
 
-        self.__kafka_conf = {"bootstrap.servers":  notification_conf["server"],
-                             "group.id": notification_conf["group_id"],
-                             "auto.offset.reset": "smallest"}
-        self.__ede_topic = notification_conf["ede_topic"]
-        self.__service_endpoint = service_endpoint
+        self.__dispatcher = dispatcher
+        self.batches = queue.Queue(maxsize=max_queued_batches)
+        self.handled_batches = collections.deque()
+        # Enqueue time of every part not handled yet, the oldest one gives the processing lag of the partition
+        self.__pending = collections.deque()
+        self.__events = 0
 
-    def __del__(self):
-        self.wait()
+    def put(self, part, timeout):
+        # The enqueue time is recorded first, the worker may handle the part as soon as it is queued
+        self.__pending.append(time.monotonic())
+        try:
+            self.batches.put(part, timeout=timeout)
+        except queue.Full:
+            self.__pending.pop()
+            raise
 
     def run(self):
+        while True:
+            part = self.batches.get()
+            if part is None:
+                return
+            events, batch = part
+            try:
+                self.__dispatcher.handle_notification_evts(events)
+            except Exception as e:
+                logger.error("Unable to handle %s notification event(s)" % len(events))
+                logger.error(str(e))
+            self.__events += len(events)
+            self.__pending.popleft()
+            self.handled_batches.append(batch)
 
-        logger.info("Service is running ...")
+    def stats(self, now):
+        try:
+            lag = now - self.__pending[0]
+        except IndexError:
+            lag = 0
+        return {"queued": self.batches.qsize(), "events": self.__events, "lag": lag}
 
-        consumer = Consumer(self.__kafka_conf)
-        consumer.subscribe([self.__ede_topic])
 
-        while True:
+class NotificationBatch:
+    # A consumed batch split by key across the workers, its offsets are committed once all its parts are handled
 
-            msg = consumer.poll(timeout=1.0)
+    def __init__(self, offsets, parts):
 
-            if msg is None:
-                continue
-            else:
-                event_msg = msg.value().decode("utf-8").replace("\n", "")
-                event_data = json.loads(event_msg)
+        self.offsets = offsets
+        self.parts = parts
+
+
+class NotificationEngine(threading.Thread):
+    # Consumes the EDE notification events in the API process and splits every batch by key over a pool of
+    # NotificationWorkers. The events of a key (the Kafka message key, or else the EDE model) always go to the same
+    # worker and are handled in order, the events of unrelated keys are handled concurrently. A full worker queue
+    # stops consumption, the backlog stays on the topic. Offsets are committed once all the parts of their batch and
+    # of the earlier batches are handled, so events are delivered at least once.
 
-                element = datetime.datetime.strptime(event_data["reporttimestamp"].split(".")[0], "%Y-%m-%dT%H:%M:%S")
-                timestamp = datetime.datetime.timestamp(element)
+    def __init__(self, notification_conf, dispatcher):
 
-                logger.info("Notification event from topic '%s'" % self.__ede_topic)
-                logger.debug(event_msg)
+        threading.Thread.__init__(self, name="NotificationEngine", daemon=True)
 
-                try:
+        self.__kafka_conf = {"bootstrap.servers":  notification_conf["server"],
+                             "group.id": notification_conf["group_id"],
+                             "auto.offset.reset": "smallest",
+                             "enable.auto.commit": False}
+        self.__ede_topic = notification_conf["ede_topic"]
+        # Up to batch_size events are queued together, waiting at most linger seconds for a batch to fill up
+        self.__batch_size = notification_conf.get("batch_size", 100)
+        self.__linger = notification_conf.get("linger", 1.0)
+
+        max_queued_batches = notification_conf.get("max_queued_batches", 100)
+        self.__workers = [NotificationWorker(partition, dispatcher, max_queued_batches)
+                          for partition in range(max(1, notification_conf.get("workers", 4)))]
+        # Batches not committed yet, in consumption order
+        self.__batches = collections.deque()
+        self.__running = True
+
+    def __parse(self, msg):
+        try:
+            return json.loads(msg.value().decode("utf-8").replace("\n", ""))
+        except Exception as e:
+            logger.error("Skip malformed notification event at offset %s of topic '%s'" % (msg.offset(),
+                                                                                           self.__ede_topic))
+            logger.error(str(e))
+            return None
+
+    def __partition(self, msg, event):
+        key = msg.key() or str(event.get("model", "") if isinstance(event, dict) else "").encode("utf-8")
+        return zlib.crc32(key) % len(self.__workers)
+
+    @staticmethod
+    def __next_offsets(msgs):
+        # The offsets to commit once the batch is handled, i.e. past the last message of every partition
+        offsets = {}
+        for msg in msgs:
+            offsets[(msg.topic(), msg.partition())] = msg.offset() + 1
+        return [TopicPartition(topic, partition, offset) for (topic, partition), offset in offsets.items()]
+
+    def __commit(self, consumer):
+        for worker in self.__workers:
+            while worker.handled_batches:
+                worker.handled_batches.popleft().parts -= 1
+        # Only the handled batches that follow the last committed one are committed, the latest offset of every
+        # partition covers the earlier ones
+        offsets = {}
+        while self.__batches and self.__batches[0].parts == 0:
+            for tp in self.__batches.popleft().offsets:
+                offsets[(tp.topic, tp.partition)] = tp
+        if not offsets:
+            return
+        try:
+            consumer.commit(offsets=list(offsets.values()), asynchronous=False)
+        except KafkaException as e:
+            # The events are consumed again after the rebalance, the Dispatcher may receive them twice
+            logger.warning("Unable to commit offsets of topic '%s': %s" % (self.__ede_topic, str(e)))
+
+    def __enqueue(self, consumer, worker, part):
+        while self.__running:
+            try:
+                worker.put(part, timeout=self.__linger)
+                return
+            except queue.Full:
+                self.__commit(consumer)
+
+    def run(self):
+
+        logger.info("Service is running with %s worker(s) ..." % len(self.__workers))
 
-                    requests.post("%s/api/v1/orchestrator/ede_notification" % self.__service_endpoint, json=event_data)
+        for worker in self.__workers:
+            worker.start()
 
-                except Exception as e:
-                    logger.error("Unable to forward notification event from topic '%s" % self.__ede_topic)
-                    logger.error(str(e))
+        consumer = Consumer(self.__kafka_conf)
+        consumer.subscribe([self.__ede_topic])
+
+        while self.__running:
+
+            self.__commit(consumer)
+
+            msgs = []
+            for msg in consumer.consume(num_messages=self.__batch_size, timeout=self.__linger):
+                if msg.error():
+                    logger.error("Consumer error on topic '%s': %s" % (self.__ede_topic, msg.error()))
+                else:
+                    msgs.append(msg)
+            if not msgs:
+                continue
 
+            parts = collections.OrderedDict()
+            for msg in msgs:
+                event = self.__parse(msg)
+                if event is not None:
+                    parts.setdefault(self.__partition(msg, event), []).append(event)
+            logger.info("%s notification event(s) from topic '%s' for %s worker(s)" % (
+                sum([len(events) for events in parts.values()]), self.__ede_topic, len(parts)))
+
+            batch = NotificationBatch(self.__next_offsets(msgs), len(parts))
+            self.__batches.append(batch)
+            for partition, events in parts.items():
+                self.__enqueue(consumer, self.__workers[partition], (events, batch))
+
+        # The parts already queued are handled and committed before the consumer is closed
+        for worker in self.__workers:
+            worker.batches.put(None)
+        for worker in self.__workers:
+            worker.join()
+        self.__commit(consumer)
+        consumer.close()
+
+    def stop(self, timeout=10):
+        self.__running = False
+        self.join(timeout)
+        if self.is_alive():
+            logger.warning("Notification workers did not drain their queues")
+
+    def stats(self):
+        now = time.monotonic()
+        partitions = {str(partition): worker.stats(now) for partition, worker in enumerate(self.__workers)}
+        return {"workers": len(self.__workers),
+                "queued": sum([p["queued"] for p in partitions.values()]),
+                "uncommitted_batches": len(self.__batches),
+                "partition": partitions}
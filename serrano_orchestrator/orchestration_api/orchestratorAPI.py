@@ -1,25 +1,83 @@
+import os
 import sys
 import json
 import time
 import signal
-import requests
+import asyncio
 import uvicorn
 import os.path
 import logging
 
-from PyQt5.QtCore import QObject, QCoreApplication
-
 import uuid
-from fastapi import FastAPI, Request, APIRouter, Depends, Response, status
+from fastapi import FastAPI, Request, APIRouter, Depends, Response, BackgroundTasks, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
 from pydantic import BaseModel, UUID4
 
 import dispatcher
+import asyncDispatcher
+import serviceClient
+import eventBroadcaster
+import apiMetrics
+import grafanaViews
+
+from serrano_orchestrator.utils import entityCodec
+from serrano_orchestrator.utils import entityChunks
 import notificationEngine
 
 LOG_LEVEL = {"CRITICAL": 50, "ERROR": 40, "WARNING": 30, "INFO": 20, "DEBUG": 10}
 
+# Configuration file of the application factory, used by every worker process
+CONF_FILE_ENV = "SERRANO_ORCHESTRATOR_API_CONF"
+DEFAULT_CONF_FILE = "/etc/serrano/orchestration_api.json"
+
+logger = logging.getLogger("SERRANO.Orchestrator.OrchestratorAPI")
+
+SSE_KEEPALIVE_INTERVAL = 15
+
+
+def listing(name, results, limit):
+    # Without a limit the whole collection is returned as before, otherwise a page and the cursor of the next one
+    if limit is None:
+        return {name: results}
+    data, next_cursor = results
+    return {name: data, "next_cursor": next_cursor}
+
+
+def not_modified(request, etag):
+    if_none_match = request.headers.get("if-none-match", None)
+    if not if_none_match or etag is None:
+        return False
+    return if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]
+
+
+def wants_ndjson(request):
+    # Streaming is opt-in, with either the Accept header or the format query parameter
+    return request.query_params.get("format", None) == "ndjson" or \
+        "application/x-ndjson" in request.headers.get("accept", "")
+
+
+def ndjson_response(batches):
+
+    async def lines():
+        async for batch in batches:
+            yield "".join(["%s\n" % json.dumps(row) for row in batch])
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+def sse(event):
+    return "id: %s\nevent: %s\ndata: %s\n\n" % (event["revision"], event["type"], json.dumps(event))
+
+
+def uuids(values):
+    return [value.strip() for value in values.split(",") if value.strip()] if values else []
+
+
+def projection(fields):
+    return [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+
 
 class Cluster(BaseModel):
     cluster_uuid: str
@@ -38,6 +96,10 @@ class UpdateDeployment(Deployment):
     deployment_uuid: str
 
 
+class BulkDeployments(BaseModel):
+    deployments: List[Deployment]
+
+
 class Kernel(BaseModel):
     request_uuid: str
     kernel_name: str
@@ -72,6 +134,10 @@ class UpdateStoragePolicy(StoragePolicy):
     policy_uuid: str
 
 
+class BulkStoragePolicies(BaseModel):
+    storage_policies: List[StoragePolicy]
+
+
 class AssignmentMonitoringData(BaseModel):
     deployment_uuid: str
     cluster_uuid: str
@@ -86,57 +152,123 @@ class NotificationEvent(BaseModel):
     anomalies: List[dict]
 
 
-class OrchestratorAPI(QObject):
+class NotificationEvents(BaseModel):
+    events: List[NotificationEvent]
+
+
+class OrchestratorAPI:
+    # Registers the API routes. The etcd and HTTP clients and their threads are created by the startup hook, i.e. in
+    # every worker process after it is forked, and released by the shutdown hook.
 
     def __init__(self, app: FastAPI, conf_params):
 
-        super(QObject, self).__init__()
+        self.__conf_params = conf_params
+        self.__dispatcher = None
+        self.__broadcaster = None
+        self.__notification_engine = None
+        self.__secure_storage_client = None
+        self.__secure_storage_conf = conf_params["secure_storage"]
+
+        @app.on_event("startup")
+        def startup():
+            self.__start()
+
+        @app.on_event("shutdown")
+        async def shutdown():
+            if self.__notification_engine is not None:
+                await self.__dispatcher.run(self.__notification_engine.stop)
+            await self.__dispatcher.close()
+            self.__dispatcher.shutdown()
+            self.__secure_storage_client.close()
+
+        self.__add_routes(app)
 
-        logging.basicConfig(filename="%s.log" % (int(time.time())), level=LOG_LEVEL[conf_params["log_level"]])
+    def __start(self):
+
+        conf_params = self.__conf_params
+
+        # Each worker process logs to its own file
+        logging.basicConfig(filename="%s-%s.log" % (int(time.time()), os.getpid()),
+                            level=LOG_LEVEL[conf_params["log_level"]])
 
-        logger = logging.getLogger("SERRANO.Orchestrator.OrchestratorAPI")
         logger.info("Initialize services ... ")
 
         etcd_hostname = conf_params["etcd"]["endpoints"][0] if "etcd" in conf_params else "127.0.0.1"
         etcd_port = conf_params["etcd"]["port"] if "etcd" in conf_params else 2379
         ede_conf = conf_params["ede"] if "ede" in conf_params else {}
-        self.__cth_service = conf_params["central_telemetry_handler"]["cth_service"]
+        cache_conf = conf_params["cache"] if "cache" in conf_params else {}
+        dispatcher_conf = conf_params["dispatcher"] if "dispatcher" in conf_params else {}
+        http_conf = conf_params["http_client"] if "http_client" in conf_params else {}
+        grafana_conf = conf_params["grafana"] if "grafana" in conf_params else {}
+        events_conf = conf_params["events"] if "events" in conf_params else {}
+        metrics_conf = conf_params["metric_logs"] if "metric_logs" in conf_params else {}
+        anomalies_conf = conf_params["anomalies"] if "anomalies" in conf_params else {}
+        cth_service = conf_params["central_telemetry_handler"]["cth_service"]
 
-        self.__dispatcher = dispatcher.Dispatcher(etcd_hostname, etcd_port, self.__cth_service, ede_conf)
+        entityCodec.configure(conf_params["codec"] if "codec" in conf_params else {})
+        entityChunks.configure(conf_params["codec"] if "codec" in conf_params else {})
 
-        self.__secure_storage_conf = conf_params["secure_storage"]
+        max_txn_ops = conf_params["etcd"].get("max_txn_ops", 128) if "etcd" in conf_params else 128
+        entity_dispatcher = dispatcher.Dispatcher(etcd_hostname, etcd_port, cth_service, ede_conf, cache_conf,
+                                                  http_conf, grafana_conf, metrics_conf, anomalies_conf,
+                                                  max_txn_ops)
+
+        self.__broadcaster = eventBroadcaster.EventBroadcaster(events_conf)
+        entity_dispatcher.add_cache_listener(self.__broadcaster)
+
+        self.__dispatcher = asyncDispatcher.AsyncDispatcher(entity_dispatcher, dispatcher_conf)
+
+        apiMetrics.add_stats("cache", entity_dispatcher.get_cache_stats)
+        apiMetrics.add_stats("metric_logs", entity_dispatcher.get_metric_logs_stats)
+        apiMetrics.add_stats("anomalies", entity_dispatcher.get_anomalies_stats)
+        apiMetrics.add_stats("grafana_views", entity_dispatcher.get_views_stats)
+
+        # EDE notification events are consumed in the API process and handed to the Dispatcher in memory
+        notification_conf = conf_params["stream_handler"] if "stream_handler" in conf_params else {}
+        if notification_conf.get("server", ""):
+            self.__notification_engine = notificationEngine.NotificationEngine(notification_conf, entity_dispatcher)
+            self.__notification_engine.start()
+            apiMetrics.add_stats("notifications", self.__notification_engine.stats)
+
+        self.__secure_storage_client = serviceClient.ServiceClient("secure_storage",
+                                                                   self.__secure_storage_conf["service"], http_conf)
+
+        logger.info("SERRANO Resource Orchestrator API is ready in process %s ..." % os.getpid())
 
-        logger.info("SERRANO Resource Orchestrator API is ready ...")
+    def __add_routes(self, app):
 
         """
             Clusters 
         """
         @app.get("/api/v1/orchestrator/clusters")
-        async def get_clusters(active: Optional[str] = None):
-            return {"clusters": self.__dispatcher.get_clusters(active)}
+        async def get_clusters(active: Optional[str] = None, limit: Optional[int] = None, cursor: Optional[str] = None,
+                               fields: Optional[str] = None):
+            results = await self.__dispatcher.get_clusters(active, limit=limit, cursor=cursor,
+                                                           fields=projection(fields))
+            return listing("clusters", results, limit)
 
         @app.get("/api/v1/orchestrator/clusters/{cluster_uuid}")
         async def get_cluster(cluster_uuid: uuid.UUID):
-            return self.__dispatcher.get_cluster(cluster_uuid)
+            return await self.__dispatcher.get_cluster(cluster_uuid)
 
         @app.get("/api/v1/orchestrator/clusters/health/{cluster_uuid}")
         async def cluster_heartbeat(cluster_uuid: uuid.UUID):
-            return self.__dispatcher.cluster_heartbeat(cluster_uuid)
+            return await self.__dispatcher.cluster_heartbeat(cluster_uuid)
 
         @app.delete("/api/v1/orchestrator/clusters/{cluster_uuid}")
         async def delete_cluster(cluster_uuid: uuid.UUID):
-            self.__dispatcher.delete_cluster(cluster_uuid)
+            await self.__dispatcher.delete_cluster(cluster_uuid)
             return {}
 
         @app.post("/api/v1/orchestrator/clusters", status_code=201)
         async def post_cluster(cluster: Cluster):
-            self.__dispatcher.set_cluster({"cluster_uuid": cluster.cluster_uuid, "type": cluster.type,
+            await self.__dispatcher.set_cluster({"cluster_uuid": cluster.cluster_uuid, "type": cluster.type,
                                            "info": cluster.info})
             return {"cluster_uuid": cluster.cluster_uuid}
 
         @app.put("/api/v1/orchestrator/clusters", status_code=200)
         async def put_cluster(cluster: Cluster):
-            self.__dispatcher.set_cluster({"cluster_uuid": cluster.cluster_uuid, "type": cluster.type,
+            await self.__dispatcher.set_cluster({"cluster_uuid": cluster.cluster_uuid, "type": cluster.type,
                                            "info": cluster.info})
             return {"cluster_uuid": cluster.cluster_uuid}
 
@@ -145,24 +277,39 @@ class OrchestratorAPI(QObject):
         """
 
         @app.get("/api/v1/orchestrator/deployments")
-        async def get_deployments():
-            return {"deployments": self.__dispatcher.get_deployments()}
+        async def get_deployments(request: Request, limit: Optional[int] = None, cursor: Optional[str] = None,
+                                  fields: Optional[str] = None):
+            if wants_ndjson(request):
+                return ndjson_response(self.__dispatcher.stream("iter_deployments", fields=projection(fields)))
+            results = await self.__dispatcher.get_deployments(limit=limit, cursor=cursor, fields=projection(fields))
+            return listing("deployments", results, limit)
 
         @app.get("/api/v1/orchestrator/deployments/{deployment_uuid}")
-        async def get_deployment(deployment_uuid: uuid.UUID):
-            return {"deployments": self.__dispatcher.get_deployments(deployment_uuid=deployment_uuid)}
+        async def get_deployment(deployment_uuid: uuid.UUID, request: Request, response: Response):
+            etag = await self.__dispatcher.get_etag("Deployment", deployment_uuid)
+            if not_modified(request, etag):
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+            if etag is not None:
+                response.headers["ETag"] = etag
+            return {"deployments": await self.__dispatcher.get_deployments(deployment_uuid=deployment_uuid)}
 
         @app.get("/api/v1/orchestrator/deployments/logs/{deployment_uuid}")
-        async def get_deployment(deployment_uuid: uuid.UUID):
-            return {"deployments": self.__dispatcher.get_deployment_logs(deployment_uuid)}
+        async def get_deployment(deployment_uuid: uuid.UUID, request: Request, response: Response):
+            etag = await self.__dispatcher.get_etag("DeploymentLogs", deployment_uuid)
+            if not_modified(request, etag):
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+            if etag is not None:
+                response.headers["ETag"] = etag
+            return {"deployments": await self.__dispatcher.get_deployment_logs(deployment_uuid)}
 
         @app.get("/api/v1/orchestrator/deployments/services/{deployment_uuid}")
         async def get_deployment(deployment_uuid: uuid.UUID):
-            return self.__dispatcher.get_deployment_services(deployment_uuid)
+            return await self.__dispatcher.get_deployment_services(deployment_uuid)
 
         @app.delete("/api/v1/orchestrator/deployments/{deployment_uuid}")
-        async def delete_deployment(deployment_uuid: uuid.UUID, response: Response):
-            if self.__dispatcher.delete_deployment(deployment_uuid):
+        async def delete_deployment(deployment_uuid: uuid.UUID, response: Response, background_tasks: BackgroundTasks):
+            if await self.__dispatcher.delete_deployment(deployment_uuid):
+                background_tasks.add_task(self.__dispatcher.notify_deployment_deletion, deployment_uuid)
                 response.status_code = status.HTTP_200_OK
             else:
                 response.status_code = status.HTTP_404_NOT_FOUND
@@ -176,16 +323,35 @@ class OrchestratorAPI(QObject):
                 data["name"] = deployment_uuid
             data["deployment_uuid"] = deployment_uuid
             data["kind"] = "Deployment"
-            self.__dispatcher.create_deployment(data)
+            await self.__dispatcher.create_deployment(data)
             return {"deployment_uuid": deployment_uuid}
 
+        @app.post("/api/v1/orchestrator/deployments/bulk", status_code=201)
+        async def post_deployments(bulk: BulkDeployments, response: Response):
+            deployments = []
+            for deployment in bulk.deployments:
+                data = deployment.dict()
+                data["deployment_uuid"] = str(uuid.uuid4())
+                if not deployment.name:
+                    data["name"] = data["deployment_uuid"]
+                data["kind"] = "Deployment"
+                deployments.append(data)
+            if not deployments:
+                response.status_code = status.HTTP_400_BAD_REQUEST
+                return {}
+            # Large lists are written in several transactions, the ones written before a failure stay written
+            written = await self.__dispatcher.create_deployments(deployments)
+            if len(written) < len(deployments):
+                response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+            return {"deployment_uuids": written}
+
         @app.put("/api/v1/orchestrator/deployments", status_code=200)
         async def put_deployment(deployment: UpdateDeployment):
             data = deployment.dict()
             if not deployment.name:
                 data["name"] = deployment.deployment_uuid
             data["kind"] = "Deployment"
-            self.__dispatcher.update_deployment(data)
+            await self.__dispatcher.update_deployment(data)
             return {"deployment_uuid": deployment.deployment_uuid}
 
         """
@@ -194,23 +360,28 @@ class OrchestratorAPI(QObject):
         @app.post("/api/v1/orchestrator/kernels", status_code=201)
         async def post_serverless_kernel(kernel: Kernel):
             request_uuid = kernel.data_description["bucket_id"]
-            self.__dispatcher.set_kernel_execution({"kind": "Kernel",
+            await self.__dispatcher.set_kernel_execution({"kind": "Kernel",
                                                     "request_uuid": request_uuid,
                                                     "kernel_name": kernel.kernel_name,
                                                     "data_description": kernel.data_description})
             return {"uuid": request_uuid}
 
         @app.get("/api/v1/orchestrator/kernels/{request_uuid}", status_code=200)
-        async def get_serverless_kernel_logs(request_uuid: uuid.UUID):
-            return self.__dispatcher.get_kernel_logs(request_uuid)
+        async def get_serverless_kernel_logs(request_uuid: uuid.UUID, request: Request, response: Response):
+            etag = await self.__dispatcher.get_etag("Kernel", request_uuid)
+            if not_modified(request, etag):
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+            if etag is not None:
+                response.headers["ETag"] = etag
+            return await self.__dispatcher.get_kernel_logs(request_uuid)
 
         @app.get("/api/v1/orchestrator/kernels", status_code=200)
         async def get_serverless_kernel_logs():
-            return self.__dispatcher.get_all_kernels()
+            return await self.__dispatcher.get_all_kernels()
 
         @app.post("/api/v1/orchestrator/faas", status_code=201)
         async def post_faas_kernel(kernel: Kernel):
-            self.__dispatcher.set_kernel_execution({"kind": "FaaS",
+            await self.__dispatcher.set_kernel_execution({"kind": "FaaS",
                                                     "request_uuid": kernel.request_uuid,
                                                     "kernel_name": kernel.kernel_name,
                                                     "deployment_objectives": kernel.deployment_objectives,
@@ -218,37 +389,46 @@ class OrchestratorAPI(QObject):
             return {"request_uuid": kernel.request_uuid}
 
         @app.get("/api/v1/orchestrator/faas/{request_uuid}", status_code=200)
-        async def get_faas_kernel_logs(request_uuid: uuid.UUID):
-            return self.__dispatcher.get_faas_logs(request_uuid)
+        async def get_faas_kernel_logs(request_uuid: uuid.UUID, request: Request, response: Response):
+            etag = await self.__dispatcher.get_etag("FaaS", request_uuid)
+            if not_modified(request, etag):
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+            if etag is not None:
+                response.headers["ETag"] = etag
+            return await self.__dispatcher.get_faas_logs(request_uuid)
 
         @app.get("/api/v1/orchestrator/faas", status_code=200)
-        async def get_faas_kernel_logs():
-            return {"faas": self.__dispatcher.get_all_faas()}
+        async def get_faas_kernel_logs(limit: Optional[int] = None, cursor: Optional[str] = None):
+            return listing("faas", await self.__dispatcher.get_all_faas(limit=limit, cursor=cursor), limit)
 
         """
             Storage Policies
         """
         @app.get("/api/v1/orchestrator/storage_policies")
-        async def get_storage_policies():
-            return {"storage_policies": self.__dispatcher.get_storage_policy()}
+        async def get_storage_policies(limit: Optional[int] = None, cursor: Optional[str] = None,
+                                       fields: Optional[str] = None):
+            results = await self.__dispatcher.get_storage_policy(limit=limit, cursor=cursor, fields=projection(fields))
+            return listing("storage_policies", results, limit)
 
         @app.get("/api/v1/orchestrator/storage_policies/{policy_uuid}")
         async def get_storage_policy(policy_uuid: uuid.UUID):
-            return {"storage_policies": self.__dispatcher.get_storage_policy(policy_uuid=policy_uuid)}
+            return {"storage_policies": await self.__dispatcher.get_storage_policy(policy_uuid=policy_uuid)}
 
         @app.delete("/api/v1/orchestrator/storage_policies/{policy_uuid}")
         async def delete_storage_policy(policy_uuid: uuid.UUID, response: Response):
 
             try:
 
-                policy = self.__dispatcher.get_storage_policy(policy_uuid=policy_uuid)
+                policy = await self.__dispatcher.get_storage_policy(policy_uuid=policy_uuid)
 
                 if len(policy):
                     policy_name = policy[0]["name"]
-                    res = requests.delete("%s/storage_policy/%s" %(self.__secure_storage_conf["service"], policy_name),
-                                          headers={"Authorization": "Bearer %s" % self.__secure_storage_conf["token"] })
+                    res = await self.__dispatcher.run(self.__secure_storage_client.delete,
+                                                      "/storage_policy/%s" % policy_name,
+                                                      headers={"Authorization": "Bearer %s" %
+                                                                                self.__secure_storage_conf["token"]})
 
-                    self.__dispatcher.delete_storage_policy(policy_uuid)
+                    await self.__dispatcher.delete_storage_policy(policy_uuid)
                     response.status_code = status.HTTP_200_OK
                 else:
                     response.status_code = status.HTTP_404_NOT_FOUND
@@ -265,16 +445,35 @@ class OrchestratorAPI(QObject):
                 data["name"] = policy_uuid
             data["policy_uuid"] = policy_uuid
             data["kind"] = "StoragePolicy"
-            self.__dispatcher.create_storage_policy(data)
+            await self.__dispatcher.create_storage_policy(data)
             return {"policy_uuid": policy_uuid}
 
+        @app.post("/api/v1/orchestrator/storage_policies/bulk", status_code=201)
+        async def post_storage_policies(bulk: BulkStoragePolicies, response: Response):
+            policies = []
+            for policy in bulk.storage_policies:
+                data = policy.dict()
+                data["policy_uuid"] = str(uuid.uuid4())
+                if not policy.name:
+                    data["name"] = data["policy_uuid"]
+                data["kind"] = "StoragePolicy"
+                policies.append(data)
+            if not policies:
+                response.status_code = status.HTTP_400_BAD_REQUEST
+                return {}
+            # Large lists are written in several transactions, the ones written before a failure stay written
+            written = await self.__dispatcher.create_storage_policies(policies)
+            if len(written) < len(policies):
+                response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+            return {"policy_uuids": written}
+
         @app.put("/api/v1/orchestrator/storage_policies", status_code=200)
         async def put_storage_policy(policy: UpdateStoragePolicy, response: Response):
             data = policy.dict()
             if not policy.name:
                 data["name"] = policy.policy_uuid
             data["kind"] = "StoragePolicy"
-            if self.__dispatcher.update_storage_policy(data):
+            if await self.__dispatcher.update_storage_policy(data):
                 response.status_code == status.HTTP_200_OK
                 return {"policy_uuid": policy.policy_uuid}
             else:
@@ -287,7 +486,7 @@ class OrchestratorAPI(QObject):
 
         @app.get("/api/v1/orchestrator/assignments/{cluster_uuid}/assignment/{assignment_uuid}")
         async def get_assignment(cluster_uuid: uuid.UUID, assignment_uuid: uuid.UUID):
-            return self.__dispatcher.get_assignment(cluster_uuid, assignment_uuid)
+            return await self.__dispatcher.get_assignment(cluster_uuid, assignment_uuid)
 
         """
             Bundles
@@ -295,22 +494,54 @@ class OrchestratorAPI(QObject):
 
         @app.get("/api/v1/orchestrator/bundles/{bundle_uuid}")
         async def get_bundle(bundle_uuid: uuid.UUID):
-            return self.__dispatcher.get_bundle(bundle_uuid)
+            return await self.__dispatcher.get_bundle(bundle_uuid)
 
         """
             Logs
         """
         @app.post("/api/v1/orchestrator/logs", status_code=201)
         async def post_logs(logs: Logs):
-            return self.__dispatcher.add_entities_logs(logs.dict())
+            return await self.__dispatcher.add_entities_logs(logs.dict())
+
+        @app.get("/api/v1/orchestrator/logs/{kind}/{entity_uuid}")
+        async def get_entity_logs(kind: str, entity_uuid: uuid.UUID, response: Response, start: Optional[int] = None,
+                                  end: Optional[int] = None, limit: Optional[int] = 100, cursor: Optional[str] = None):
+            try:
+                data = await self.__dispatcher.get_entity_logs(kind, str(entity_uuid), start=start, end=end,
+                                                               limit=limit, cursor=cursor)
+            except ValueError:
+                response.status_code = status.HTTP_400_BAD_REQUEST
+                return {}
+            if data is None:
+                response.status_code = status.HTTP_404_NOT_FOUND
+                return {}
+            return data
 
         @app.post("/api/v1/orchestrator/metric_logs", status_code=201)
-        async def post_metric_logs(logs: MetricLogs):
+        async def post_metric_logs(logs: MetricLogs, response: Response):
+            # The logs are forwarded to the CTH in the background, a full forwarding queue asks the driver to retry
+            # and a request larger than the whole queue to split its logs
             try:
-                print("POST /metric_logs")
-                requests.post("%s/api/v1/telemetry/central/kernel_metrics" % self.__cth_service, json=logs.dict())
-            except Exception as e:
-                print(str(e))
+                queued = await self.__dispatcher.post_kernel_metrics(logs.dict())
+            except ValueError:
+                response.status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+                return {}
+            if not queued:
+                response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+                response.headers["Retry-After"] = "1"
+            return {}
+
+        """
+            Service Assurance notifications
+        """
+        @app.post("/api/v1/orchestrator/ede_notification", status_code=201)
+        async def post_ede_notification(event: NotificationEvent):
+            await self.__dispatcher.handle_notification_evt(event.dict())
+            return {}
+
+        @app.post("/api/v1/orchestrator/ede_notifications", status_code=201)
+        async def post_ede_notifications(batch: NotificationEvents):
+            await self.__dispatcher.handle_notification_evts([event.dict() for event in batch.events])
             return {}
 
         """
@@ -318,40 +549,117 @@ class OrchestratorAPI(QObject):
         """
         @app.put("/api/v1/orchestrator/monitoring", status_code=201)
         async def post_logs(data: AssignmentMonitoringData):
-            return self.__dispatcher.put_assignment_monitoring_data(data.dict())
+            return await self.__dispatcher.put_assignment_monitoring_data(data.dict())
 
 
 
+        """
+            Events
+        """
+        @app.get("/api/v1/orchestrator/events")
+        async def get_events(response: Response, deployments: Optional[str] = None, faas: Optional[str] = None,
+                             kernels: Optional[str] = None):
+            # Server-sent events for the status transitions and the new log events of the requested entities
+            entities = [("deployment", entity_uuid) for entity_uuid in uuids(deployments)]
+            entities += [("kernel", entity_uuid) for entity_uuid in uuids(faas) + uuids(kernels)]
+            if not entities:
+                response.status_code = status.HTTP_400_BAD_REQUEST
+                return {}
+
+            async def events():
+                subscriber = self.__broadcaster.subscribe(entities, asyncio.get_event_loop())
+                try:
+                    # Current status first, so that transitions that happened before the subscription are not missed
+                    for segment, entity_uuid in entities:
+                        current = await self.__dispatcher.get_entity_status("Deployment" if segment == "deployment"
+                                                                            else "Kernel", entity_uuid)
+                        if current is not None:
+                            self.__broadcaster.set_status((segment, entity_uuid), current[0])
+                            yield sse({"type": "status", "kind": segment, "uuid": entity_uuid,
+                                       "revision": current[1], "status": current[0]})
+                    while not subscriber.overflow:
+                        try:
+                            event = await asyncio.wait_for(subscriber.queue.get(), timeout=SSE_KEEPALIVE_INTERVAL)
+                        except asyncio.TimeoutError:
+                            yield ": keep-alive\n\n"
+                            continue
+                        yield sse(event)
+                finally:
+                    self.__broadcaster.unsubscribe(subscriber)
+
+            return StreamingResponse(events(), media_type="text/event-stream",
+                                     headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+        """
+            Service statistics
+        """
+        @app.get("/api/v1/orchestrator/stats")
+        async def get_stats():
+            stats = {"cache": await self.__dispatcher.get_cache_stats(),
+                     "metric_logs": await self.__dispatcher.get_metric_logs_stats(),
+                     "anomalies": await self.__dispatcher.get_anomalies_stats(),
+                     "grafana_views": await self.__dispatcher.get_views_stats()}
+            if self.__notification_engine is not None:
+                stats["notifications"] = await self.__dispatcher.run(self.__notification_engine.stats)
+            return stats
+
+        @app.get("/metrics")
+        async def get_metrics():
+            output, content_type = await self.__dispatcher.run(apiMetrics.render)
+            return Response(content=output, media_type=content_type)
+
         """
             Grafana
         """
         @app.get("/api/v1/orchestrator/grafana/storage_policies")
         async def grafana_storage_policies(request: Request):
-            return self.__dispatcher.grafana_storage_policies(request.query_params)
+            return await self.__dispatcher.grafana_storage_policies(request.query_params)
 
         @app.get("/api/v1/orchestrator/grafana/storage_policies_logs")
-        async def grafana_storage_policies_logs(request: Request):
-            return self.__dispatcher.grafana_storage_policies_logs(request.query_params)
+        async def grafana_storage_policies_logs(request: Request, response: Response):
+            try:
+                grafanaViews.check_log_params(request.query_params)
+            except ValueError:
+                response.status_code = status.HTTP_400_BAD_REQUEST
+                return {}
+            if wants_ndjson(request):
+                return ndjson_response(self.__dispatcher.stream("iter_grafana_storage_policies_logs",
+                                                                request.query_params))
+            return await self.__dispatcher.grafana_storage_policies_logs(request.query_params)
 
         @app.get("/api/v1/orchestrator/grafana/deployments")
         async def grafana_deployments(request: Request):
-            return self.__dispatcher.grafana_deployments(request.query_params)
+            return await self.__dispatcher.grafana_deployments(request.query_params)
 
         @app.get("/api/v1/orchestrator/grafana/deployments_logs")
-        async def grafana_deployments_logs(request: Request):
-            return self.__dispatcher.grafana_deployments_logs(request.query_params)
+        async def grafana_deployments_logs(request: Request, response: Response):
+            try:
+                grafanaViews.check_log_params(request.query_params)
+            except ValueError:
+                response.status_code = status.HTTP_400_BAD_REQUEST
+                return {}
+            if wants_ndjson(request):
+                return ndjson_response(self.__dispatcher.stream("iter_grafana_deployments_logs", request.query_params))
+            return await self.__dispatcher.grafana_deployments_logs(request.query_params)
 
         @app.get("/api/v1/orchestrator/grafana/faas_kernels")
         async def grafana_faas_kernels(request: Request):
-            return self.__dispatcher.grafana_faas_kernels(request.query_params)
+            return await self.__dispatcher.grafana_faas_kernels(request.query_params)
 
         @app.get("/api/v1/orchestrator/grafana/faas_kernels_logs")
-        async def grafana_faas_kernels_logs(request: Request):
-            return self.__dispatcher.grafana_faas_kernels_logs(request.query_params)
+        async def grafana_faas_kernels_logs(request: Request, response: Response):
+            try:
+                grafanaViews.check_log_params(request.query_params)
+            except ValueError:
+                response.status_code = status.HTTP_400_BAD_REQUEST
+                return {}
+            if wants_ndjson(request):
+                return ndjson_response(self.__dispatcher.stream("iter_grafana_faas_kernels_logs", request.query_params))
+            return await self.__dispatcher.grafana_faas_kernels_logs(request.query_params)
 
         @app.get("/api/v1/orchestrator/grafana/deployments_services")
         async def grafana_faas_kernels_logs(request: Request):
-            return self.__dispatcher.grafana_deployments_services()
+            return await self.__dispatcher.grafana_deployments_services(request.query_params)
 
 def startup(params):
     app = FastAPI()
@@ -363,17 +671,25 @@ def startup(params):
         allow_methods=["*"],
         allow_headers=["*"],
     )
+    app.add_middleware(apiMetrics.RequestMetrics)
     OrchestratorAPI(app, params)
     return app
 
 
-if __name__ == "__main__":
+def load_conf():
+    with open(os.environ.get(CONF_FILE_ENV, DEFAULT_CONF_FILE)) as f:
+        return json.load(f)
+
 
-    config_file = "/etc/serrano/orchestration_api.json" 
+def create_app():
+    # Application factory, e.g. uvicorn --factory --workers 4 orchestratorAPI:create_app
+    return startup(load_conf())
 
-    with open(config_file) as f:
-        config = json.load(f)
 
-    uvicorn.run(startup(config), host=config["rest_interface"]["address"], port=config["rest_interface"]["port"])
-    
+if __name__ == "__main__":
+
+    config = load_conf()
 
+    # Every worker process imports the module and builds its own application and clients through the factory
+    uvicorn.run("orchestratorAPI:create_app", factory=True, host=config["rest_interface"]["address"],
+                port=config["rest_interface"]["port"], workers=config["rest_interface"].get("workers", 1))
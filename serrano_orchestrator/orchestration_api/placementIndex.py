@@ -0,0 +1,82 @@
+import logging
+import threading
+
+from serrano_orchestrator.utils import etcdRange
+from serrano_orchestrator.utils import entityCodec
+
+logger = logging.getLogger("SERRANO.Orchestrator.PlacementIndex")
+
+MONITORING_PREFIX = "/serrano/orchestrator/monitoring/"
+
+
+class PlacementIndex:
+    # Worker node -> placements of the Deployments running on it, built from the k8s_params that the drivers report
+    # in the monitoring entities and kept current as an EntityCache listener. A placement identifies the Deployment,
+    # Assignment, Bundle and K8s Deployment of the Pods that run on the worker node.
+
+    def __init__(self, etcd_client):
+
+        self.__etcdClient = etcd_client
+        self.__lock = threading.Lock()
+        # worker node -> {(deployment_uuid, assignment_uuid, bundle_uuid, k8s_deployment_name): placement}
+        self.__nodes = {}
+        # deployment_uuid -> worker nodes, to remove the placements of a Deployment when its entity changes
+        self.__deployment_nodes = {}
+
+    @staticmethod
+    def __placements(deployment_uuid, monitoring):
+        for cluster_uuid in monitoring.get("clusters", []):
+            for k8s_params in monitoring.get(cluster_uuid, []):
+                placement = {"deployment_uuid": deployment_uuid, "cluster_uuid": cluster_uuid}
+                placement.update({k: v for k, v in k8s_params.items() if k != "k8s_worker_nodes"})
+                for worker_node in k8s_params.get("k8s_worker_nodes", []):
+                    yield worker_node, placement
+
+    def __remove(self, deployment_uuid):
+        for worker_node in self.__deployment_nodes.pop(deployment_uuid, []):
+            placements = self.__nodes.get(worker_node, {})
+            for placement_key in [k for k in placements if k[0] == deployment_uuid]:
+                del placements[placement_key]
+            if not placements:
+                self.__nodes.pop(worker_node, None)
+
+    def __add(self, deployment_uuid, monitoring):
+        worker_nodes = set()
+        for worker_node, placement in self.__placements(deployment_uuid, monitoring):
+            placement_key = (deployment_uuid, placement.get("assignment_uuid", None),
+                             placement.get("bundle_uuid", None), placement.get("k8s_deployment_name", None))
+            self.__nodes.setdefault(worker_node, {})[placement_key] = placement
+            worker_nodes.add(worker_node)
+        if worker_nodes:
+            self.__deployment_nodes[deployment_uuid] = worker_nodes
+
+    def __apply(self, key, value):
+        deployment_uuid = key[len(MONITORING_PREFIX):]
+        self.__remove(deployment_uuid)
+        if value is not None:
+            try:
+                self.__add(deployment_uuid, entityCodec.decode(value))
+            except Exception as e:
+                logger.error("Unable to index the placements of Deployment '%s'" % deployment_uuid)
+                logger.error(str(e))
+
+    def load(self, revision):
+        with self.__lock:
+            self.__nodes = {}
+            self.__deployment_nodes = {}
+            for kv in etcdRange.iter_range(self.__etcdClient, MONITORING_PREFIX,
+                                           etcdRange.prefix_end(MONITORING_PREFIX), revision=revision):
+                self.__apply(kv.key.decode("utf-8"), kv.value)
+        logger.info("Placements of %s worker node(s) loaded at revision %s" % (len(self.__nodes), revision))
+
+    def apply(self, changes):
+        with self.__lock:
+            for key, mod_revision, value in changes:
+                if key.startswith(MONITORING_PREFIX):
+                    self.__apply(key, value)
+
+    def get(self, worker_nodes):
+        # worker node -> placements, for the given worker nodes only
+        with self.__lock:
+            return {worker_node: [dict(p) for p in self.__nodes.get(worker_node, {}).values()]
+                    for worker_node in worker_nodes}
@@ -0,0 +1,80 @@
+import numpy
+
+AGGREGATIONS = {"max": numpy.fmax, "sum": numpy.add}
+
+MAX_LAYOUTS = 64
+
+
+class RootCauseEngine:
+    # Scores the worker nodes of a batch of anomalies from their SHAP values. The SHAP features are named
+    # <metric>_<worker node>, the score of a node is the max (or sum) of its feature values and the nodes whose score
+    # reaches the threshold are the root cause, optionally limited to the top_k highest scores. The nodes are listed
+    # in the order of their first feature that reaches the threshold, as the per-anomaly loop listed them, followed by
+    # the nodes that only reach it in sum in the order of their first feature.
+    #
+    # The anomalies of a model share the same features, so the anomalies with the same features are scored together
+    # as one matrix, with the feature to worker node mapping computed once per feature layout.
+
+    def __init__(self, threshold, root_cause_conf):
+
+        self.__threshold = threshold
+        aggregation = root_cause_conf.get("aggregation", "max")
+        if aggregation not in AGGREGATIONS:
+            raise ValueError("Unknown root cause aggregation '%s'" % aggregation)
+        self.__aggregate = AGGREGATIONS[aggregation]
+        self.__top_k = root_cause_conf.get("top_k", 0)
+        # features -> (worker nodes, feature permutation grouping the features by node, start of every group)
+        self.__layouts = {}
+
+    def __layout(self, features):
+        layout = self.__layouts.get(features, None)
+        if layout is not None:
+            return layout
+        # Worker nodes are numbered in the order of their first feature
+        node_ids = {}
+        feature_nodes = numpy.fromiter((node_ids.setdefault(feature.split("_")[-1], len(node_ids))
+                                        for feature in features), dtype=numpy.intp, count=len(features))
+        permutation = numpy.argsort(feature_nodes, kind="stable")
+        starts = numpy.searchsorted(feature_nodes[permutation], numpy.arange(len(node_ids)))
+        nodes = numpy.empty(len(node_ids), dtype=object)
+        nodes[:] = list(node_ids.keys())
+        layout = (nodes, permutation, starts)
+        if len(self.__layouts) >= MAX_LAYOUTS:
+            self.__layouts.clear()
+        self.__layouts[features] = layout
+        return layout
+
+    def worker_nodes(self, shap_values_batch):
+        # The root cause worker nodes of every anomaly of the batch
+        results = [[] for shap_values in shap_values_batch]
+
+        groups = {}
+        for anomaly, shap_values in enumerate(shap_values_batch):
+            groups.setdefault(tuple(shap_values), []).append(anomaly)
+
+        for features, anomalies in groups.items():
+            if not features:
+                continue
+            nodes, permutation, starts = self.__layout(features)
+            values = numpy.empty((len(anomalies), len(features)))
+            for row, anomaly in enumerate(anomalies):
+                values[row] = numpy.fromiter(shap_values_batch[anomaly].values(), dtype=numpy.float64,
+                                             count=len(features))
+
+            scores = self.__aggregate.reduceat(values[:, permutation], starts, axis=1)
+            affected = scores >= self.__threshold
+            # Position of the first feature of every node that reaches the threshold, len(features) when none does
+            positions = numpy.where(values >= self.__threshold, numpy.arange(len(features)), len(features))
+            first = numpy.minimum.reduceat(positions[:, permutation], starts, axis=1)
+            order = numpy.argsort(first, axis=1, kind="stable")
+            listed = numpy.take_along_axis(affected, order, axis=1)
+
+            for row, anomaly in enumerate(anomalies):
+                selected = order[row][listed[row]]
+                if self.__top_k and len(selected) > self.__top_k:
+                    # The highest scores, equal scores in listing order, are kept in listing order
+                    top = numpy.argsort(-scores[row][selected], kind="stable")[:self.__top_k]
+                    selected = selected[numpy.sort(top)]
+                results[anomaly] = nodes[selected].tolist()
+
+        return results
@@ -0,0 +1,74 @@
+import time
+import logging
+import requests
+
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+import apiMetrics
+
+logger = logging.getLogger("SERRANO.Orchestrator.ServiceClient")
+
+DEFAULT_CONF = {"connect_timeout": 3.0,
+                "read_timeout": 10.0,
+                "max_connections": 16,
+                "retries": 3,
+                "backoff_factor": 0.2}
+
+
+class ServiceClient:
+    # HTTP client of an external service (CTH, EDE, secure storage). Connections are kept alive in a bounded pool
+    # that is shared by the threads of the process, every request has a timeout and idempotent requests are retried.
+    # Each uvicorn worker process creates its own clients on startup, so a service gets up to max_connections
+    # connections per worker process.
+
+    def __init__(self, name, base_url, http_conf):
+
+        conf = dict(DEFAULT_CONF)
+        conf.update({k: v for k, v in http_conf.items() if not isinstance(v, dict)})
+        conf.update(http_conf.get(name, {}))
+
+        self.__name = name
+        self.__base_url = base_url.rstrip("/")
+        self.__timeout = (conf["connect_timeout"], conf["read_timeout"])
+
+        retry = Retry(total=conf["retries"],
+                      backoff_factor=conf["backoff_factor"],
+                      status_forcelist=[502, 503, 504],
+                      method_whitelist=frozenset(["GET", "PUT", "DELETE", "HEAD", "OPTIONS"]),
+                      raise_on_status=False)
+        # With pool_block the number of concurrent connections to the service never exceeds max_connections
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=conf["max_connections"], pool_block=True,
+                              max_retries=retry)
+
+        self.__session = requests.Session()
+        self.__session.mount("http://", adapter)
+        self.__session.mount("https://", adapter)
+
+        logger.info("ServiceClient '%s' for '%s' is ready ..." % (self.__name, self.__base_url))
+
+    def request(self, method, path, **kwargs):
+        kwargs.setdefault("timeout", self.__timeout)
+        start = time.perf_counter()
+        response_status = "error"
+        try:
+            response = self.__session.request(method, "%s%s" % (self.__base_url, path), **kwargs)
+            response_status = str(response.status_code)
+            return response
+        finally:
+            apiMetrics.OUTBOUND_LATENCY.labels(self.__name, method, response_status).observe(time.perf_counter() - start)
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request("PUT", path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request("DELETE", path, **kwargs)
+
+    def close(self):
+        self.__session.close()
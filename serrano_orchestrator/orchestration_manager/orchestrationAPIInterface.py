@@ -7,22 +7,33 @@ import entities
 import requestType
 
 from serrano_orchestrator.utils import status
+from serrano_orchestrator.utils import entityLogs
+from serrano_orchestrator.utils import entityCodec
+from serrano_orchestrator.utils import entityChunks
 
 from PyQt5.QtCore import QObject
 from PyQt5.QtCore import pyqtSignal
 
 logger = logging.getLogger("SERRANO.Orchestrator.OrchestrationAPIInterface")
 
+MAX_UPDATE_ATTEMPTS = 5
+
 
 class OrchestrationAPIInterface(QObject):
     orchestratorRequest = pyqtSignal(object)
+    orchestratorBatchRequest = pyqtSignal(object)
 
     def __init__(self, config):
         super(QObject, self).__init__()
 
         self.config = config
 
+        entityCodec.configure(self.config["codec"] if "codec" in self.config else {})
+        entityChunks.configure(self.config["codec"] if "codec" in self.config else {})
+
         self.__etcdClient = etcd3.client(host=self.config["etcd"]["endpoints"][0], port=self.config["etcd"]["port"])
+        # Must not exceed the --max-txn-ops of the etcd cluster
+        self.__max_txn_ops = self.config["etcd"].get("max_txn_ops", 128)
         self.__etcdClient.add_watch_prefix_callback("/serrano/orchestrator/deployments/deployment/",
                                                     self.__etcd_watch_callback)
         self.__etcdClient.add_watch_prefix_callback("/serrano/orchestrator/kernels/kernel/",
@@ -31,41 +42,54 @@ class OrchestrationAPIInterface(QObject):
                                                     self.__etcd_watch_storage_policies_callback)
         logger.info("OrchestrationAPIInterface service is ready ...")
 
+    def __emit_requests(self, requests):
+        # Entities submitted in bulk arrive with the same watch response and are handed over as one batch
+        if len(requests) == 1:
+            self.orchestratorRequest.emit(requests[0])
+        elif len(requests) > 1:
+            logger.info("Batch of %s request(s)" % len(requests))
+            self.orchestratorBatchRequest.emit(requests)
+
     def __etcd_watch_callback(self, etcd_event):
         logger.info("Deployment event(s) ...")
+        requests = []
         for event in etcd_event.events:
-            value = event.value.decode("utf-8")
+            value = event.value
             if len(value) == 0: # Delete event
-                logger.info("Termination event for key '%s'" % event.value.decode("utf-8"))
-                return
+                logger.info("Termination event for key '%s'" % event.key.decode("utf-8"))
+                continue
             else:
-                event_data = json.loads(value)
+                event_data = entityCodec.decode(entityChunks.resolve(self.__etcdClient, event.key.decode("utf-8"),
+                                                                     event.value, event.mod_revision))
                 if event_data["updated_by"] == "Orchestration.API":
                     logger.info("Deployment event for key '%s'" % event.key.decode("utf-8"))
                     print("Deployment event for key '%s'" % event.key.decode("utf-8"))
-                    self.orchestratorRequest.emit(event_data)
+                    requests.append(event_data)
+        self.__emit_requests(requests)
 
     def __etcd_watch_storage_policies_callback(self, etcd_event):
         logger.info("Storage Policy deployment event(s)")
+        requests = []
         for event in etcd_event.events:
-            value = event.value.decode("utf-8")
+            value = event.value
             if len(value) == 0: # Delete event, nothing here the OrchestratorAPI handles everything in this case
-                return
-            event_data = json.loads(event.value.decode("utf-8"))
+                continue
+            event_data = entityCodec.decode(event.value)
             if event_data["updated_by"] == "Orchestration.API":
                 logger.info("Storage Policy event for key '%s'" % event.key.decode("utf-8"))
                 print("Storage policy event for key '%s'" % event.key.decode("utf-8"))
-                self.orchestratorRequest.emit(event_data)
+                requests.append(event_data)
+        self.__emit_requests(requests)
 
     def __etcd_watch_kernels_callback(self, etcd_event):
         logger.info("Kernel deployment event(s)")
         for event in etcd_event.events:
-            value = event.value.decode("utf-8")
+            value = event.value
             if len(value) == 0:  # Delete event
                 logger.info("Termination event for Kernel key '%s'" % event.value.decode("utf-8"))
                 return
             else:
-                event_data = json.loads(value)
+                event_data = entityCodec.decode(event.value)
                 if event_data["updated_by"] == "Orchestration.API":
                     logger.info("Kernel execution event for key '%s'" % event.key.decode("utf-8"))
                     print("Kernel execution event for key '%s'" % event.key.decode("utf-8"))
@@ -78,39 +102,41 @@ class OrchestrationAPIInterface(QObject):
         cc_policy_id = kwargs.get("cc_policy_id", 0)
         result, metadata = self.__etcdClient.get("/serrano/orchestrator/storage_policies/policy/%s" % policy_uuid)
         if result is not None:
-            data = json.loads(result.decode("utf-8"))
+            data = entityCodec.decode(result)
             if decision is not None:
                 data["decision"] = decision
-            for l_evt in log_evts:
-                data["logs"].append(l_evt)
             if status is not None:
                 data["status"] = status
             if cc_policy_id > 0:
                 data["cc_policy_id"] = cc_policy_id
             data["updated_by"] = "Orchestration.Manager"
             data["updated_at"] = int(time.time())
-            self.__etcdClient.put("/serrano/orchestrator/storage_policies/policy/%s" % policy_uuid, json.dumps(data))
+            self.__put_entity("/serrano/orchestrator/storage_policies/policy/%s" % policy_uuid,
+                              "StoragePolicy", policy_uuid, data, log_evts)
 
     def update_deployment(self, deployment_uuid, **kwargs):
         assignments = kwargs.get("assignments", None)
         assignments_status = kwargs.get("assignments_status", None)
         status = kwargs.get("status", None)
         logs = kwargs.get("logs", None)
-        result, metadata = self.__etcdClient.get("/serrano/orchestrator/deployments/deployment/%s" % deployment_uuid)
-        if result:
-            data = json.loads(result.decode("utf-8"))
+        key = "/serrano/orchestrator/deployments/deployment/%s" % deployment_uuid
+        for attempt in range(MAX_UPDATE_ATTEMPTS):
+            data, metadata = entityChunks.get(self.__etcdClient, key)
+            if not data:
+                return
             if assignments:
                 data["assignments"] = assignments
             if assignments_status:
                 data["assignments_status"] = assignments_status
             if status:
                 data["status"] = status
-            if logs:
-                for l_evt in logs:
-                    data["logs"].append(l_evt)
             data["updated_by"] = "Orchestration.Manager"
             data["updated_at"] = int(time.time())
-            self.__etcdClient.put("/serrano/orchestrator/deployments/deployment/%s" % deployment_uuid, json.dumps(data))
+            if self.__put_entity(key, "Deployment", deployment_uuid, data, logs or [], metadata):
+                return
+            logger.debug("Concurrent modification of '%s', retry update (%s/%s)" % (key, attempt + 1,
+                                                                                  MAX_UPDATE_ATTEMPTS))
+        logger.error("Unable to update '%s' after %s attempts" % (key, MAX_UPDATE_ATTEMPTS))
 
     def update_faas_kernel(self, request_uuid, **kwargs):
         assignment_uuid = kwargs.get("assignment_uuid", None)
@@ -118,17 +144,54 @@ class OrchestrationAPIInterface(QObject):
         logs = kwargs.get("logs", None)
         result, metadata = self.__etcdClient.get("/serrano/orchestrator/kernels/kernel/%s" % request_uuid)
         if result:
-            data = json.loads(result.decode("utf-8"))
+            data = entityCodec.decode(result)
             if assignment_uuid:
                 data["assignment_uuid"] = assignment_uuid
             if status:
                 data["status"] = status
-            if logs:
-                for l_evt in logs:
-                    data["logs"].append(l_evt)
             data["updated_by"] = "Orchestration.Manager"
             data["updated_at"] = int(time.time())
-            self.__etcdClient.put("/serrano/orchestrator/kernels/kernel/%s" % request_uuid, json.dumps(data))
+            self.__put_entity("/serrano/orchestrator/kernels/kernel/%s" % request_uuid,
+                              "FaaS", request_uuid, data, logs or [])
+
+    def __entity_ops(self, key, kind, entity_uuid, data, log_evts):
+        # Log events are appended as separate keys next to the entity document, embedded logs of documents written
+        # before the log segments were introduced are moved out on their next write
+        entityLogs.migrate(self.__etcdClient, kind, entity_uuid, data, self.__max_txn_ops)
+        return entityChunks.put_ops(self.__etcdClient, key, data) + \
+            entityLogs.put_ops(self.__etcdClient, kind, entity_uuid, log_evts)
+
+    def __put_entity(self, key, kind, entity_uuid, data, log_evts, metadata=None):
+        # Chunked entities are written only if their key is still at the revision of metadata, see
+        # entityChunks.compare. Returns False otherwise, the chunks written for the entity are removed then.
+        ops = self.__entity_ops(key, kind, entity_uuid, data, log_evts)
+        try:
+            succeeded, responses = self.__etcdClient.transaction(
+                compare=entityChunks.compare(self.__etcdClient, key, metadata), success=ops, failure=[])
+        except Exception:
+            entityChunks.discard(self.__etcdClient, ops)
+            raise
+        if not succeeded:
+            entityChunks.discard(self.__etcdClient, ops)
+        return succeeded
+
+    def __put_bundle(self, bundle):
+        key = "/serrano/orchestrator/bundles/bundle/%s" % bundle.uuid
+        for attempt in range(MAX_UPDATE_ATTEMPTS):
+            result, metadata = self.__etcdClient.get(key)
+            if self.__put_entity(key, "Bundle", bundle.uuid, dict(bundle.to_dict()), [], metadata):
+                return
+        logger.error("Unable to write '%s' after %s attempts" % (key, MAX_UPDATE_ATTEMPTS))
+
+    def __put_assignment(self, assignment):
+        # The Assignment and its assignment_uuid -> cluster_uuid index key are written atomically, so that the
+        # Orchestrator API can always resolve an Assignment with a single point lookup
+        ops = self.__entity_ops("/serrano/orchestrator/assignments/%s/assignment/%s" %
+                                (assignment.cluster_uuid, assignment.uuid),
+                                "Assignment", assignment.uuid, dict(assignment.to_dict()), [])
+        ops.append(self.__etcdClient.transactions.put("/serrano/orchestrator/index/assignments/%s" % assignment.uuid,
+                                                      assignment.cluster_uuid))
+        self.__etcdClient.transaction(compare=[], success=ops, failure=[])
 
     def handle_orchestrator_manager_cmd(self, cmd):
 
@@ -148,7 +211,7 @@ class OrchestrationAPIInterface(QObject):
 
             # Create Monitoring entity
             self.__etcdClient.put("/serrano/orchestrator/monitoring/%s" % cmd["deployment_uuid"],
-                                  json.dumps(cmd["monitoring"]))
+                                  entityCodec.encode(cmd["monitoring"]))
 
             # Update Deployment entity
             self.update_deployment(cmd["deployment_uuid"],
@@ -160,16 +223,13 @@ class OrchestrationAPIInterface(QObject):
             # Create Bundle entities
             for bundle in cmd["decision"]["bundles"]:
                 logger.debug("Create Bundle '%s' in ETCD" % bundle.uuid)
-                self.__etcdClient.put("/serrano/orchestrator/bundles/bundle/%s" % bundle.uuid,
-                                      json.dumps(bundle.to_dict()))
+                self.__put_bundle(bundle)
 
             # Final step create Assignment entities.
             for assignment in cmd["decision"]["assignments"]:
                 logger.debug("Create Assignment '%s' for cluster '%s' in ETCD" % (assignment.uuid,
                                                                                   assignment.cluster_uuid))
-                self.__etcdClient.put("/serrano/orchestrator/assignments/%s/assignment/%s" % (assignment.cluster_uuid,
-                                                                                              assignment.uuid),
-                                      json.dumps(assignment.to_dict()))
+                self.__put_assignment(assignment)
 
         if cmd["kind"] == requestType.SERRANO_FaaS:
 
@@ -189,13 +249,11 @@ class OrchestrationAPIInterface(QObject):
 
             # Create Bundle entity
             logger.debug("Create Bundle '%s' in ETCD" % bundle.uuid)
-            self.__etcdClient.put("/serrano/orchestrator/bundles/bundle/%s" % bundle.uuid, json.dumps(bundle.to_dict()))
+            self.__put_bundle(bundle)
 
             # Final step create Assignment entity. 
             logger.debug("Create Assignment '%s' for cluster '%s' in ETCD" % (assignment.uuid, assignment.cluster_uuid))
-            self.__etcdClient.put("/serrano/orchestrator/assignments/%s/assignment/%s" % (assignment.cluster_uuid,
-                                                                                          assignment.uuid),
-                                  json.dumps(assignment.to_dict()))
+            self.__put_assignment(assignment)
 
     def handle_orchestrator_manager_logs(self, cmd):
 
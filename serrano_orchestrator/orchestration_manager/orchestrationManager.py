@@ -255,18 +255,28 @@ class OrchestrationManager(QObject):
                                               "monitoring": monitoring_entity})
 
     def handle_orchestrator_request(self, request):
-        logger.info("Handle deployment request ...")
-        logger.debug(json.dumps(request))
+        self.handle_orchestrator_batch_request([request])
+
+    def handle_orchestrator_batch_request(self, requests_batch):
+        logger.info("Handle %s deployment request(s) ..." % len(requests_batch))
 
+        # The available clusters are retrieved once for the whole batch
         clusters = self.__get_clusters()
+        # An empty or failed fetch keeps the clusters ROT already knows, the requests that need one are skipped below
+        if len(clusters) != 0:
+            self.__rotInterface.update_available_clusters_info(clusters)
+
+        for request in requests_batch:
+            self.__handle_request(request, clusters)
+
+    def __handle_request(self, request, clusters):
+        logger.debug(json.dumps(request))
 
         if len(clusters) == 0 and request["kind"] != requestType.SERRANO_STORAGE_POLICY:
             print("No available clusters, skip requests ...")
             logger.info("No available clusters, skip requests ...")
             return None
 
-        self.__rotInterface.update_available_clusters_info(clusters)
-
         try:
 
             if request["kind"] == requestType.SERRANO_DEPLOYMENT:
@@ -36,6 +36,7 @@ class OrchestrationManagerInstance(QObject):
 
         self.orchestrationManager = orchestrationManager.OrchestrationManager(self.config)
         self.orchestratorAPIInterface.orchestratorRequest.connect(self.orchestrationManager.handle_orchestrator_request)
+        self.orchestratorAPIInterface.orchestratorBatchRequest.connect(self.orchestrationManager.handle_orchestrator_batch_request)
         self.orchestrationManager.orchestrationManagerUpdate.connect(self.orchestratorAPIInterface.handle_orchestrator_manager_cmd)
         self.orchestrationManager.orchestrationManagerLogInfo.connect(self.orchestratorAPIInterface.handle_orchestrator_manager_logs)
 
@@ -0,0 +1,110 @@
+import json
+import time
+import etcd3.transactions
+
+from serrano_orchestrator.utils import etcdRange
+from serrano_orchestrator.utils import entityCodec
+
+ORCHESTRATOR_PREFIX = "/serrano/orchestrator/"
+CHUNKS_PREFIX = "/serrano/orchestrator/chunks/"
+
+# Entities whose documents can outgrow the etcd request size limit, i.e. the multi-document Deployment descriptions
+# and the expanded Bundle descriptions
+CHUNKED_PREFIXES = ["/serrano/orchestrator/deployments/deployment/", "/serrano/orchestrator/bundles/bundle/"]
+
+_chunk_size = 1048576
+
+
+# Encoded values larger than the chunk size are split across chunk keys:
+#   /serrano/orchestrator/chunks/<entity key>/<write id>/<index>
+# and the entity key holds a manifest naming the write id. Chunks are written before the transaction of the entity,
+# each with its own request, and only become reachable once the manifest is committed. The transaction removes the
+# chunks of every other write id of the key, so it must be guarded by compare(): the chunks it removes then belong
+# either to the manifest it replaces or to concurrent writes whose own guarded transaction is bound to fail. A write
+# whose transaction fails removes its chunks with discard().
+
+def configure(codec_conf):
+    global _chunk_size
+    _chunk_size = codec_conf.get("chunk_size", 1048576)
+
+
+def is_chunkable(key):
+    for prefix in CHUNKED_PREFIXES:
+        if key.startswith(prefix):
+            return True
+    return False
+
+
+def chunk_prefix(key):
+    return "%s%s/" % (CHUNKS_PREFIX, key[len(ORCHESTRATOR_PREFIX):])
+
+
+def put_ops(etcd_client, key, value):
+    data = entityCodec.encode(value)
+    if not is_chunkable(key):
+        return [etcd_client.transactions.put(key, data)]
+
+    prefix = chunk_prefix(key)
+    if len(data) <= _chunk_size:
+        return [etcd_client.transactions.put(key, data),
+                etcd_client.transactions.delete(prefix, range_end=etcdRange.prefix_end(prefix))]
+
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    write_id = "%019d" % time.time_ns()
+    chunks = [data[i:i + _chunk_size] for i in range(0, len(data), _chunk_size)]
+    for index, chunk in enumerate(chunks):
+        etcd_client.put("%s%s/%06d" % (prefix, write_id, index), chunk)
+    manifest = entityCodec.MARKER + entityCodec.CHUNKED + \
+        json.dumps({"write_id": write_id, "chunks": len(chunks), "size": len(data)}).encode("utf-8")
+    return [etcd_client.transactions.put(key, manifest),
+            etcd_client.transactions.delete(prefix, range_end="%s%s/" % (prefix, write_id)),
+            etcd_client.transactions.delete(etcdRange.prefix_end("%s%s/" % (prefix, write_id)),
+                                            range_end=etcdRange.prefix_end(prefix))]
+
+
+def compare(etcd_client, key, metadata):
+    # Guards the transaction of put_ops with the revision the key was read at, metadata being None when the key did
+    # not exist. Keys that are never chunked need no guard.
+    if not is_chunkable(key):
+        return []
+    return [etcd_client.transactions.mod(key) == (metadata.mod_revision if metadata is not None else 0)]
+
+
+def discard(etcd_client, ops):
+    # Removes the chunks written by put_ops for a transaction that failed
+    for op in ops:
+        if isinstance(op, etcd3.transactions.Put) and is_chunkable(op.key) and entityCodec.is_chunked(op.value):
+            prefix = "%s%s/" % (chunk_prefix(op.key), json.loads(op.value[2:])["write_id"])
+            etcd_client.transaction(compare=[], failure=[], success=[
+                etcd_client.transactions.delete(prefix, range_end=etcdRange.prefix_end(prefix))])
+
+
+def delete_ops(etcd_client, key):
+    if not is_chunkable(key):
+        return []
+    prefix = chunk_prefix(key)
+    return [etcd_client.transactions.delete(prefix, range_end=etcdRange.prefix_end(prefix))]
+
+
+def resolve(etcd_client, key, data, revision=None):
+    # Returns the encoded value of a key, reassembled from its chunks if the key holds a manifest. Chunks are read at
+    # the revision of the manifest when it is known.
+    if data is None or not entityCodec.is_chunked(data):
+        return data
+    manifest = json.loads(data[2:])
+    prefix = "%s%s/" % (chunk_prefix(key), manifest["write_id"])
+    chunks = [kv.value for kv in etcdRange.iter_range(etcd_client, prefix, etcdRange.prefix_end(prefix),
+                                                      revision=revision, page_size=8)]
+    data = b"".join(chunks)
+    if len(chunks) != manifest["chunks"] or len(data) != manifest["size"]:
+        raise ValueError("Incomplete chunks for key '%s'" % key)
+    return data
+
+
+def get(etcd_client, key):
+    # Decoded value of a key and its metadata, (None, None) when it does not exist
+    result, metadata = etcd_client.get(key)
+    if result is None:
+        return None, None
+    return entityCodec.decode(resolve(etcd_client, key, result, metadata.mod_revision)), metadata
@@ -0,0 +1,120 @@
+import json
+import zlib
+import logging
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger("SERRANO.Orchestrator.EntityCodec")
+
+# Encoded values start with a marker byte followed by a format byte. Values without the marker are plain JSON, as
+# written before the codec was introduced, and JSON text never starts with the marker.
+MARKER = b"\x00"
+FORMATS = {"orjson": b"o", "msgpack": b"m"}
+# Values above the compression threshold wrap the encoded value of any format
+COMPRESSIONS = {"zlib": b"z", "zstd": b"s"}
+# Manifest of a value stored across chunk keys, see entityChunks
+CHUNKED = b"c"
+
+_write_format = "json"
+_compression = "none"
+_compression_threshold = 65536
+_compression_level = None
+
+
+def available_formats():
+    formats = ["json"]
+    if orjson is not None:
+        formats.append("orjson")
+    if msgpack is not None:
+        formats.append("msgpack")
+    return formats
+
+
+def available_compressions():
+    compressions = ["none", "zlib"]
+    if zstandard is not None:
+        compressions.append("zstd")
+    return compressions
+
+
+def configure(codec_conf):
+    # Selects the format and compression new values are written with, values are always read in any of them
+    global _write_format, _compression, _compression_threshold, _compression_level
+    requested = codec_conf.get("format", "json")
+    if requested not in available_formats():
+        logger.warning("Codec format '%s' is not available, use 'json'" % requested)
+        requested = "json"
+    _write_format = requested
+
+    requested = codec_conf.get("compression", "none")
+    if requested not in available_compressions():
+        logger.warning("Codec compression '%s' is not available, use 'zlib'" % requested)
+        requested = "zlib"
+    _compression = requested
+    _compression_threshold = codec_conf.get("compression_threshold", 65536)
+    _compression_level = codec_conf.get("compression_level", None)
+
+
+def _compress(data):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    if _compression == "zstd":
+        level = _compression_level if _compression_level is not None else 3
+        return MARKER + COMPRESSIONS["zstd"] + zstandard.ZstdCompressor(level=level).compress(data)
+    level = _compression_level if _compression_level is not None else zlib.Z_DEFAULT_COMPRESSION
+    return MARKER + COMPRESSIONS["zlib"] + zlib.compress(data, level)
+
+
+def encode(value, fmt=None):
+    fmt = fmt or _write_format
+    if fmt == "orjson":
+        data = MARKER + FORMATS["orjson"] + orjson.dumps(value)
+    elif fmt == "msgpack":
+        data = MARKER + FORMATS["msgpack"] + msgpack.packb(value, use_bin_type=True)
+    else:
+        data = json.dumps(value)
+    if _compression == "none" or len(data) < _compression_threshold:
+        return data
+    return _compress(data)
+
+
+def is_chunked(data):
+    return data[:2] == MARKER + CHUNKED
+
+
+def decode(data):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    if data[:1] != MARKER:
+        return json.loads(data)
+    fmt = data[1:2]
+    if fmt == COMPRESSIONS["zlib"]:
+        return decode(zlib.decompress(data[2:]))
+    if fmt == COMPRESSIONS["zstd"]:
+        if zstandard is None:
+            raise ValueError("Value is compressed with zstd, which is not installed")
+        return decode(zstandard.ZstdDecompressor().decompress(data[2:]))
+    if fmt == CHUNKED:
+        raise ValueError("Value is stored in chunks, which must be resolved first")
+    if fmt == FORMATS["orjson"]:
+        if orjson is None:
+            return json.loads(data[2:])
+        return orjson.loads(data[2:])
+    if fmt == FORMATS["msgpack"]:
+        if msgpack is None:
+            raise ValueError("Value is encoded with msgpack, which is not installed")
+        return msgpack.unpackb(data[2:], raw=False)
+    raise ValueError("Unknown codec format '%s'" % fmt)
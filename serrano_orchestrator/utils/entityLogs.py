@@ -0,0 +1,111 @@
+import time
+import random
+
+from serrano_orchestrator.utils import etcdRange
+from serrano_orchestrator.utils import etcdBatch
+from serrano_orchestrator.utils import entityCodec
+
+LOGS_PREFIX = "/serrano/orchestrator/logs/"
+
+KIND_SEGMENTS = {"Deployment": "deployment",
+                 "Assignment": "assignment",
+                 "Bundle": "bundle",
+                 "FaaS": "kernel",
+                 "Kernel": "kernel",
+                 "StoragePolicy": "storage_policy"}
+
+# Kind of the entities whose logs are stored under each segment, used to resolve the segments of the logs API
+SEGMENT_KINDS = {"deployment": "Deployment",
+                 "assignment": "Assignment",
+                 "bundle": "Bundle",
+                 "kernel": "Kernel",
+                 "storage_policy": "StoragePolicy"}
+
+
+# Log events are stored as append-only keys:
+#   /serrano/orchestrator/logs/<kind>/<entity_uuid>/<timestamp>/<sequence>
+# Timestamps are zero padded, so the keys of an entity are ordered in time and a time range maps to a key range.
+
+def kind_prefix(kind):
+    return "%s%s/" % (LOGS_PREFIX, KIND_SEGMENTS.get(kind, kind))
+
+
+def entity_prefix(kind, entity_uuid):
+    return "%s%s/" % (kind_prefix(kind), entity_uuid)
+
+
+def log_key(kind, entity_uuid, timestamp):
+    return "%s%012d/%019d%04x" % (entity_prefix(kind, entity_uuid), int(timestamp), time.time_ns(),
+                                  random.getrandbits(16))
+
+
+def legacy_log_key(kind, entity_uuid, timestamp, index):
+    # Events moved out of a legacy document get keys derived from their position in it, so that moving them again
+    # after a failed write overwrites them instead of duplicating them. They sort before the events appended in the
+    # same second.
+    return "%s%012d/%023d" % (entity_prefix(kind, entity_uuid), int(timestamp), index)
+
+
+def parse_key(key):
+    # Returns the (kind segment, entity uuid) of a log key
+    elements = key[len(LOGS_PREFIX):].split("/")
+    return elements[0], elements[1]
+
+
+def put_ops(etcd_client, kind, entity_uuid, events):
+    return [etcd_client.transactions.put(log_key(kind, entity_uuid, evt["timestamp"]),
+                                         entityCodec.encode({"timestamp": evt["timestamp"], "event": evt["event"]}))
+            for evt in events]
+
+
+def migrate(etcd_client, kind, entity_uuid, entity, max_txn_ops):
+    # Documents written before the log segments were introduced embed their logs. They are removed from the document
+    # and written as log keys in their own transactions, before the document itself is written without them, so that
+    # the write of the document stays within the etcd operations limit however many events it embeds.
+    events = entity.pop("logs", [])
+    ops = [[etcd_client.transactions.put(legacy_log_key(kind, entity_uuid, evt["timestamp"], index),
+                                         entityCodec.encode({"timestamp": evt["timestamp"], "event": evt["event"]}))]
+           for index, evt in enumerate(events)]
+    etcdBatch.commit(etcd_client, ops, max_txn_ops)
+
+
+def delete_ops(etcd_client, kind, entity_uuid):
+    prefix = entity_prefix(kind, entity_uuid)
+    return [etcd_client.transactions.delete(prefix, range_end=etcdRange.prefix_end(prefix))]
+
+
+def read(etcd_client, kind, entity_uuid, **kwargs):
+    start = kwargs.get("start", None)
+    end = kwargs.get("end", None)
+    limit = kwargs.get("limit", None)
+    cursor = kwargs.get("cursor", None)
+
+    prefix = entity_prefix(kind, entity_uuid)
+
+    if cursor:
+        if not cursor.startswith(prefix):
+            raise ValueError("Invalid cursor '%s'" % cursor)
+        range_start = cursor + "\0"
+    elif start is not None:
+        range_start = "%s%012d" % (prefix, int(start))
+    else:
+        range_start = prefix
+
+    if end is not None:
+        range_end = "%s%012d" % (prefix, int(end) + 1)
+    else:
+        range_end = etcdRange.prefix_end(prefix)
+
+    response = etcdRange.get_range(etcd_client, range_start, range_end, limit=limit)
+
+    logs = [entityCodec.decode(kv.value) for kv in response.kvs]
+    next_cursor = response.kvs[-1].key.decode("utf-8") if response.more and len(response.kvs) else None
+
+    return logs, next_cursor
+
+
+def read_kind(etcd_client, kind):
+    # All the log events of an entity kind in one range request, as (entity uuid, event) tuples
+    prefix = kind_prefix(kind)
+    return [(parse_key(result[1].key.decode("utf-8"))[1], entityCodec.decode(result[0]))
+            for result in etcd_client.get_prefix(prefix)]
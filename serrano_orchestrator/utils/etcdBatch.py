@@ -0,0 +1,23 @@
+
+# etcd rejects transactions with more operations than its --max-txn-ops (128 by default). Operation lists that can
+# outgrow it are committed in consecutive transactions, which are not atomic together: callers order the operations
+# so that an interrupted commit leaves a state that the same call can complete when it is retried. The operations of
+# an entity (e.g. its key and its chunks) are passed as a group and share a transaction, unless the group alone
+# exceeds the limit.
+
+def batches(groups, max_ops):
+    result = [[]]
+    for group in groups:
+        if len(result[-1]) + len(group) > max_ops and result[-1]:
+            result.append([])
+        while len(group) > max_ops:
+            result[-1] += group[:max_ops]
+            result.append([])
+            group = group[max_ops:]
+        result[-1] += group
+    return [batch for batch in result if batch]
+
+
+def commit(etcd_client, groups, max_ops):
+    for batch in batches(groups, max_ops):
+        etcd_client.transaction(compare=[], success=batch, failure=[])
@@ -0,0 +1,36 @@
+import etcd3.utils
+import etcd3.etcdrpc as etcdrpc
+
+
+def prefix_end(prefix):
+    return etcd3.utils.increment_last_byte(etcd3.utils.to_bytes(prefix))
+
+
+def get_range(etcd_client, range_start, range_end, **kwargs):
+    # etcd3 0.12 accepts but does not forward the limit and revision arguments, so the RangeRequest is built here
+    range_request = etcdrpc.RangeRequest()
+    range_request.key = etcd3.utils.to_bytes(range_start)
+    range_request.range_end = etcd3.utils.to_bytes(range_end)
+    range_request.limit = kwargs.get("limit", None) or 0
+    range_request.revision = kwargs.get("revision", None) or 0
+    range_request.keys_only = kwargs.get("keys_only", False)
+
+    return etcd_client.kvstub.Range(range_request,
+                                    etcd_client.timeout,
+                                    credentials=etcd_client.call_credentials,
+                                    metadata=etcd_client.metadata)
+
+
+def iter_range(etcd_client, range_start, range_end, **kwargs):
+    # Yields the key-values of a range page by page, all the pages are read at the revision of the first one
+    page_size = kwargs.get("page_size", 1000)
+    revision = kwargs.get("revision", None)
+    while True:
+        response = get_range(etcd_client, range_start, range_end, limit=page_size, revision=revision,
+                             keys_only=kwargs.get("keys_only", False))
+        revision = response.header.revision if revision is None else revision
+        for kv in response.kvs:
+            yield kv
+        if not response.more or not len(response.kvs):
+            return
+        range_start = response.kvs[-1].key + b"\0"
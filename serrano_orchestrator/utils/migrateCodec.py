@@ -0,0 +1,77 @@
+import sys
+import etcd3
+import argparse
+
+from serrano_orchestrator.utils import etcdRange
+from serrano_orchestrator.utils import entityCodec
+from serrano_orchestrator.utils import entityChunks
+
+# Re-encodes the entity values of the Orchestrator keyspace with the given codec format, e.g.:
+#   python -m serrano_orchestrator.utils.migrateCodec --host 127.0.0.1 --format orjson --compression zlib
+# Values that are not JSON documents (index keys, heartbeats) are left as they are. Each value is written only if it
+# was not modified since it was read, so the migration can run while the Orchestrator is serving requests.
+
+
+def migrate(etcd_client, prefix, fmt, dry_run):
+    migrated = 0
+    skipped = 0
+    for kv in etcdRange.iter_range(etcd_client, prefix, etcdRange.prefix_end(prefix)):
+        key = kv.key.decode("utf-8")
+        if key.startswith(entityChunks.CHUNKS_PREFIX):
+            continue
+        try:
+            value = entityCodec.decode(entityChunks.resolve(etcd_client, key, kv.value, kv.mod_revision))
+        except ValueError:
+            skipped += 1
+            continue
+        if not isinstance(value, (dict, list)):
+            skipped += 1
+            continue
+        encoded = entityCodec.encode(value, fmt)
+        if isinstance(encoded, str):
+            encoded = encoded.encode("utf-8")
+        if encoded == kv.value:
+            skipped += 1
+            continue
+        if not dry_run:
+            ops = entityChunks.put_ops(etcd_client, key, value)
+            succeeded, responses = etcd_client.transaction(
+                compare=[etcd_client.transactions.mod(key) == kv.mod_revision],
+                success=ops,
+                failure=[])
+            if not succeeded:
+                entityChunks.discard(etcd_client, ops)
+                print("Key '%s' was modified during the migration, skipped" % key)
+                skipped += 1
+                continue
+        migrated += 1
+    return migrated, skipped
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Re-encode Orchestrator etcd values with a codec format")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2379)
+    parser.add_argument("--prefix", default="/serrano/orchestrator/")
+    parser.add_argument("--format", default="orjson", choices=["json", "orjson", "msgpack"])
+    parser.add_argument("--compression", default="none", choices=["none", "zlib", "zstd"])
+    parser.add_argument("--compression-threshold", type=int, default=65536)
+    parser.add_argument("--chunk-size", type=int, default=1048576)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    if args.format not in entityCodec.available_formats():
+        print("Codec format '%s' is not available, install it first" % args.format)
+        sys.exit(1)
+    if args.compression not in entityCodec.available_compressions():
+        print("Codec compression '%s' is not available, install it first" % args.compression)
+        sys.exit(1)
+    codec_conf = {"format": args.format, "compression": args.compression,
+                  "compression_threshold": args.compression_threshold, "chunk_size": args.chunk_size}
+    entityCodec.configure(codec_conf)
+    entityChunks.configure(codec_conf)
+
+    client = etcd3.client(host=args.host, port=args.port)
+    migrated, skipped = migrate(client, args.prefix, args.format, args.dry_run)
+    print("%s value(s) %s, %s skipped" % (migrated, "to migrate" if args.dry_run else "migrated", skipped))
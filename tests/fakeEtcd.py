@@ -0,0 +1,224 @@
+import os
+import sys
+import threading
+
+import etcd3.utils
+import etcd3.events
+import etcd3.leases
+import etcd3.etcdrpc as etcdrpc
+import etcd3.transactions as transactions
+from etcd3.client import Transactions, KVMetadata
+from etcd3.etcdrpc import kv_pb2
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The API and manager modules import their siblings with flat imports, as they do when they are started
+for path in [ROOT, os.path.join(ROOT, "serrano_orchestrator", "orchestration_api")]:
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+class TooManyOperations(Exception):
+    pass
+
+
+def _to_bytes(value):
+    return value.encode("utf-8") if isinstance(value, str) else value
+
+
+class FakeKVStub:
+
+    def __init__(self, etcd):
+        self.__etcd = etcd
+
+    def Range(self, request, timeout=None, credentials=None, metadata=None):
+        return self.__etcd.range(request)
+
+
+class FakeWatchResponse:
+
+    def __init__(self, events, revision):
+        self.events = events
+        self.header = etcdrpc.ResponseHeader(revision=revision)
+
+
+class FakeEtcd:
+    # In-memory stand-in for the etcd3 client, with the operations limit of etcd transactions. Watch events are
+    # delivered synchronously after every write unless deliver_watch is False, in which case flush() delivers them.
+    # Leases never expire on their own, revoke_lease() stands for their expiry.
+
+    def __init__(self, max_txn_ops=128):
+
+        self.max_txn_ops = max_txn_ops
+        self.transactions = Transactions()
+        self.kvstub = FakeKVStub(self)
+        self.timeout = None
+        self.call_credentials = None
+        self.metadata = None
+
+        self.deliver_watch = True
+        self.transaction_sizes = []
+        self.__lock = threading.RLock()
+        self.__kvs = {}
+        self.__revision = 1
+        self.__leases = 0
+        self.__watches = {}
+        self.__pending_events = []
+
+    @property
+    def revision(self):
+        return self.__revision
+
+    def keys(self, prefix=""):
+        with self.__lock:
+            return sorted(key.decode("utf-8") for key in self.__kvs if key.startswith(_to_bytes(prefix)))
+
+    def __header(self):
+        return etcdrpc.ResponseHeader(revision=self.__revision)
+
+    def __range_keys(self, key, range_end):
+        key = _to_bytes(key)
+        if not range_end:
+            return [key] if key in self.__kvs else []
+        range_end = _to_bytes(range_end)
+        return sorted(k for k in self.__kvs if key <= k < range_end)
+
+    def __put(self, key, value, revision, events, lease=None):
+        key = _to_bytes(key)
+        previous = self.__kvs.get(key, None)
+        kv = kv_pb2.KeyValue(key=key, value=_to_bytes(value), mod_revision=revision,
+                             create_revision=previous.create_revision if previous else revision,
+                             version=previous.version + 1 if previous else 1, lease=etcd3.utils.lease_to_id(lease))
+        self.__kvs[key] = kv
+        events.append(kv_pb2.Event(type=kv_pb2.Event.PUT, kv=kv))
+
+    def __delete(self, key, range_end, revision, events):
+        keys = self.__range_keys(key, range_end)
+        for k in keys:
+            del self.__kvs[k]
+            events.append(kv_pb2.Event(type=kv_pb2.Event.DELETE, kv=kv_pb2.KeyValue(key=k, mod_revision=revision)))
+        return len(keys)
+
+    def __compare(self, compare):
+        kv = self.__kvs.get(_to_bytes(compare.key), None)
+        if isinstance(compare, transactions.Mod):
+            actual = kv.mod_revision if kv else 0
+        elif isinstance(compare, transactions.Version):
+            actual = kv.version if kv else 0
+        elif isinstance(compare, transactions.Create):
+            actual = kv.create_revision if kv else 0
+        else:
+            actual = kv.value if kv else None
+            expected = _to_bytes(compare.value)
+            return actual == expected if compare.op == etcdrpc.Compare.EQUAL else actual != expected
+        return {etcdrpc.Compare.EQUAL: actual == compare.value,
+                etcdrpc.Compare.NOT_EQUAL: actual != compare.value,
+                etcdrpc.Compare.LESS: actual < compare.value,
+                etcdrpc.Compare.GREATER: actual > compare.value}[compare.op]
+
+    def __notify(self, events):
+        if not events:
+            return
+        with self.__lock:
+            self.__pending_events.append((events, self.__revision))
+        if self.deliver_watch:
+            self.flush()
+
+    def flush(self):
+        with self.__lock:
+            pending, self.__pending_events = self.__pending_events, []
+            watches = list(self.__watches.values())
+        for events, revision in pending:
+            for prefix, callback in watches:
+                matching = [etcd3.events.new_event(event) for event in events if event.kv.key.startswith(prefix)]
+                if matching:
+                    callback(FakeWatchResponse(matching, revision))
+
+    def get(self, key, **kwargs):
+        with self.__lock:
+            kv = self.__kvs.get(_to_bytes(key), None)
+            if kv is None:
+                return None, None
+            return kv.value, KVMetadata(kv, self.__header())
+
+    def get_prefix(self, key_prefix, **kwargs):
+        with self.__lock:
+            key_prefix = _to_bytes(key_prefix)
+            return [(self.__kvs[k].value, KVMetadata(self.__kvs[k], self.__header()))
+                    for k in sorted(self.__kvs) if k.startswith(key_prefix)]
+
+    def range(self, request):
+        with self.__lock:
+            keys = self.__range_keys(request.key, request.range_end)
+            more = bool(request.limit) and len(keys) > request.limit
+            if request.limit:
+                keys = keys[:request.limit]
+            kvs = [kv_pb2.KeyValue(key=k, mod_revision=self.__kvs[k].mod_revision) if request.keys_only
+                   else self.__kvs[k] for k in keys]
+            return etcdrpc.RangeResponse(header=self.__header(), kvs=kvs, more=more, count=len(kvs))
+
+    def put(self, key, value, lease=None, **kwargs):
+        events = []
+        with self.__lock:
+            self.__revision += 1
+            self.__put(key, value, self.__revision, events, lease)
+        self.__notify(events)
+
+    def delete(self, key, **kwargs):
+        events = []
+        with self.__lock:
+            self.__revision += 1
+            deleted = self.__delete(key, None, self.__revision, events)
+            if not deleted:
+                self.__revision -= 1
+        self.__notify(events)
+        return deleted > 0
+
+    def transaction(self, compare, success=None, failure=None):
+        success = success or []
+        failure = failure or []
+        self.transaction_sizes.append(len(success))
+        if max(len(success), len(failure)) > self.max_txn_ops:
+            raise TooManyOperations("too many operations in txn request")
+        events = []
+        with self.__lock:
+            succeeded = all([self.__compare(c) for c in compare])
+            revision = self.__revision + 1
+            responses = []
+            for op in success if succeeded else failure:
+                if isinstance(op, transactions.Put):
+                    self.__put(op.key, op.value, revision, events, op.lease)
+                    responses.append(etcdrpc.ResponseOp(response_put=etcdrpc.PutResponse()))
+                elif isinstance(op, transactions.Delete):
+                    deleted = self.__delete(op.key, op.range_end, revision, events)
+                    responses.append(etcdrpc.ResponseOp(
+                        response_delete_range=etcdrpc.DeleteRangeResponse(deleted=deleted)))
+            if events:
+                self.__revision = revision
+        self.__notify(events)
+        return succeeded, responses
+
+    def lease(self, ttl, lease_id=None):
+        with self.__lock:
+            self.__leases += 1
+            return etcd3.leases.Lease(lease_id=self.__leases, ttl=ttl, etcd_client=self)
+
+    def revoke_lease(self, lease_id):
+        events = []
+        with self.__lock:
+            keys = [k for k, kv in self.__kvs.items() if kv.lease == lease_id]
+            if keys:
+                self.__revision += 1
+            for k in keys:
+                self.__delete(k, None, self.__revision, events)
+        self.__notify(events)
+
+    def add_watch_prefix_callback(self, key_prefix, callback, **kwargs):
+        with self.__lock:
+            watch_id = len(self.__watches) + 1
+            self.__watches[watch_id] = (_to_bytes(key_prefix), callback)
+            return watch_id
+
+    def cancel_watch(self, watch_id):
+        with self.__lock:
+            self.__watches.pop(watch_id, None)
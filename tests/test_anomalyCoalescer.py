@@ -0,0 +1,69 @@
+import unittest
+from unittest import mock
+
+import fakeEtcd
+
+import anomalyCoalescer
+
+
+def placement(bundle_uuid):
+    return {"deployment_uuid": "d1", "assignment_uuid": "a1", "bundle_uuid": bundle_uuid}
+
+
+class AnomalyCoalescerTest(unittest.TestCase):
+    # Two coalescers on the same etcd stand for two API worker processes
+
+    def setUp(self):
+        self.etcd = fakeEtcd.FakeEtcd()
+        self.trigger = mock.Mock(return_value=True)
+        conf = {"coalescing_window": 60, "redeployment_cooldown": 300}
+        self.first = anomalyCoalescer.AnomalyCoalescer(self.etcd, self.trigger, conf)
+        self.second = anomalyCoalescer.AnomalyCoalescer(self.etcd, self.trigger, conf)
+
+    def tearDown(self):
+        self.first.close()
+        self.second.close()
+
+    @staticmethod
+    def flush(coalescer):
+        coalescer._AnomalyCoalescer__flush("a1")
+
+    def test_anomalies_of_both_processes_trigger_one_redeployment(self):
+        self.first.submit([placement("b1")], ["node1"])
+        self.second.submit([placement("b2")], ["node2"])
+        self.assertEqual(self.etcd.keys(anomalyCoalescer.PENDING_PREFIX), [anomalyCoalescer.PENDING_PREFIX + "a1"])
+        self.assertEqual((self.first.stats()["pending"], self.second.stats()["pending"]), (1, 0))
+
+        self.flush(self.first)
+        self.flush(self.second)
+
+        self.trigger.assert_called_once_with([placement("b1"), placement("b2")], ["node1", "node2"])
+        self.assertEqual(self.etcd.keys(anomalyCoalescer.PENDING_PREFIX), [])
+
+        # Both processes see the cooldown
+        self.first.submit([placement("b1")], ["node1"])
+        self.second.submit([placement("b1")], ["node1"])
+        self.assertEqual(self.first.stats()["suppressed"] + self.second.stats()["suppressed"], 2)
+        self.assertEqual(self.etcd.keys(anomalyCoalescer.PENDING_PREFIX), [])
+
+    def test_cooldown_expires_with_its_lease(self):
+        self.first.submit([placement("b1")], ["node1"])
+        self.flush(self.first)
+        value, metadata = self.etcd.get(anomalyCoalescer.COOLDOWN_PREFIX + "d1")
+        self.etcd.revoke_lease(metadata.lease_id)
+
+        self.second.submit([placement("b1")], ["node1"])
+        self.flush(self.second)
+        self.assertEqual(self.trigger.call_count, 2)
+
+    def test_failed_redeployment_does_not_start_the_cooldown(self):
+        self.trigger.return_value = False
+        self.first.submit([placement("b1")], ["node1"])
+        self.flush(self.first)
+
+        self.assertEqual(self.etcd.keys(anomalyCoalescer.ANOMALIES_PREFIX), [])
+        self.assertEqual(self.first.stats()["redeployments"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
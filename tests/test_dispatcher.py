@@ -0,0 +1,227 @@
+import unittest
+from unittest import mock
+
+import fakeEtcd
+
+from serrano_orchestrator.utils import entityLogs
+from serrano_orchestrator.utils import entityCodec
+from serrano_orchestrator.utils import entityChunks
+
+import dispatcher
+
+
+class DispatcherTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.etcd = fakeEtcd.FakeEtcd(max_txn_ops=128)
+        with mock.patch("etcd3.client", return_value=self.etcd):
+            self.dispatcher = dispatcher.Dispatcher("127.0.0.1", 2379, "http://127.0.0.1", {}, {}, {}, {}, {}, {},
+                                                    max_txn_ops=self.etcd.max_txn_ops)
+
+    def tearDown(self):
+        self.dispatcher.close()
+
+    def put(self, key, value):
+        self.etcd.put(key, entityCodec.encode(value))
+
+
+class DeleteDeploymentTest(DispatcherTestCase):
+
+    def test_delete_deployment_tree_larger_than_transaction_limit(self):
+        bundles = ["b%03d" % i for i in range(70)]
+        self.put("/serrano/orchestrator/deployments/deployment/d1",
+                 {"deployment_uuid": "d1", "name": "d1", "assignments": ["a1"], "status": 1, "created_at": 1,
+                  "updated_at": 1})
+        self.put("/serrano/orchestrator/assignments/c1/assignment/a1",
+                 {"uuid": "a1", "cluster_uuid": "c1", "bundles": bundles})
+        self.etcd.put("/serrano/orchestrator/index/assignments/a1", "c1")
+        for b_uuid in bundles:
+            self.put("/serrano/orchestrator/bundles/bundle/%s" % b_uuid,
+                     {"uuid": b_uuid, "status": 1, "description": []})
+            self.put("/serrano/orchestrator/logs/bundle/%s/000000000001/0" % b_uuid,
+                     {"timestamp": 1, "event": "created"})
+        self.put("/serrano/orchestrator/monitoring/d1", {"clusters": ["c1"]})
+        self.assertGreater(len(self.etcd.keys()), 128)
+
+        self.assertTrue(self.dispatcher.delete_deployment("d1"))
+
+        self.assertEqual(self.etcd.keys(), [])
+        self.assertGreater(len(self.etcd.transaction_sizes), 1)
+        self.assertLessEqual(max(self.etcd.transaction_sizes), 128)
+        self.assertEqual(self.dispatcher.get_deployments(deployment_uuid="d1"), [])
+
+    def test_delete_deployment_keeps_logs_for_redeployment(self):
+        self.put("/serrano/orchestrator/deployments/deployment/d1",
+                 {"deployment_uuid": "d1", "name": "d1", "assignments": [], "status": 1, "created_at": 1,
+                  "updated_at": 1})
+        self.put("/serrano/orchestrator/logs/deployment/d1/000000000001/0", {"timestamp": 1, "event": "created"})
+
+        self.assertTrue(self.dispatcher.delete_deployment("d1", keep_logs=True))
+
+        self.assertEqual(self.etcd.keys(), ["/serrano/orchestrator/logs/deployment/d1/000000000001/0"])
+
+
+class LegacyLogsTest(DispatcherTestCase):
+
+    def put_legacy_deployment(self, events):
+        self.put("/serrano/orchestrator/deployments/deployment/d1",
+                 {"deployment_uuid": "d1", "name": "d1", "assignments": [], "status": 1, "created_at": 1,
+                  "updated_at": 1, "logs": [{"timestamp": 1000 + i, "event": "event %s" % i} for i in range(events)]})
+
+    def test_update_of_document_with_many_legacy_logs(self):
+        self.put_legacy_deployment(500)
+
+        self.dispatcher.add_entities_logs({"logs": [{"kind": "Deployment", "uuid": "d1", "status": 2,
+                                                     "timestamp": 2000, "event": "pending"}]})
+
+        entity = self.dispatcher.get_deployments(deployment_uuid="d1")[0]
+        self.assertEqual(entity["status"], 2)
+        self.assertNotIn("logs", entity)
+        self.assertLessEqual(max(self.etcd.transaction_sizes), 128)
+        logs = self.dispatcher.get_deployment_logs("d1")["logs"]
+        self.assertEqual([log["event"] for log in logs], ["event %s" % i for i in range(500)] + ["pending"])
+
+    def test_legacy_logs_are_not_duplicated_when_moved_again(self):
+        self.put_legacy_deployment(200)
+        for attempt in range(2):
+            entity, metadata = entityChunks.get(self.etcd, "/serrano/orchestrator/deployments/deployment/d1")
+            entityLogs.migrate(self.etcd, "Deployment", "d1", entity, 128)
+
+        self.assertEqual(len(self.etcd.keys("/serrano/orchestrator/logs/deployment/d1/")), 200)
+
+
+class ChunkedDeploymentTest(DispatcherTestCase):
+
+    def setUp(self):
+        entityChunks.configure({"chunk_size": 64})
+        DispatcherTestCase.setUp(self)
+
+    def tearDown(self):
+        DispatcherTestCase.tearDown(self)
+        entityChunks.configure({})
+
+    def test_updates_keep_only_the_chunks_of_the_current_value(self):
+        self.dispatcher.create_deployment({"deployment_uuid": "d1", "name": "d1", "deployment_description": "a" * 500})
+        for description in ["b" * 500, "c" * 500]:
+            self.dispatcher.update_deployment({"deployment_uuid": "d1", "name": "d1", "status": 1, "created_at": 1,
+                                               "updated_at": 1, "assignments": [],
+                                               "deployment_description": description})
+
+        self.assertEqual(self.dispatcher.get_deployments(deployment_uuid="d1")[0]["deployment_description"],
+                         "c" * 500)
+        write_ids = set(key.split("/")[-2] for key in self.etcd.keys(entityChunks.CHUNKS_PREFIX))
+        self.assertEqual(len(write_ids), 1)
+
+
+class BulkCreateTest(DispatcherTestCase):
+
+    def test_create_more_deployments_than_fit_in_a_transaction(self):
+        deployments = [{"deployment_uuid": "d%03d" % i, "name": "d%03d" % i, "deployment_description": "a"}
+                       for i in range(300)]
+
+        written = self.dispatcher.create_deployments(deployments)
+
+        self.assertEqual(written, ["d%03d" % i for i in range(300)])
+        self.assertEqual(len(self.etcd.keys("/serrano/orchestrator/deployments/deployment/")), 300)
+        self.assertGreater(len(self.etcd.transaction_sizes), 1)
+        self.assertLessEqual(max(self.etcd.transaction_sizes), 128)
+
+    def test_failed_transaction_stops_the_bulk_creation(self):
+        self.put("/serrano/orchestrator/deployments/deployment/d100",
+                 {"deployment_uuid": "d100", "name": "d100", "assignments": [], "status": 1, "created_at": 1,
+                  "updated_at": 1})
+        deployments = [{"deployment_uuid": "d%03d" % i, "name": "d%03d" % i, "deployment_description": "a"}
+                       for i in range(300)]
+
+        written = self.dispatcher.create_deployments(deployments)
+
+        # The transaction of d100 fails, the entities of the earlier ones stay written
+        self.assertEqual(written, ["d%03d" % i for i in range(len(written))])
+        self.assertLess(len(written), 100)
+        self.assertEqual(len(self.etcd.keys("/serrano/orchestrator/deployments/deployment/")), len(written) + 1)
+
+
+class EtagTest(DispatcherTestCase):
+
+    def test_missing_entities_have_no_etag(self):
+        self.assertIsNone(self.dispatcher.get_etag("Deployment", "d1"))
+        self.assertIsNone(self.dispatcher.get_etag("DeploymentLogs", "d1"))
+        self.assertIsNone(self.dispatcher.get_etag("Kernel", "k1"))
+
+    def test_deployment_logs_etag_follows_new_events(self):
+        self.put("/serrano/orchestrator/deployments/deployment/d1",
+                 {"deployment_uuid": "d1", "name": "d1", "assignments": [], "status": 1, "created_at": 1,
+                  "updated_at": 1})
+        self.put(entityLogs.log_key("Deployment", "d1", 1), {"timestamp": 1, "event": "created"})
+        etag = self.dispatcher.get_etag("DeploymentLogs", "d1")
+        self.assertEqual(self.dispatcher.get_etag("DeploymentLogs", "d1"), etag)
+
+        self.put(entityLogs.log_key("Deployment", "d1", 2), {"timestamp": 2, "event": "updated"})
+        self.assertNotEqual(self.dispatcher.get_etag("DeploymentLogs", "d1"), etag)
+        self.assertEqual(self.dispatcher.get_etag("Deployment", "d1").count("-"), 0)
+
+
+class MonitoringDataTest(DispatcherTestCase):
+
+    def report(self, assignment_uuid, k8s_deployment_uuid, worker_nodes):
+        k8s_params = {"assignment_uuid": assignment_uuid, "bundle_uuid": "b-%s" % assignment_uuid,
+                      "k8s_deployment_uuid": k8s_deployment_uuid}
+        if worker_nodes is not None:
+            k8s_params["k8s_worker_nodes"] = worker_nodes
+        return self.dispatcher.put_assignment_monitoring_data({"deployment_uuid": "d1", "cluster_uuid": "c1",
+                                                               "assignment_uuid": assignment_uuid,
+                                                               "k8s_params": [k8s_params]})
+
+    def test_reports_are_merged_per_assignment(self):
+        self.put("/serrano/orchestrator/monitoring/d1", {"clusters": ["c1"]})
+
+        self.assertEqual(self.report("a1", "k1", ["node1"]), {})
+        # A late report of the deployment itself, without the worker nodes, does not remove them
+        self.assertEqual(self.report("a1", "k1", None), {})
+        self.assertEqual(self.report("a2", "k2", ["node2"]), {})
+
+        entity = entityCodec.decode(self.etcd.get("/serrano/orchestrator/monitoring/d1")[0])
+        self.assertEqual(sorted((p["assignment_uuid"], tuple(p["k8s_worker_nodes"])) for p in entity["c1"]),
+                         [("a1", ("node1",)), ("a2", ("node2",))])
+
+    def test_concurrent_write_is_retried(self):
+        self.put("/serrano/orchestrator/monitoring/d1", {"clusters": ["c1"]})
+        transaction = self.etcd.transaction
+
+        def concurrent_transaction(compare, success=None, failure=None):
+            # Another writer reports a2 between the read and the write of the first attempt
+            self.etcd.transaction = transaction
+            self.put("/serrano/orchestrator/monitoring/d1",
+                     {"clusters": ["c1"], "c1": [{"assignment_uuid": "a2", "k8s_worker_nodes": ["node2"]}]})
+            return transaction(compare, success, failure)
+
+        self.etcd.transaction = concurrent_transaction
+        self.assertEqual(self.report("a1", "k1", ["node1"]), {})
+
+        entity = entityCodec.decode(self.etcd.get("/serrano/orchestrator/monitoring/d1")[0])
+        self.assertEqual(sorted(p["assignment_uuid"] for p in entity["c1"]), ["a1", "a2"])
+
+
+class NotificationEventsTest(DispatcherTestCase):
+
+    def test_malformed_events_do_not_drop_the_batch(self):
+        self.put("/serrano/orchestrator/monitoring/d1",
+                 {"clusters": ["c1"], "c1": [{"assignment_uuid": "a1", "bundle_uuid": "b1",
+                                              "k8s_deployment_name": "k1", "k8s_worker_nodes": ["node1"]}]})
+        anomaly = {"analysis": {"shap_values": {"cpu_node1": 0.9, "cpu_node2": -0.1}}}
+        events = [{"model": "m1"},
+                  {"anomalies": [anomaly]},
+                  {"anomalies": [{"analysis": {}}]},
+                  {"anomalies": [{"analysis": {"shap_values": {"cpu_node1": "high"}}}]}]
+
+        with mock.patch.object(self.dispatcher._Dispatcher__anomalies, "submit") as submit:
+            self.dispatcher.handle_notification_evts(events)
+
+        submit.assert_called_once()
+        placements, worker_nodes = submit.call_args[0]
+        self.assertEqual(worker_nodes, ["node1"])
+        self.assertEqual([p["deployment_uuid"] for p in placements], ["d1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
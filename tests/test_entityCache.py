@@ -0,0 +1,80 @@
+import unittest
+from unittest import mock
+
+import fakeEtcd
+
+from serrano_orchestrator.utils import entityCodec
+
+import entityCache
+
+PREFIX = "/serrano/orchestrator/"
+DEPLOYMENTS = "/serrano/orchestrator/deployments/deployment/"
+
+
+class EntityCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.etcd = fakeEtcd.FakeEtcd()
+        self.cache = entityCache.EntityCache(self.etcd, PREFIX, {}, [PREFIX + "logs/"])
+
+    def put(self, key, value):
+        self.etcd.put(key, entityCodec.encode(value))
+
+    def test_own_write_is_read_before_the_watch_delivers_it(self):
+        self.put(DEPLOYMENTS + "d1", {"name": "d1"})
+        self.assertEqual(self.cache.get(DEPLOYMENTS + "d2"), None)
+
+        self.etcd.deliver_watch = False
+        self.put(DEPLOYMENTS + "d2", {"name": "d2"})
+        self.etcd.delete(DEPLOYMENTS + "d1")
+        self.cache.written([DEPLOYMENTS + "d2", DEPLOYMENTS + "d1"])
+
+        self.assertEqual(self.cache.get(DEPLOYMENTS + "d2"), {"name": "d2"})
+        self.assertEqual(self.cache.get(DEPLOYMENTS + "d1"), None)
+        self.assertEqual([key for key, value in self.cache.get_prefix(DEPLOYMENTS)], [DEPLOYMENTS + "d2"])
+
+        self.etcd.flush()
+        self.assertEqual(self.cache.stats()["written"], 0)
+        misses = self.cache.stats()["misses"]
+        self.assertEqual(self.cache.get(DEPLOYMENTS + "d2"), {"name": "d2"})
+        self.assertEqual(self.cache.stats()["misses"], misses)
+
+    def test_prefix_and_pages_follow_key_order(self):
+        for i in [5, 3, 9, 1, 7]:
+            self.put(DEPLOYMENTS + "d%s" % i, {"i": i})
+        self.put(PREFIX + "deployments/deploymentx", {"i": 0})
+        self.put(PREFIX + "kernels/kernel/k1", {"i": 0})
+        self.etcd.delete(DEPLOYMENTS + "d7")
+
+        self.assertEqual([value["i"] for key, value in self.cache.get_prefix(DEPLOYMENTS)], [1, 3, 5, 9])
+        page, more = self.cache.get_page(DEPLOYMENTS, 2)
+        self.assertEqual(([value["i"] for key, value in page], more), ([1, 3], True))
+        page, more = self.cache.get_page(DEPLOYMENTS, 2, page[-1][0])
+        self.assertEqual(([value["i"] for key, value in page], more), ([5, 9], False))
+
+    def test_listings_are_served_from_the_cache_after_evictions(self):
+        self.cache = entityCache.EntityCache(self.etcd, PREFIX, {"max_entries": 2}, [PREFIX + "logs/"])
+        for i in range(5):
+            self.put(DEPLOYMENTS + "d%s" % i, {"i": i})
+        self.assertGreater(self.cache.stats()["evictions"], 0)
+        self.assertTrue(self.cache.stats()["complete"])
+
+        with mock.patch.object(self.etcd, "get_prefix") as get_prefix, \
+                mock.patch.object(fakeEtcd.FakeKVStub, "Range") as get_range:
+            self.assertEqual([value["i"] for key, value in self.cache.get_prefix(DEPLOYMENTS)], [0, 1, 2, 3, 4])
+            page, more = self.cache.get_page(DEPLOYMENTS, 2, DEPLOYMENTS + "d1")
+            self.assertEqual(([value["i"] for key, value in page], more), ([2, 3], True))
+            get_prefix.assert_not_called()
+            get_range.assert_not_called()
+        self.assertLessEqual(self.cache.stats()["entries"], 2)
+        self.assertEqual(self.cache.stats()["keys"], 5)
+
+        # Keys that are not indexed are known not to exist, evicted ones are read again
+        misses = self.cache.stats()["misses"]
+        self.assertIsNone(self.cache.get(DEPLOYMENTS + "d9"))
+        self.assertEqual(self.cache.get(DEPLOYMENTS + "d0"), {"i": 0})
+        self.assertEqual(self.cache.stats()["misses"], misses + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
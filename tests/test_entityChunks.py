@@ -0,0 +1,73 @@
+import unittest
+
+import fakeEtcd
+
+from serrano_orchestrator.utils import entityChunks
+
+KEY = "/serrano/orchestrator/deployments/deployment/d1"
+
+
+class EntityChunksTest(unittest.TestCase):
+
+    def setUp(self):
+        entityChunks.configure({"chunk_size": 64})
+        self.etcd = fakeEtcd.FakeEtcd()
+
+    def tearDown(self):
+        entityChunks.configure({})
+
+    def write(self, value, metadata):
+        ops = entityChunks.put_ops(self.etcd, KEY, value)
+        succeeded, responses = self.etcd.transaction(compare=entityChunks.compare(self.etcd, KEY, metadata),
+                                                     success=ops, failure=[])
+        if not succeeded:
+            entityChunks.discard(self.etcd, ops)
+        return succeeded
+
+    def write_ids(self):
+        return set(key.split("/")[-2] for key in self.etcd.keys(entityChunks.CHUNKS_PREFIX))
+
+    @staticmethod
+    def document(name):
+        return {"deployment_uuid": "d1", "name": name, "deployment_description": name * 100}
+
+    def test_concurrent_writers_keep_the_chunks_of_the_committed_manifest(self):
+        self.assertTrue(self.write(self.document("a"), None))
+
+        # B reads and writes its chunks, A commits in the meantime
+        value, metadata_b = self.etcd.get(KEY)
+        ops_b = entityChunks.put_ops(self.etcd, KEY, self.document("b"))
+        value, metadata_a = self.etcd.get(KEY)
+        self.assertTrue(self.write(self.document("c"), metadata_a))
+
+        succeeded, responses = self.etcd.transaction(compare=entityChunks.compare(self.etcd, KEY, metadata_b),
+                                                     success=ops_b, failure=[])
+        self.assertFalse(succeeded)
+        entityChunks.discard(self.etcd, ops_b)
+
+        entity, metadata = entityChunks.get(self.etcd, KEY)
+        self.assertEqual(entity, self.document("c"))
+        self.assertEqual(len(self.write_ids()), 1)
+
+    def test_failed_write_leaves_no_chunks(self):
+        self.assertTrue(self.write(self.document("a"), None))
+        value, metadata = self.etcd.get(KEY)
+        self.assertTrue(self.write(self.document("b"), metadata))
+
+        # A write guarded by the revision that was replaced fails
+        self.assertFalse(self.write(self.document("c"), metadata))
+
+        entity, metadata = entityChunks.get(self.etcd, KEY)
+        self.assertEqual(entity, self.document("b"))
+        self.assertEqual(len(self.write_ids()), 1)
+
+    def test_small_value_removes_the_chunks(self):
+        self.assertTrue(self.write(self.document("a"), None))
+        value, metadata = self.etcd.get(KEY)
+        self.assertTrue(self.write({"deployment_uuid": "d1"}, metadata))
+
+        self.assertEqual(self.write_ids(), set())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import json
+import unittest
+from unittest import mock
+
+import fakeEtcd
+
+from serrano_orchestrator.utils import entityCodec
+from serrano_orchestrator.utils import entityChunks
+from serrano_orchestrator.utils import migrateCodec
+
+DEPLOYMENTS = "/serrano/orchestrator/deployments/deployment/"
+DOCUMENT = {"deployment_uuid": "d1", "name": "d1", "status": 1, "assignments": [{"cluster_uuid": "c1"}],
+            "description": "x" * 200, "ratio": 0.5, "active": True, "labels": None}
+
+
+class EntityCodecTest(unittest.TestCase):
+
+    def tearDown(self):
+        entityCodec.configure({})
+        entityChunks.configure({})
+
+    def test_legacy_json_values_are_decoded(self):
+        self.assertEqual(entityCodec.decode(json.dumps(DOCUMENT)), DOCUMENT)
+        self.assertEqual(entityCodec.decode(json.dumps(DOCUMENT).encode("utf-8")), DOCUMENT)
+        self.assertEqual(entityCodec.decode("[1, 2]"), [1, 2])
+
+    def test_every_format_and_compression_round_trips(self):
+        for fmt in ["json", "orjson", "msgpack"]:
+            for compression in ["none", "zlib", "zstd"]:
+                with self.subTest(format=fmt, compression=compression):
+                    if fmt not in entityCodec.available_formats():
+                        self.skipTest("Codec format '%s' is not installed" % fmt)
+                    if compression not in entityCodec.available_compressions():
+                        self.skipTest("Codec compression '%s' is not installed" % compression)
+                    entityCodec.configure({"format": fmt, "compression": compression, "compression_threshold": 64})
+
+                    data = entityCodec.encode(DOCUMENT)
+                    if compression != "none":
+                        self.assertEqual(data[:2], entityCodec.MARKER + entityCodec.COMPRESSIONS[compression])
+                    elif fmt != "json":
+                        self.assertEqual(data[:2], entityCodec.MARKER + entityCodec.FORMATS[fmt])
+                    self.assertEqual(entityCodec.decode(data), DOCUMENT)
+                    # Values below the threshold are not compressed
+                    self.assertEqual(entityCodec.decode(entityCodec.encode({"a": 1})), {"a": 1})
+
+    def test_chunked_values_are_decoded_once_resolved(self):
+        etcd = fakeEtcd.FakeEtcd()
+        entityChunks.configure({"chunk_size": 64})
+        key = DEPLOYMENTS + "d1"
+        etcd.transaction(compare=[], success=entityChunks.put_ops(etcd, key, DOCUMENT), failure=[])
+
+        data, metadata = etcd.get(key)
+        self.assertTrue(entityCodec.is_chunked(data))
+        self.assertRaises(ValueError, entityCodec.decode, data)
+        self.assertEqual(entityCodec.decode(entityChunks.resolve(etcd, key, data, metadata.mod_revision)), DOCUMENT)
+
+    def test_unknown_format_is_rejected(self):
+        self.assertRaises(ValueError, entityCodec.decode, entityCodec.MARKER + b"?{}")
+
+
+class MigrateCodecTest(unittest.TestCase):
+
+    def setUp(self):
+        self.etcd = fakeEtcd.FakeEtcd()
+        entityCodec.configure({"format": "orjson"})
+        if "orjson" not in entityCodec.available_formats():
+            self.skipTest("Codec format 'orjson' is not installed")
+
+    def tearDown(self):
+        entityCodec.configure({})
+
+    def migrate(self, dry_run=False):
+        with mock.patch("builtins.print"):
+            return migrateCodec.migrate(self.etcd, "/serrano/orchestrator/", "orjson", dry_run)
+
+    def test_documents_are_re_encoded_and_other_values_are_skipped(self):
+        self.etcd.put(DEPLOYMENTS + "d1", json.dumps(DOCUMENT))
+        self.etcd.put(DEPLOYMENTS + "d2", json.dumps({"name": "d2"}))
+        self.etcd.put("/serrano/orchestrator/clusters/heartbeat/c1", "1700000000")
+        self.etcd.put("/serrano/orchestrator/clusters/name/c1", json.dumps("cluster"))
+        self.etcd.put("/serrano/orchestrator/clusters/active/c1", "active")
+        before = {key: self.etcd.get(key)[0] for key in self.etcd.keys()}
+
+        self.assertEqual(self.migrate(dry_run=True), (2, 3))
+        self.assertEqual({key: self.etcd.get(key)[0] for key in self.etcd.keys()}, before)
+
+        self.assertEqual(self.migrate(), (2, 3))
+        for key in [DEPLOYMENTS + "d1", DEPLOYMENTS + "d2"]:
+            value, metadata = self.etcd.get(key)
+            self.assertEqual(value[:2], entityCodec.MARKER + entityCodec.FORMATS["orjson"])
+            self.assertEqual(entityCodec.decode(value), json.loads(before[key]))
+        for key in self.etcd.keys("/serrano/orchestrator/clusters/"):
+            self.assertEqual(self.etcd.get(key)[0], before[key])
+
+        # Values already in the format are not written again
+        revision = self.etcd.revision
+        self.assertEqual(self.migrate(), (0, 5))
+        self.assertEqual(self.etcd.revision, revision)
+
+    def test_key_modified_during_the_migration_is_skipped(self):
+        self.etcd.put(DEPLOYMENTS + "d1", json.dumps({"name": "d1"}))
+        self.etcd.put(DEPLOYMENTS + "d2", json.dumps({"name": "d2"}))
+        transaction = self.etcd.transaction
+
+        def concurrent_write(compare, success=None, failure=None):
+            # The Orchestrator updates d1 after the migration read it
+            if success and success[0].key == DEPLOYMENTS + "d1":
+                self.etcd.put(DEPLOYMENTS + "d1", json.dumps({"name": "updated"}))
+            return transaction(compare, success, failure)
+
+        with mock.patch.object(self.etcd, "transaction", side_effect=concurrent_write):
+            self.assertEqual(self.migrate(), (1, 1))
+
+        self.assertEqual(self.etcd.get(DEPLOYMENTS + "d1")[0], json.dumps({"name": "updated"}).encode("utf-8"))
+        self.assertEqual(entityCodec.decode(self.etcd.get(DEPLOYMENTS + "d2")[0]), {"name": "d2"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import time
+import unittest
+
+import fakeEtcd
+
+from serrano_orchestrator.utils import entityCodec
+from serrano_orchestrator.utils import entityLogs
+
+import grafanaViews
+
+
+class GrafanaViewsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.etcd = fakeEtcd.FakeEtcd()
+        self.put(grafanaViews.DEPLOYMENTS_PREFIX + "d1",
+                 {"name": "d1", "deployment_uuid": "d1", "status": 1, "assignments": [], "created_at": 1,
+                  "updated_at": 1})
+        for timestamp in range(1, 6):
+            self.put(entityLogs.log_key("Deployment", "d1", timestamp), {"timestamp": timestamp,
+                                                                         "event": "e%s" % timestamp})
+        self.views = grafanaViews.GrafanaViews(self.etcd, {"max_log_rows": 3})
+        self.load()
+
+    def put(self, key, value):
+        self.etcd.put(key, entityCodec.encode(value))
+
+    def load(self):
+        self.views.load(self.etcd.revision)
+        deadline = time.time() + 5
+        while not self.views.ready() or self.views.stats()["loading"]:
+            self.assertLess(time.time(), deadline)
+            time.sleep(0.01)
+
+    def events(self, params):
+        return [log["event"] for log in self.views.deployments_logs(params)]
+
+    def test_time_range_of_dropped_rows_is_read_from_etcd(self):
+        self.assertEqual(self.views.stats()["dropped_log_rows"], 2)
+
+        self.assertEqual(self.events({"from": "4", "to": "5"}), ["e4", "e5"])
+        self.assertEqual(self.events({"from": "1", "to": "5", "limit": "2"}), ["e4", "e5"])
+        self.assertEqual(self.views.stats()["etcd_log_reads"], 0)
+
+        self.assertEqual(self.events({"from": "1", "to": "5"}), ["e1", "e2", "e3", "e4", "e5"])
+        self.assertEqual(self.events({"to": "2"}), ["e1", "e2"])
+        self.assertEqual(self.views.stats()["etcd_log_reads"], 2)
+
+    def test_changes_during_a_load_are_kept(self):
+        self.views.load(self.etcd.revision)
+        self.views.apply([(entityLogs.log_key("Deployment", "d1", 6), self.etcd.revision + 1,
+                           entityCodec.encode({"timestamp": 6, "event": "e6"}))])
+        deadline = time.time() + 5
+        while self.views.stats()["loading"]:
+            self.assertLess(time.time(), deadline)
+            time.sleep(0.01)
+
+        self.assertEqual(self.events({"from": "4"}), ["e4", "e5", "e6"])
+
+    def test_log_key_written_again_has_one_row(self):
+        key = entityLogs.legacy_log_key("Deployment", "d1", 6, 0)
+        for event in ["moved", "moved again"]:
+            self.views.apply([(key, self.etcd.revision + 1, entityCodec.encode({"timestamp": 6, "event": event}))])
+
+        self.assertEqual(self.events({"from": "6"}), ["moved again"])
+
+    def test_kernel_without_an_assignment_has_an_empty_cluster(self):
+        kernel = {"request_uuid": "k1", "kernel_name": "k1", "status": 1, "assignment_uuid": "",
+                  "data_description": {"uuid": "dd1", "total_size_MB": 1}, "created_at": 1, "updated_at": 1}
+        self.views.apply([(grafanaViews.KERNELS_PREFIX + "k1", self.etcd.revision + 1, entityCodec.encode(kernel))])
+        self.views.apply([(grafanaViews.KERNELS_PREFIX + "k2", self.etcd.revision + 2,
+                           entityCodec.encode(dict(kernel, request_uuid="k2", assignment_uuid="a1")))])
+
+        self.assertEqual([row["cluster_uuid"] for row in self.views.faas_kernels({})], ["", None])
+
+    def test_log_params_that_cannot_be_parsed_are_rejected(self):
+        grafanaViews.check_log_params({"from": "1700000000000", "to": "1700000000.5", "limit": "10"})
+        grafanaViews.check_log_params({"from": "", "limit": ""})
+        self.assertEqual(grafanaViews.timestamp_param({"from": "1700000000000"}, "from"), 1700000000)
+        for params in [{"from": "yesterday"}, {"to": "inf"}, {"to": "nan"}, {"limit": "ten"}, {"limit": "1.5"},
+                       {"limit": "-1"}]:
+            self.assertRaises(ValueError, grafanaViews.check_log_params, params)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import time
+import threading
+import unittest
+from unittest import mock
+
+import fakeEtcd
+
+import metricForwarder
+
+
+class FakeCTHClient:
+    # Records the posted batches and answers with the queued status codes, then with 201
+
+    def __init__(self, status_codes=()):
+        self.lock = threading.Lock()
+        self.status_codes = list(status_codes)
+        self.batches = []
+        self.posted_at = []
+
+    def post(self, path, json=None):
+        with self.lock:
+            self.batches.append(json["logs"])
+            self.posted_at.append(time.monotonic())
+            status_code = self.status_codes.pop(0) if self.status_codes else 201
+        if isinstance(status_code, Exception):
+            raise status_code
+        return mock.Mock(status_code=status_code)
+
+
+def logs(count, start=0):
+    return [{"kernel": "k1", "value": i} for i in range(start, start + count)]
+
+
+class MetricForwarderTest(unittest.TestCase):
+
+    def forwarder(self, client, **conf):
+        forwarder = metricForwarder.MetricForwarder(client, conf)
+        self.addCleanup(forwarder.close)
+        return forwarder
+
+    def wait(self, forwarder, key, value):
+        deadline = time.time() + 5
+        while forwarder.stats()[key] < value:
+            self.assertLess(time.time(), deadline)
+            time.sleep(0.01)
+
+    def test_full_batches_are_sent_without_waiting_for_the_flush_interval(self):
+        client = FakeCTHClient()
+        forwarder = self.forwarder(client, batch_size=3, flush_interval=60)
+        self.assertTrue(forwarder.submit(logs(7)))
+        self.wait(forwarder, "batches", 2)
+
+        self.assertEqual(client.batches, [logs(3), logs(3, 3)])
+        self.assertEqual(forwarder.stats()["queued"], 1)
+
+        # Closing flushes the rest
+        forwarder.close()
+        self.assertEqual(client.batches[2:], [logs(1, 6)])
+        self.assertEqual(forwarder.stats()["sent"], 7)
+
+    def test_partial_batch_is_sent_after_the_flush_interval(self):
+        client = FakeCTHClient()
+        forwarder = self.forwarder(client, batch_size=100, flush_interval=0.2)
+        submitted_at = time.monotonic()
+        forwarder.submit(logs(2))
+        forwarder.submit(logs(1, 2))
+        self.wait(forwarder, "batches", 1)
+
+        self.assertEqual(client.batches, [logs(3)])
+        self.assertGreaterEqual(client.posted_at[0] - submitted_at, 0.2)
+
+    def test_failed_batches_are_retried_with_backoff(self):
+        client = FakeCTHClient([503, ConnectionError("refused")])
+        forwarder = self.forwarder(client, batch_size=2, flush_interval=0, max_retries=3, retry_backoff=0.05)
+        forwarder.submit(logs(2))
+        self.wait(forwarder, "sent", 2)
+
+        self.assertEqual(client.batches, [logs(2)] * 3)
+        self.assertEqual((forwarder.stats()["retries"], forwarder.stats()["dropped"]), (2, 0))
+        # 0.05s before the first retry and 0.1s before the second
+        self.assertGreaterEqual(client.posted_at[1] - client.posted_at[0], 0.05)
+        self.assertGreaterEqual(client.posted_at[2] - client.posted_at[1], 0.1)
+
+    def test_batches_are_dropped_after_the_retries_or_when_rejected(self):
+        client = FakeCTHClient([500, 500, 400])
+        forwarder = self.forwarder(client, batch_size=2, flush_interval=0, max_retries=1, retry_backoff=0)
+        forwarder.submit(logs(2))
+        self.wait(forwarder, "batches", 1)
+        # A client error is not retried
+        forwarder.submit(logs(2, 2))
+        self.wait(forwarder, "batches", 2)
+        forwarder.submit(logs(2, 4))
+        self.wait(forwarder, "batches", 3)
+
+        self.assertEqual(len(client.batches), 4)
+        stats = forwarder.stats()
+        self.assertEqual((stats["dropped"], stats["sent"], stats["retries"]), (4, 2, 1))
+
+    def test_full_queue_rejects_and_oversized_requests_raise(self):
+        client = FakeCTHClient()
+        forwarder = self.forwarder(client, max_queued_logs=5, batch_size=100, flush_interval=60)
+        self.assertTrue(forwarder.submit(logs(4)))
+        self.assertFalse(forwarder.submit(logs(2)))
+        self.assertRaises(ValueError, forwarder.submit, logs(6))
+
+        stats = forwarder.stats()
+        self.assertEqual((stats["accepted"], stats["rejected"], stats["queued"]), (4, 8, 4))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+import json
+import time
+import zlib
+import threading
+import unittest
+from unittest import mock
+
+import fakeEtcd
+
+import notificationEngine
+
+TOPIC = "ede"
+WORKERS = 4
+
+
+class FakeMessage:
+
+    def __init__(self, partition, offset, key, event):
+        self.__partition = partition
+        self.__offset = offset
+        self.__key = key.encode("utf-8") if key is not None else None
+        self.__value = json.dumps(event).encode("utf-8")
+
+    def error(self):
+        return None
+
+    def topic(self):
+        return TOPIC
+
+    def partition(self):
+        return self.__partition
+
+    def offset(self):
+        return self.__offset
+
+    def key(self):
+        return self.__key
+
+    def value(self):
+        return self.__value
+
+
+class FakeConsumer:
+    # Returns the given batches of messages one per consume() call, then nothing, and records the committed offsets
+
+    def __init__(self, batches):
+        self.batches = list(batches)
+        self.commits = []
+        self.closed = False
+
+    def __call__(self, conf):
+        return self
+
+    def subscribe(self, topics):
+        pass
+
+    def consume(self, num_messages=1, timeout=-1):
+        if self.batches:
+            return self.batches.pop(0)
+        time.sleep(timeout)
+        return []
+
+    def commit(self, offsets=None, asynchronous=True):
+        self.commits.append(sorted((tp.topic, tp.partition, tp.offset) for tp in offsets))
+
+    def close(self):
+        self.closed = True
+
+
+class FakeDispatcher:
+    # Records the handled events with the worker that handled them, events with "block" wait for release
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.handled = []
+        self.release = threading.Event()
+
+    def handle_notification_evts(self, events):
+        for event in events:
+            if event.get("block"):
+                self.release.wait(5)
+            with self.lock:
+                self.handled.append((threading.current_thread().name, event))
+
+
+def worker_of(key):
+    return zlib.crc32(key.encode("utf-8")) % WORKERS
+
+
+class NotificationEngineTest(unittest.TestCase):
+
+    def start(self, batches):
+        self.consumer = FakeConsumer(batches)
+        self.dispatcher = FakeDispatcher()
+        patcher = mock.patch.object(notificationEngine, "Consumer", self.consumer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.engine = notificationEngine.NotificationEngine(
+            {"server": "kafka:9092", "group_id": "orchestrator", "ede_topic": TOPIC, "workers": WORKERS,
+             "linger": 0.02}, self.dispatcher)
+        self.engine.start()
+        self.addCleanup(self.dispatcher.release.set)
+        self.addCleanup(self.engine.stop)
+
+    def wait(self, condition):
+        deadline = time.time() + 5
+        while not condition():
+            self.assertLess(time.time(), deadline)
+            time.sleep(0.01)
+
+    def test_events_of_a_key_are_handled_in_order_by_one_worker(self):
+        keys = ["k%s" % i for i in range(8)]
+        batches = []
+        offset = 0
+        for b in range(5):
+            batch = []
+            for key in keys:
+                batch.append(FakeMessage(0, offset, key, {"key": key, "seq": b}))
+                offset += 1
+            batches.append(batch)
+        # Events without a message key are keyed by their EDE model
+        batches.append([FakeMessage(0, offset + i, None, {"model": "m1", "key": "m1", "seq": i}) for i in range(3)])
+        self.start(batches)
+        self.wait(lambda: len(self.dispatcher.handled) == 43)
+
+        for key in keys + ["m1"]:
+            handled = [(worker, event["seq"]) for worker, event in self.dispatcher.handled if event["key"] == key]
+            self.assertEqual(len(set(worker for worker, seq in handled)), 1)
+            self.assertEqual([seq for worker, seq in handled], sorted(seq for worker, seq in handled))
+        self.assertEqual(set(worker for worker, event in self.dispatcher.handled if event["key"] == "k1"),
+                         {"NotificationWorker-%s" % worker_of("k1")})
+        self.wait(lambda: self.consumer.commits and self.consumer.commits[-1] == [(TOPIC, 0, 43)])
+
+    def test_offsets_are_committed_once_every_part_of_the_earlier_batches_is_handled(self):
+        slow, fast = "a", "b"
+        self.assertNotEqual(worker_of(slow), worker_of(fast))
+        self.start([[FakeMessage(0, 0, slow, {"key": slow, "block": True}),
+                     FakeMessage(0, 1, fast, {"key": fast})],
+                    [FakeMessage(0, 2, fast, {"key": fast}),
+                     FakeMessage(1, 0, fast, {"key": fast})]])
+
+        # The second batch is handled while the first one still waits for its slow part
+        self.wait(lambda: len(self.dispatcher.handled) == 3)
+        time.sleep(0.1)
+        self.assertEqual(self.consumer.commits, [])
+        self.assertEqual(self.engine.stats()["uncommitted_batches"], 2)
+
+        self.dispatcher.release.set()
+        self.wait(lambda: self.consumer.commits)
+        self.assertEqual(self.consumer.commits, [[(TOPIC, 0, 3), (TOPIC, 1, 1)]])
+        self.assertEqual(self.engine.stats()["uncommitted_batches"], 0)
+
+        self.engine.stop()
+        self.assertTrue(self.consumer.closed)
+
+
+if __name__ == "__main__":
+    unittest.main()
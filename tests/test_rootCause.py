@@ -0,0 +1,54 @@
+import random
+import unittest
+
+import fakeEtcd
+
+import rootCause
+
+
+def legacy_worker_nodes(shap_values, threshold):
+    # The per-anomaly loop that the engine replaced
+    affected_worker_nodes = []
+    for k, v in shap_values.items():
+        worker_node = k.split("_")[-1]
+        if v >= threshold and worker_node not in affected_worker_nodes:
+            affected_worker_nodes.append(worker_node)
+    return affected_worker_nodes
+
+
+def shap_values(rnd, metrics, nodes):
+    # Rounded values so that scores tie, in a shuffled feature order so that the nodes interleave
+    features = ["metric%s_node%s" % (m, n) for m in range(metrics) for n in range(nodes)]
+    rnd.shuffle(features)
+    return {feature: round(rnd.gauss(0.0, 1.0), 1) for feature in features}
+
+
+class RootCauseEngineTest(unittest.TestCase):
+
+    def test_same_worker_nodes_as_the_per_anomaly_loop(self):
+        rnd = random.Random(7)
+        engine = rootCause.RootCauseEngine(1.0, {"aggregation": "max"})
+        for i in range(200):
+            layout = shap_values(rnd, rnd.randint(1, 4), rnd.randint(1, 6))
+            batch = [{feature: round(rnd.gauss(0.0, 1.0), 1) for feature in layout} for j in range(5)]
+            batch.append({})
+            self.assertEqual(engine.worker_nodes(batch), [legacy_worker_nodes(values, 1.0) for values in batch])
+
+    def test_nodes_are_listed_by_their_first_feature_reaching_the_threshold(self):
+        engine = rootCause.RootCauseEngine(0.5, {})
+        values = {"cpu_node1": 0.1, "cpu_node2": 0.6, "mem_node1": 0.9, "mem_node3": 0.6}
+        self.assertEqual(engine.worker_nodes([values]), [["node2", "node1", "node3"]])
+
+    def test_top_k_keeps_the_highest_scores_in_listing_order(self):
+        engine = rootCause.RootCauseEngine(0.5, {"top_k": 2})
+        values = {"cpu_node1": 0.6, "cpu_node2": 0.7, "cpu_node3": 0.9, "cpu_node4": 0.7}
+        self.assertEqual(engine.worker_nodes([values]), [["node2", "node3"]])
+
+    def test_empty_shap_values(self):
+        engine = rootCause.RootCauseEngine(0.0, {})
+        self.assertEqual(engine.worker_nodes([{}, {"cpu_node1": 1.0}, {}]), [[], ["node1"], []])
+        self.assertEqual(engine.worker_nodes([]), [])
+
+
+if __name__ == "__main__":
+    unittest.main()